@@ -1,23 +1,29 @@
 
 import array
 import gc
-import os
-from math import sqrt
 from rubikscolorresolver.base import (
     LabColor,
     RubiksColorSolverGenericBase,
     Square,
+    SquareLab,
     lab_distance,
     html_color,
     rgb2lab,
+    rgb2lab_many,
 )
+from rubikscolorresolver.assignment_solver import solve_assignment
+from rubikscolorresolver.matrix import TriangularMatrix
+from rubikscolorresolver.report import FileReport, NullReport
+from rubikscolorresolver.scan import ScanDataError, decode_scan, decode_scan_dict
+from rubikscolorresolver.scan import get_width as get_scan_width
 from rubikscolorresolver.tsp_solver_greedy import solve_tsp
+from rubikscolorresolver.tsp_solver_multistart import solve_tsp_multi_start
 from rubikscolorresolver.permutations import (
     even_cube_center_color_permutations,
     len_even_cube_center_color_permutations,
     odd_cube_center_color_permutations,
 )
-#from rubikscolorresolver.profile import timed_function, print_profile_data
+from rubikscolorresolver.profile import timed_function, print_profile_data
 import sys
 
 if sys.version_info < (3, 4):
@@ -30,20 +36,33 @@ def is_micropython():
 ALL_COLORS = ("Bu", "Gr", "OR", "Rd", "Wh", "Ye")
 SIDES_COUNT = 6
 
+# The color pairs of the 12 edges of a solved cube
+EDGE_COLOR_PAIRS = (
+    ("Wh", "OR"),
+    ("Wh", "Rd"),
+    ("Wh", "Gr"),
+    ("Wh", "Bu"),
+    ("Gr", "OR"),
+    ("Gr", "Rd"),
+    ("Bu", "OR"),
+    ("Bu", "Rd"),
+    ("Ye", "OR"),
+    ("Ye", "Rd"),
+    ("Ye", "Gr"),
+    ("Ye", "Bu"),
+)
+
 if is_micropython():
     from ucollections import OrderedDict
     HTML_FILENAME = "rubiks-color-resolver.html"
+    lab_distance_cie2000_pairs = None
 else:
     from collections import OrderedDict
+    from rubikscolorresolver.cie2000 import lab_distance_cie2000_pairs, numpy
     HTML_FILENAME = "/tmp/rubiks-color-resolver.html"
 
-try:
-    os.unlink(HTML_FILENAME)
-except Exception:
-    pass
-
 
-# @timed_function
+@timed_function
 def median(list_foo):
     list_foo = sorted(list_foo)
     list_foo_len = len(list_foo)
@@ -63,7 +82,68 @@ def median(list_foo):
         return list_foo[int((list_foo_len - 1) / 2)]
 
 
+def lab_arrays(labs):
+    """
+    Return numpy arrays of the L, a and b values in labs
+    """
+    return (
+        numpy.array([lab.L for lab in labs], dtype=float),
+        numpy.array([lab.a for lab in labs], dtype=float),
+        numpy.array([lab.b for lab in labs], dtype=float),
+    )
+
+
+def lab_distance_pairs(lab_arrays1, lab_arrays2, x, y):
+    """
+    Return a numpy array of the lab_distance between entry x[k] of lab_arrays1
+    and entry y[k] of lab_arrays2 for each k
+    """
+    (l1, a1, b1) = lab_arrays1
+    (l2, a2, b2) = lab_arrays2
+    return lab_distance_cie2000_pairs(l1[x], a1[x], b1[x], l2[y], a2[y], b2[y])
+
+
+def symmetric_matrix(size, x, y, distances):
+    """
+    Build a size x size list of lists from the upper triangle (x, y) distances
+    """
+    matrix = numpy.zeros((size, size))
+    matrix[x, y] = distances
+    matrix[y, x] = distances
+    return matrix.tolist()
+
+
+def target_mask(items, x, y):
+    """
+    For tsp_matrix_corners and tsp_matrix_edge_pairs, True for each (x, y) where both
+    items are targets (their position is a color name) or neither item is a target
+    """
+    color_names = set(("Wh", "Ye", "OR", "Rd", "Bu", "Gr"))
+    is_target = numpy.array([item[0].position in color_names for item in items], dtype=bool)
+    return is_target[x] == is_target[y]
+
+
+def tsp_matrix_corners_numpy(corners):
+    len_corners = len(corners)
+    (x, y) = numpy.triu_indices(len_corners, 1)
+    slots = [lab_arrays([corner[index].lab for corner in corners]) for index in range(3)]
+
+    def slot_distance(x_slot, y_slot):
+        return lab_distance_pairs(slots[x_slot], slots[y_slot], x, y)
+
+    distance_012 = slot_distance(0, 0) + slot_distance(1, 1) + slot_distance(2, 2)
+    distance_201 = slot_distance(0, 2) + slot_distance(1, 0) + slot_distance(2, 1)
+    distance_120 = slot_distance(0, 1) + slot_distance(1, 2) + slot_distance(2, 0)
+    distance = numpy.minimum(numpy.minimum(distance_012, distance_201), distance_120)
+    distance = numpy.where(target_mask(corners, x, y), 999, distance)
+
+    return symmetric_matrix(len_corners, x, y, distance)
+
+
 def tsp_matrix_corners(corners):
+    if lab_distance_cie2000_pairs is not None:
+        return tsp_matrix_corners_numpy(corners)
+
     len_corners = len(corners)
 
     # build a full matrix of color to color distances
@@ -203,7 +283,100 @@ def traveling_salesman_corners(corners, desc):
     return sorted_corners
 
 
+def corner_rotations(corner):
+    """
+    The three rotations of a corner in the order traveling_salesman_corners tries them
+    """
+    return (
+        corner,
+        (corner[2], corner[0], corner[1]),
+        (corner[1], corner[2], corner[0]),
+    )
+
+
+def match_corners(target_corners, corners):
+    """
+    Pair each target corner with one of the scanned corners, in whichever
+    rotation is closest, such that the total distance is minimal. This is a
+    bipartite matching solved exactly via solve_assignment.
+
+    Returns the same [target, corner, target, corner, ...] list that
+    traveling_salesman_corners returns.
+    """
+    # The target corners are built from six reference squares so every
+    # distance is one of the scanned squares vs one of the reference squares
+    references = {}
+
+    for target_corner in target_corners:
+        for square in target_corner:
+            references[square.position] = square
+
+    distances = {}
+
+    for corner in corners:
+        for square in corner:
+            for (color_name, reference) in references.items():
+                distances[(color_name, square.position)] = lab_distance(reference.lab, square.lab)
+
+    # costs[target][corner] is the distance in the best rotation, the cost
+    # tensor of targets x corners x rotations collapsed over rotations
+    costs = []
+    best_rotations = []
+
+    for (target0, target1, target2) in target_corners:
+        row_costs = []
+        row_rotations = []
+
+        for corner in corners:
+            min_distance = None
+            min_rotation = None
+
+            for rotation in corner_rotations(corner):
+                distance = (
+                    distances[(target0.position, rotation[0].position)] +
+                    distances[(target1.position, rotation[1].position)] +
+                    distances[(target2.position, rotation[2].position)]
+                )
+
+                if min_distance is None or distance < min_distance:
+                    min_distance = distance
+                    min_rotation = rotation
+
+            row_costs.append(min_distance)
+            row_rotations.append(min_rotation)
+
+        costs.append(row_costs)
+        best_rotations.append(row_rotations)
+
+    sorted_corners = []
+
+    for (target_index, corner_index) in enumerate(solve_assignment(costs)):
+        sorted_corners.append(target_corners[target_index])
+        sorted_corners.append(best_rotations[target_index][corner_index])
+
+    return sorted_corners
+
+
+def tsp_matrix_edge_pairs_numpy(edge_pairs):
+    len_edge_pairs = len(edge_pairs)
+    (x, y) = numpy.triu_indices(len_edge_pairs, 1)
+    slots = [lab_arrays([edge_pair[index].lab for edge_pair in edge_pairs]) for index in range(2)]
+
+    def slot_distance(x_slot, y_slot):
+        return lab_distance_pairs(slots[x_slot], slots[y_slot], x, y)
+
+    distance_01 = slot_distance(0, 0) + slot_distance(1, 1)
+    distance_10 = slot_distance(0, 1) + slot_distance(1, 0)
+    distance = numpy.minimum(distance_01, distance_10)
+    distance = numpy.where(target_mask(edge_pairs, x, y), 999, distance)
+
+    return symmetric_matrix(len_edge_pairs, x, y, distance)
+
+
 def tsp_matrix_edge_pairs(edge_pairs):
+    if lab_distance_cie2000_pairs is not None:
+        return tsp_matrix_edge_pairs_numpy(edge_pairs)
+
     len_edge_pairs = len(edge_pairs)
 
     # build a full matrix of color to color distances
@@ -313,6 +486,109 @@ def traveling_salesman_edge_pairs(edge_pairs, desc):
     return sorted_edge_pairs
 
 
+def store_lab_arrays(store):
+    """
+    Return numpy arrays of the L, a and b values in a CubeStore
+    """
+    return (
+        numpy.array(store.L, dtype=float),
+        numpy.array(store.a, dtype=float),
+        numpy.array(store.b, dtype=float),
+    )
+
+
+def square_distance_matrix(store):
+    """
+    Return the lab_distance between every pair of squares in a CubeStore, a
+    TriangularMatrix indexed by square position
+    """
+    size = store.size
+
+    if lab_distance_cie2000_pairs is not None:
+        (x, y) = numpy.tril_indices(size, -1)
+        labs = store_lab_arrays(store)
+        return TriangularMatrix(size, lab_distance_pairs(labs, labs, y, x))
+
+    labs = [SquareLab(store, index).to_labcolor() for index in range(size)]
+    matrix = TriangularMatrix(size)
+    index = 0
+
+    for x in range(size):
+        x_lab = labs[x]
+
+        for y in range(x):
+            matrix.values[index] = lab_distance(labs[y], x_lab)
+            index += 1
+
+    return matrix
+
+
+def reference_distance_table(store, labs):
+    """
+    Return a list with an entry per square in a CubeStore, indexed by square
+    position, each entry is a list of the lab_distance from that square to
+    each of labs
+    """
+    size = store.size
+    len_labs = len(labs)
+
+    if lab_distance_cie2000_pairs is not None:
+        x = numpy.repeat(numpy.arange(size), len_labs)
+        y = numpy.tile(numpy.arange(len_labs), size)
+        distances = lab_distance_pairs(store_lab_arrays(store), lab_arrays(labs), x, y)
+        return distances.reshape((size, len_labs)).tolist()
+
+    table = []
+
+    for index in range(size):
+        square_lab = SquareLab(store, index).to_labcolor()
+        table.append([lab_distance(square_lab, lab) for lab in labs])
+
+    return table
+
+
+def match_edge_pairs(target_pairs, edge_pairs, distances):
+    """
+    Pair each target edge pair with one of the scanned edge pairs, in whichever
+    orientation is closest, such that the total distance is minimal.
+
+    :arg: target_pairs : list of (reference index, reference index) tuples
+    :arg: edge_pairs : list of (wing index, wing index) tuples
+    :arg: distances : distances[wing index][reference index], see reference_distance_table
+
+    Returns a list of (target index, edge pair index, flipped) tuples. This only
+    deals in indexes and numbers so it can be run for several orbits at once on
+    a worker pool.
+    """
+    costs = []
+    flips = []
+
+    for (target0, target1) in target_pairs:
+        row_costs = []
+        row_flips = []
+
+        for (wing0, wing1) in edge_pairs:
+            distance_01 = distances[wing0][target0] + distances[wing1][target1]
+            distance_10 = distances[wing1][target0] + distances[wing0][target1]
+
+            if distance_10 < distance_01:
+                row_costs.append(distance_10)
+                row_flips.append(True)
+            else:
+                row_costs.append(distance_01)
+                row_flips.append(False)
+
+        costs.append(row_costs)
+        flips.append(row_flips)
+
+    result = []
+
+    for (target_index, edge_pair_index) in enumerate(solve_assignment(costs)):
+        result.append((target_index, edge_pair_index, flips[target_index][edge_pair_index]))
+
+    return result
+
+
 """
 def path_streak_cost(squares):
 
@@ -385,35 +661,43 @@ def best_path_streak(sorted_squares, streak_length, middle_squares, edge_pairs,
 """
 
 
-def tsp_matrix(squares):
+def tsp_matrix_numpy(squares):
     len_squares = len(squares)
-    r_len_squares = range(len_squares)
+    (x, y) = numpy.tril_indices(len_squares, -1)
+    labs = lab_arrays([square.lab for square in squares])
+    return TriangularMatrix(len_squares, lab_distance_pairs(labs, labs, y, x))
 
-    # build a full matrix of color to color distances
-    # init the 2d list with 0s
-    matrix = [x[:] for x in [[0] * len_squares] * len_squares]
 
-    for x in r_len_squares:
-        x_lab = squares[x].lab
+def tsp_matrix(squares, distances=None):
+    """
+    Return the lab_distance between every pair of squares as a
+    TriangularMatrix. distances is an optional square_distance_matrix to take
+    them from.
+    """
+    if distances is not None:
+        return distances.sub_matrix([square.index for square in squares])
 
-        for y in range(x+1, len_squares):
-            y_lab = squares[y].lab
+    if lab_distance_cie2000_pairs is not None:
+        return tsp_matrix_numpy(squares)
 
-            distance = lab_distance(x_lab, y_lab)
-            matrix[x][y] = distance
-            matrix[y][x] = distance
+    len_squares = len(squares)
+    labs = [square.lab.to_labcolor() for square in squares]
+    matrix = TriangularMatrix(len_squares)
+    index = 0
 
-    # convert to tuple of tuples
-    for (row_index, row) in enumerate(matrix):
-        matrix[row_index] = tuple(row)
+    for x in range(len_squares):
+        x_lab = labs[x]
 
-    matrix = tuple(matrix)
+        for y in range(x):
+            matrix.values[index] = lab_distance(labs[y], x_lab)
+            index += 1
 
     return matrix
 
 
-# @timed_function
-def traveling_salesman(squares, desc, middle_squares=[], edge_pairs=[], corners=[]):
+@timed_function
+def traveling_salesman(squares, desc, middle_squares=[], edge_pairs=[], corners=[], distances=None, optim_steps=0, time_budget_ms=None, rows=None,
+                       starts=1, executor=None, deadline_ms=None):
     '''
     SQUARES_PER_ROW = int(len(squares) / SIDES_COUNT)
     results = []
@@ -434,23 +718,29 @@ def traveling_salesman(squares, desc, middle_squares=[], edge_pairs=[], corners=
 
     return results
     '''
-    matrix = tsp_matrix(squares)
-    path = solve_tsp(matrix, desc=desc)
+    matrix = tsp_matrix(squares, distances)
+
+    if starts > 1:
+        path = solve_tsp_multi_start(
+            matrix, starts, executor, deadline_ms, optim_steps=optim_steps, time_budget_ms=time_budget_ms, solve_rows=rows)
+    else:
+        path = solve_tsp(matrix, optim_steps, desc=desc, time_budget_ms=time_budget_ms, rows=rows)
+
     return [squares[x] for x in path]
 
 
-def traveling_salesman_two_colors(squares, endpoints=None, desc=None):
-    matrix = tsp_matrix(squares)
+def traveling_salesman_two_colors(squares, endpoints=None, desc=None, distances=None, optim_steps=0, time_budget_ms=None, rows=None):
+    matrix = tsp_matrix(squares, distances)
 
     if endpoints:
         start_index = squares.index(endpoints[0])
         end_index = squares.index(endpoints[1])
         endpoints = (start_index, end_index)
-    path = solve_tsp(matrix, endpoints=endpoints, desc=desc)
+    path = solve_tsp(matrix, optim_steps, endpoints=endpoints, desc=desc, time_budget_ms=time_budget_ms, rows=rows)
     return [squares[x] for x in path]
 
 
-# @timed_function
+@timed_function
 def get_important_square_indexes(size):
     squares_per_side = size * size
     max_square = squares_per_side * 6
@@ -467,7 +757,7 @@ def get_important_square_indexes(size):
     return (first_squares, last_squares, last_UBD_squares)
 
 
-# @timed_function
+@timed_function
 def hex_to_rgb(rgb_string):
     """
     Takes #112233 and returns the RGB values in decimal
@@ -481,7 +771,7 @@ def hex_to_rgb(rgb_string):
     return (red, green, blue)
 
 
-# @timed_function
+@timed_function
 def hashtag_rgb_to_labcolor(rgb_string):
     (red, green, blue) = hex_to_rgb(rgb_string)
     #lab = rgb2lab((red, green, blue))
@@ -517,7 +807,7 @@ crayola_colors = {
 }
 
 
-# @timed_function
+@timed_function
 def get_row_color_distances(squares, row_baseline_lab):
     """
     'colors' is list if (index, (red, green, blue)) tuples
@@ -545,7 +835,7 @@ def get_row_color_distances(squares, row_baseline_lab):
     return results
 
 
-# @timed_function
+@timed_function
 def get_squares_for_row(squares, target_row_index):
     results = []
     squares_per_row = int(len(squares) / 6)
@@ -563,7 +853,7 @@ def get_squares_for_row(squares, target_row_index):
     return results
 
 
-# @timed_function
+@timed_function
 def square_list_to_lab(squares):
     reds = array.array("B")
     greens = array.array("B")
@@ -584,7 +874,18 @@ def square_list_to_lab(squares):
 
 class RubiksColorSolverGeneric(RubiksColorSolverGenericBase):
 
-    # @timed_function
+    @property
+    def write_debug_file(self):
+        """
+        Setting this to True writes the report to HTML_FILENAME
+        """
+        return self.report.enabled
+
+    @write_debug_file.setter
+    def write_debug_file(self, value):
+        self.report = FileReport(HTML_FILENAME) if value else NullReport()
+
+    @timed_function
     def www_header(self):
         """
         Write the <head> including css
@@ -593,9 +894,9 @@ class RubiksColorSolverGeneric(RubiksColorSolverGenericBase):
         square_size = 40
         size = self.width  # 3 for 3x3x3, etc
 
-        with open(HTML_FILENAME, "a") as fh:
-            fh.write(
-                """<!DOCTYPE html>
+        fh = self.report
+        fh.write(
+            """<!DOCTYPE html>
 <html>
 <head>
 <meta charset="UTF-8">
@@ -614,14 +915,14 @@ div.side {
 }
 
 """
-                % side_margin
-            )
+            % side_margin
+        )
 
-            for x in range(1, size - 1):
-                fh.write("div.col%d,\n" % x)
+        for x in range(1, size - 1):
+            fh.write("div.col%d,\n" % x)
 
-            fh.write(
-                """div.col%d {
+        fh.write(
+            """div.col%d {
     float: left;
 }
 
@@ -633,16 +934,16 @@ div#down {
     margin-left: %dpx;
 }
 """
-                % (
-                    size - 1,
-                    size,
-                    (size - 1) * square_size,
-                    (size * square_size) + (3 * side_margin),
-                )
+            % (
+                size - 1,
+                size,
+                (size - 1) * square_size,
+                (size * square_size) + (3 * side_margin),
             )
+        )
 
-            fh.write(
-                """
+        fh.write(
+            """
 span.half_square {
     width: %dpx;
     height: %dpx;
@@ -715,111 +1016,81 @@ $(document).ready(function()
 </head>
 <body>
 """
-                % (
-                    int(square_size / 2),
-                    square_size,
-                    square_size,
-                    square_size,
-                    square_size,
-                    square_size,
-                    square_size,
-                    square_size,
-                    square_size,
-                )
+            % (
+                int(square_size / 2),
+                square_size,
+                square_size,
+                square_size,
+                square_size,
+                square_size,
+                square_size,
+                square_size,
+                square_size,
             )
+        )
 
     def write_color_corners(self, desc, corners):
-        with open(HTML_FILENAME, "a") as fh:
-            fh.write("<div class='clear colors'>\n")
-            fh.write("<h2>%s</h2>\n" % desc)
-
-            for row_index in range(3):
-                for (index, (corner0, corner1, corner2)) in enumerate(corners):
-
-                    if row_index == 0:
-                        square = corner0
-                    elif row_index == 1:
-                        square = corner1
-                    elif row_index == 2:
-                        square = corner2
-                    else:
-                        raise ValueError(row_index)
-
-                    (red, green, blue) = (square.lab.red, square.lab.green, square.lab.blue)
-
-                    if index and index % 2 == 0:
-                        fh.write("<span class='half_square'></span>")
-
-                    fh.write(
-                        "<span class='square' style='background-color:#%02x%02x%02x' title='RGB (%s, %s, %s), Lab (%s, %s, %s), color %s, side %s'>%s</span>\n"
-                        % (
-                            red,
-                            green,
-                            blue,
-                            red,
-                            green,
-                            blue,
-                            int(square.lab.L),
-                            int(square.lab.a),
-                            int(square.lab.b),
-                            square.color_name,
-                            square.side_name,
-                            square.position,
-                        )
+        fh = self.report
+        fh.write("<div class='clear colors'>\n")
+        fh.write("<h2>%s</h2>\n" % desc)
+
+        for row_index in range(3):
+            for (index, (corner0, corner1, corner2)) in enumerate(corners):
+
+                if row_index == 0:
+                    square = corner0
+                elif row_index == 1:
+                    square = corner1
+                elif row_index == 2:
+                    square = corner2
+                else:
+                    raise ValueError(row_index)
+
+                (red, green, blue) = (square.lab.red, square.lab.green, square.lab.blue)
+
+                if index and index % 2 == 0:
+                    fh.write("<span class='half_square'></span>")
+
+                fh.write(
+                    "<span class='square' style='background-color:#%02x%02x%02x' title='RGB (%s, %s, %s), Lab (%s, %s, %s), color %s, side %s'>%s</span>\n"
+                    % (
+                        red,
+                        green,
+                        blue,
+                        red,
+                        green,
+                        blue,
+                        int(square.lab.L),
+                        int(square.lab.a),
+                        int(square.lab.b),
+                        square.color_name,
+                        square.side_name,
+                        square.position,
                     )
-                fh.write("<br>")
-            fh.write("</div>\n")
+                )
+            fh.write("<br>")
+        fh.write("</div>\n")
 
     def write_color_edge_pairs(self, desc, square_pairs):
-        with open(HTML_FILENAME, "a") as fh:
-            fh.write("<div class='clear colors'>\n")
-            fh.write("<h2>%s</h2>\n" % desc)
-
-            for use_square1 in (True, False):
-                for (index, (square1, square2)) in enumerate(square_pairs):
-
-                    if use_square1:
-                        square = square1
-                    else:
-                        square = square2
-
-                    (red, green, blue) = (square.lab.red, square.lab.green, square.lab.blue)
-
-                    if index and index % 2 == 0:
-                        fh.write("<span class='half_square'></span>")
-
-                    fh.write(
-                        "<span class='square' style='background-color:#%02x%02x%02x' title='RGB (%s, %s, %s), Lab (%s, %s, %s), color %s, side %s'>%s</span>\n"
-                        % (
-                            red,
-                            green,
-                            blue,
-                            red,
-                            green,
-                            blue,
-                            int(square.lab.L),
-                            int(square.lab.a),
-                            int(square.lab.b),
-                            square.color_name,
-                            square.side_name,
-                            square.position,
-                        )
-                    )
-                fh.write("<br>")
-            fh.write("</div>\n")
+        fh = self.report
+        fh.write("<div class='clear colors'>\n")
+        fh.write("<h2>%s</h2>\n" % desc)
 
-    # @timed_function
-    def write_colors(self, desc, squares):
-        with open(HTML_FILENAME, "a") as fh:
-            squares_per_row = int(len(squares) / 6)
-            fh.write("<div class='clear colors'>\n")
-            fh.write("<h2>%s</h2>\n" % desc)
+        for use_square1 in (True, False):
+            for (index, (square1, square2)) in enumerate(square_pairs):
+
+                if use_square1:
+                    square = square1
+                else:
+                    square = square2
 
-            count = 0
-            for square in squares:
                 (red, green, blue) = (square.lab.red, square.lab.green, square.lab.blue)
+
+                if index and index % 2 == 0:
+                    fh.write("<span class='half_square'></span>")
+
                 fh.write(
-                    "<span class='square' style='background-color:#%02x%02x%02x' title='RGB (%s, %s, %s), Lab (%s, %s, %s), color %s, side %s'>%d</span>\n"
+                    "<span class='square' style='background-color:#%02x%02x%02x' title='RGB (%s, %s, %s), Lab (%s, %s, %s), color %s, side %s'>%s</span>\n"
                     % (
                         red,
                         green,
@@ -835,39 +1106,84 @@ $(document).ready(function()
                         square.position,
                     )
                 )
+            fh.write("<br>")
+        fh.write("</div>\n")
 
-                count += 1
+    @timed_function
+    def write_colors(self, desc, squares):
+        fh = self.report
+        squares_per_row = int(len(squares) / 6)
+        fh.write("<div class='clear colors'>\n")
+        fh.write("<h2>%s</h2>\n" % desc)
+
+        count = 0
+        for square in squares:
+            (red, green, blue) = (square.lab.red, square.lab.green, square.lab.blue)
+            fh.write(
+                "<span class='square' style='background-color:#%02x%02x%02x' title='RGB (%s, %s, %s), Lab (%s, %s, %s), color %s, side %s'>%d</span>\n"
+                % (
+                    red,
+                    green,
+                    blue,
+                    red,
+                    green,
+                    blue,
+                    int(square.lab.L),
+                    int(square.lab.a),
+                    int(square.lab.b),
+                    square.color_name,
+                    square.side_name,
+                    square.position,
+                )
+            )
 
-                if count % squares_per_row == 0:
-                    fh.write("<br>")
-            fh.write("</div>\n")
+            count += 1
 
-    # @timed_function
+            if count % squares_per_row == 0:
+                fh.write("<br>")
+        fh.write("</div>\n")
+
+    @timed_function
     def www_footer(self):
-        with open(HTML_FILENAME, "a") as fh:
-            fh.write("""
+        self.report.write("""
 </body>
 </html>
 """)
 
-    # @timed_function
+    @timed_function
     def enter_scan_data(self, scan_data):
+        """
+        scan_data is a dictionary of square position to (red, green, blue) or,
+        as returned by the decoders in rubikscolorresolver/scan.py, a buffer
+        of red, green, blue bytes for each square in position order
+        """
 
-        for (position, (red, green, blue)) in scan_data.items():
-            position = int(position)
+        if isinstance(scan_data, dict):
+            (width, rgb) = decode_scan_dict(scan_data)
+        else:
+            rgb = scan_data
+            width = get_scan_width(len(rgb) // 3) if len(rgb) % 3 == 0 else None
+
+        if width != self.width:
+            raise ScanDataError("{} values is not a {}x{}x{} scan".format(len(rgb), self.width, self.width, self.width))
+
+        for (position, lab) in enumerate(rgb2lab_many(rgb), 1):
             side = self.pos2side[position]
-            side.set_square(position, red, green, blue)
+            side.set_square(position, lab.red, lab.green, lab.blue, lab=lab)
 
-        if self.write_debug_file:
-            self.www_header()
+        self.square_distances = None
+        self.reference_distances = None
 
-            with open(HTML_FILENAME, "a") as fh:
-                fh.write("<h1>RGB Input</h1>\n")
-                fh.write("<pre>{}</pre>\n".format(scan_data))
+        if self.report.enabled:
+            self.www_header()
+            self.report.write("<h1>RGB Input</h1>\n")
+            self.report.write("<pre>{}</pre>\n".format("\n".join(
+                "{}: ({}, {}, {})".format(position, rgb[index], rgb[index + 1], rgb[index + 2])
+                for (position, index) in enumerate(range(0, len(rgb), 3), 1))))
 
         self.calculate_pos2square()
 
-    # @timed_function
+    @timed_function
     def html_cube(self, desc, use_html_colors, div_class):
         cube = ["dummy"]
 
@@ -931,45 +1247,44 @@ $(document).ready(function()
         return "".join(html)
 
     def write_html(self, html):
-        with open(HTML_FILENAME, "a") as fh:
-            fh.write(html)
+        self.report.write(html)
 
     def _write_colors(self, desc, box):
-        with open(HTML_FILENAME, "a") as fh:
-            fh.write("<div class='clear colors'>\n")
-            fh.write("<h2>{}</h2>\n".format(desc))
+        fh = self.report
+        fh.write("<div class='clear colors'>\n")
+        fh.write("<h2>{}</h2>\n".format(desc))
 
-            for color_name in ("Wh", "Ye", "Gr", "Bu", "OR", "Rd"):
-                lab = box[color_name]
+        for color_name in ("Wh", "Ye", "Gr", "Bu", "OR", "Rd"):
+            lab = box[color_name]
 
-                fh.write(
-                    "<span class='square' style='background-color:#%02x%02x%02x' title='RGB (%s, %s, %s), Lab (%s, %s, %s), color %s'>%s</span>\n"
-                    % (
-                        lab.red,
-                        lab.green,
-                        lab.blue,
-                        lab.red,
-                        lab.green,
-                        lab.blue,
-                        int(lab.L),
-                        int(lab.a),
-                        int(lab.b),
-                        color_name,
-                        color_name,
-                    )
+            fh.write(
+                "<span class='square' style='background-color:#%02x%02x%02x' title='RGB (%s, %s, %s), Lab (%s, %s, %s), color %s'>%s</span>\n"
+                % (
+                    lab.red,
+                    lab.green,
+                    lab.blue,
+                    lab.red,
+                    lab.green,
+                    lab.blue,
+                    int(lab.L),
+                    int(lab.a),
+                    int(lab.b),
+                    color_name,
+                    color_name,
                 )
-            fh.write("<br>")
-            fh.write("</div>\n")
+            )
+        fh.write("<br>")
+        fh.write("</div>\n")
 
-    # @timed_function
+    @timed_function
     def write_crayola_colors(self):
         self._write_colors("crayola box", crayola_colors)
 
-    # @timed_function
+    @timed_function
     def write_color_box(self):
         self._write_colors("color_box", self.color_box)
 
-    # @timed_function
+    @timed_function
     def set_state(self):
         self.state = []
 
@@ -1033,7 +1348,7 @@ $(document).ready(function()
                 square = side.squares[x]
                 square.side_name = self.color_to_side_name[square.color_name]
 
-    # @timed_function
+    @timed_function
     def cube_for_json(self):
         """
         Return a dictionary of the cube data so that we can json dump it
@@ -1061,7 +1376,7 @@ $(document).ready(function()
 
         return data
 
-    # @timed_function
+    @timed_function
     def assign_color_names(self, desc, squares_lists_all, color_permutations, color_box):
         """
         Assign a color name to each square in each squares_list. Compute
@@ -1096,21 +1411,36 @@ $(document).ready(function()
         # in squares_lists. Store this in distances_of_square_list_per_color
         distances_of_square_list_per_color = {}
 
-        for color_name in ref_ALL_COLORS:
+        table = self.get_reference_distances(color_box)
+
+        for (color_index, color_name) in enumerate(ref_ALL_COLORS):
             color_lab = color_box[color_name]
             distances_of_square_list_per_color[color_name] = []
 
             for (index, squares_list) in enumerate(squares_lists):
                 distance = 0
-                for square in squares_list:
-                    distance += lab_distance(square.lab, color_lab)
+                if table is None:
+                    for square in squares_list:
+                        distance += lab_distance(square.lab, color_lab)
+                else:
+                    for square in squares_list:
+                        distance += table[square.index][color_index]
                 distances_of_square_list_per_color[color_name].append(int(distance))
             distances_of_square_list_per_color[color_name] = distances_of_square_list_per_color[color_name]
 
         min_distance = 99999
         min_distance_permutation = None
 
-        if color_permutations == "even_cube_center_color_permutations":
+        if color_permutations == "even_cube_center_color_permutations" and self.assignment_engine == "hungarian":
+            # Matching the 6 squares_lists to the 6 colors is a linear assignment problem
+            costs = [
+                [distances_of_square_list_per_color[color_name][index] for color_name in ref_ALL_COLORS]
+                for index in range(len(squares_lists))
+            ]
+            min_distance_permutation = [ref_ALL_COLORS[col] for col in solve_assignment(costs)]
+
+        elif color_permutations == "even_cube_center_color_permutations":
+            # The "permutations" reference implementation, scan all 720 permutations
 
             # before sorting
             '''
@@ -1260,14 +1590,17 @@ $(document).ready(function()
             blue_squares,
         )
 
-    # @timed_function
-    def resolve_color_box(self):
+    @timed_function
+    def resolve_color_box(self, executor=None):
         """
         Temporarily assign names to all squares, use crayola colors as reference point.
 
         We use these name assignments to build our "color_box" which will be our
         references Wh, Ye, OR, Rd, Gr, Bu colors for assigning color names to edge
         and center squares.
+
+        executor is an optional concurrent.futures pool for the tsp_starts
+        starts of the pass 1 traveling salesman.
         """
 
         # Only works on odd cubes and can cause problems if the scan of the center square happens
@@ -1296,7 +1629,7 @@ $(document).ready(function()
                 crayola_colors,
             )
 
-            if self.write_debug_file:
+            if self.report.enabled:
                 self.write_colors("centers for color_box", center_squares)
 
         elif use_corner_squares:
@@ -1315,7 +1648,7 @@ $(document).ready(function()
                 crayola_colors,
             )
 
-            if self.write_debug_file:
+            if self.report.enabled:
                 self.write_colors("corners for color_box", sorted_corner_squares)
 
         elif use_all_squares:
@@ -1331,22 +1664,9 @@ $(document).ready(function()
 
             edge_pairs = []
 
-            if self.width == 2:
-                from rubikscolorresolver.cube_222 import corner_tuples
-            elif self.width == 3:
-                from rubikscolorresolver.cube_333 import corner_tuples
-            elif self.width == 4:
-                from rubikscolorresolver.cube_444 import corner_tuples
-            elif self.width == 5:
-                from rubikscolorresolver.cube_555 import corner_tuples
-            elif self.width == 6:
-                from rubikscolorresolver.cube_666 import corner_tuples
-            elif self.width == 7:
-                from rubikscolorresolver.cube_777 import corner_tuples
-
             corners = []
 
-            for corner_tuple in corner_tuples:
+            for corner_tuple in self.layout.corner_tuples:
                 corners.append((
                     self.pos2square[corner_tuple[0]],
                     self.pos2square[corner_tuple[1]],
@@ -1356,7 +1676,10 @@ $(document).ready(function()
             # ======
             # pass 1
             # ======
-            sorted_all_squares = traveling_salesman(all_squares, "all", middle_squares, edge_pairs, corners)
+            sorted_all_squares = traveling_salesman(
+                all_squares, "all", middle_squares, edge_pairs, corners, self.get_square_distances(),
+                self.tsp_optim_steps, self.tsp_time_budget_ms, self.get_tsp_rows(6),
+                self.tsp_starts, executor, self.tsp_deadline_ms)
 
             self.assign_color_names(
                 "squares for color_box (pass 1)",
@@ -1365,7 +1688,7 @@ $(document).ready(function()
                 crayola_colors,
             )
 
-            if self.write_debug_file:
+            if self.report.enabled:
                 self.write_colors("squares for color_box (pass 1)", sorted_all_squares)
 
             # ======
@@ -1415,9 +1738,16 @@ $(document).ready(function()
                 for square in side.center_squares + side.corner_squares + side.edge_squares:
                     square.color_name = None
 
-            sorted_green_blue = traveling_salesman_two_colors(green_squares + blue_squares, endpoints=green_blue_endpoints, desc="green blue")
-            sorted_white_yellow = traveling_salesman_two_colors(white_squares + yellow_squares, endpoints=white_yellow_endpoints, desc="white yellow")
-            sorted_red_orange = traveling_salesman_two_colors(red_squares + orange_squares, endpoints=red_orange_endpoints, desc="white yellow")
+            distances = self.get_square_distances()
+            sorted_green_blue = traveling_salesman_two_colors(
+                green_squares + blue_squares, green_blue_endpoints, "green blue", distances, self.tsp_optim_steps, self.tsp_time_budget_ms,
+                self.get_tsp_rows(2))
+            sorted_white_yellow = traveling_salesman_two_colors(
+                white_squares + yellow_squares, white_yellow_endpoints, "white yellow", distances, self.tsp_optim_steps, self.tsp_time_budget_ms,
+                self.get_tsp_rows(2))
+            sorted_red_orange = traveling_salesman_two_colors(
+                red_squares + orange_squares, red_orange_endpoints, "white yellow", distances, self.tsp_optim_steps, self.tsp_time_budget_ms,
+                self.get_tsp_rows(2))
             sorted_all_squares = sorted_green_blue + sorted_white_yellow + sorted_red_orange
 
             self.assign_color_names(
@@ -1427,7 +1757,7 @@ $(document).ready(function()
                 crayola_colors,
             )
 
-            if self.write_debug_file:
+            if self.report.enabled:
                 self.write_colors("squares for color_box (pass 2)", sorted_all_squares)
 
         else:
@@ -1450,27 +1780,63 @@ $(document).ready(function()
             for square in side.center_squares + side.corner_squares + side.edge_squares:
                 square.color_name = None
 
-        if self.write_debug_file:
+        if self.report.enabled:
             self.write_color_box()
 
-    # @timed_function
+    def get_square_distances(self):
+        """
+        The square_distance_matrix of this scan, computed on first use and
+        then sliced by every traveling salesman stage. None on micropython
+        where there is not enough memory for it.
+        """
+        if self.square_distances is None and not is_micropython():
+            self.square_distances = square_distance_matrix(self.store)
+
+        return self.square_distances
+
+    def get_reference_distances(self, color_box):
+        """
+        The reference_distance_table from every square to the colors of
+        color_box in ALL_COLORS order, computed once per color_box. None on
+        micropython.
+        """
+        if is_micropython():
+            return None
+
+        if self.reference_distances is None or self.reference_distances[0] is not color_box:
+            labs = [color_box[color_name] for color_name in ALL_COLORS]
+            self.reference_distances = (color_box, reference_distance_table(self.store, labs))
+
+        return self.reference_distances[1]
+
+    def get_tsp_rows(self, rows):
+        """
+        The rows argument for solve_tsp, None unless tsp_objective is "rows"
+        """
+        if self.tsp_objective == "rows":
+            return rows
+
+        return None
+
+    def get_color_box_squares(self):
+        """
+        Return a Square for each color_box color, used as the reference colors
+        when resolving corners and edges
+        """
+        squares = []
+
+        for color_name in ("Wh", "Ye", "OR", "Rd", "Gr", "Bu"):
+            lab = self.color_box[color_name]
+            squares.append(Square(None, color_name, lab.red, lab.green, lab.blue, color_name=color_name, lab=lab))
+
+        return squares
+
+    @timed_function
     def resolve_corner_squares(self):
         """
         Assign names to the corner squares
         """
-        white = Square(None, "Wh", self.color_box["Wh"].red, self.color_box["Wh"].green, self.color_box["Wh"].blue)
-        yellow = Square(None, "Ye", self.color_box["Ye"].red, self.color_box["Ye"].green, self.color_box["Ye"].blue)
-        orange = Square(None, "OR", self.color_box["OR"].red, self.color_box["OR"].green, self.color_box["OR"].blue)
-        red = Square(None, "Rd", self.color_box["Rd"].red, self.color_box["Rd"].green, self.color_box["Rd"].blue)
-        green = Square(None, "Gr", self.color_box["Gr"].red, self.color_box["Gr"].green, self.color_box["Gr"].blue)
-        blue = Square(None, "Bu", self.color_box["Bu"].red, self.color_box["Bu"].green, self.color_box["Bu"].blue)
-
-        white.color_name = "Wh"
-        yellow.color_name = "Ye"
-        orange.color_name = "OR"
-        red.color_name = "Rd"
-        green.color_name = "Gr"
-        blue.color_name = "Bu"
+        (white, yellow, orange, red, green, blue) = self.get_color_box_squares()
 
         target_corners = [
            (white, green, orange),
@@ -1483,29 +1849,19 @@ $(document).ready(function()
            (yellow, red, blue),
         ]
 
-        if self.width == 2:
-            from rubikscolorresolver.cube_222 import corner_tuples
-        elif self.width == 3:
-            from rubikscolorresolver.cube_333 import corner_tuples
-        elif self.width == 4:
-            from rubikscolorresolver.cube_444 import corner_tuples
-        elif self.width == 5:
-            from rubikscolorresolver.cube_555 import corner_tuples
-        elif self.width == 6:
-            from rubikscolorresolver.cube_666 import corner_tuples
-        elif self.width == 7:
-            from rubikscolorresolver.cube_777 import corner_tuples
-
         corners = []
 
-        for corner_tuple in corner_tuples:
+        for corner_tuple in self.layout.corner_tuples:
             corners.append([
                 self.pos2square[corner_tuple[0]],
                 self.pos2square[corner_tuple[1]],
                 self.pos2square[corner_tuple[2]],
             ])
 
-        sorted_corners = traveling_salesman_corners(target_corners + corners, "corners")
+        if self.corner_engine == "matching":
+            sorted_corners = match_corners(target_corners, corners)
+        else:
+            sorted_corners = traveling_salesman_corners(target_corners + corners, "corners")
 
         # assign color names
         for x in range(0, len(sorted_corners), 2):
@@ -1515,105 +1871,139 @@ $(document).ready(function()
             corner2[1].color_name = corner1[1].position
             corner2[2].color_name = corner1[2].position
 
-        if self.write_debug_file:
+        if self.report.enabled:
             self.write_color_corners("corners" , sorted_corners)
 
-    # @timed_function
-    def resolve_edge_squares(self):
+    @timed_function
+    def start_edge_squares(self, executor=None):
+        """
+        Gather the edge pairs of every orbit and, when edge_engine is
+        "assignment", start matching each orbit. executor is an optional
+        concurrent.futures executor the orbits are submitted to. Returns what
+        resolve_edge_squares needs to finish.
+        """
+        references = self.get_color_box_squares()
+        reference_index = {}
+
+        for (index, reference) in enumerate(references):
+            reference_index[reference.position] = index
+
+        # Gather the edge pairs of every orbit in a single pass
+        orbit_edge_pairs = [[] for x in range(self.orbits)]
+        seen = set()
+
+        for side in (self.sideU, self.sideD, self.sideL, self.sideR):
+            for square in side.edge_squares:
+                partner_index = side.get_wing_partner(square.position)
+
+                if (partner_index, square.position) in seen:
+                    continue
+
+                seen.add((square.position, partner_index))
+                orbit_edge_pairs[self.layout.edge_orbit_id[square.position]].append((square, self.pos2square[partner_index]))
+
+        for edge_pairs in orbit_edge_pairs:
+            if len(edge_pairs) != 12 and len(edge_pairs) != 24:
+                raise ValueError("found {} edge pairs".format(len(edge_pairs)))
+
+        if self.edge_engine == "assignment":
+            # The distance from every wing to each of the six references,
+            # computed once and shared by all of the orbits
+            wings = []
+
+            for edge_pairs in orbit_edge_pairs:
+                for edge_pair in edge_pairs:
+                    wings.extend(edge_pair)
+
+            table = self.get_reference_distances(self.color_box)
+            columns = [ALL_COLORS.index(reference.position) for reference in references]
+
+            if table is None:
+                distances = [[lab_distance(wing.lab, reference.lab) for reference in references] for wing in wings]
+            else:
+                distances = [[table[wing.index][column] for column in columns] for wing in wings]
+            tasks = []
+            wing_offset = 0
+
+            for edge_pairs in orbit_edge_pairs:
+                target_pairs = []
+
+                for (color_name0, color_name1) in EDGE_COLOR_PAIRS:
+                    target_pair = (reference_index[color_name0], reference_index[color_name1])
+
+                    for x in range(len(edge_pairs) // 12):
+                        target_pairs.append(target_pair)
+
+                wing_pairs = [(wing_offset + (x * 2), wing_offset + (x * 2) + 1) for x in range(len(edge_pairs))]
+                wing_offset += len(edge_pairs) * 2
+                tasks.append((target_pairs, wing_pairs))
+
+            if executor is None:
+                results = [match_edge_pairs(target_pairs, wing_pairs, distances) for (target_pairs, wing_pairs) in tasks]
+            else:
+                # futures, resolve_edge_squares waits for them
+                results = [executor.submit(match_edge_pairs, target_pairs, wing_pairs, distances) for (target_pairs, wing_pairs) in tasks]
+
+        else:
+            tasks = None
+            results = None
+
+        return (references, reference_index, orbit_edge_pairs, tasks, results)
+
+    @timed_function
+    def resolve_edge_squares(self, executor=None, started=None):
         """
-        Use traveling salesman algorithm to sort the colors
+        Assign names to the edge squares, one orbit at a time. executor is an
+        optional concurrent.futures executor used to resolve the orbits in
+        parallel when edge_engine is "assignment". started is the result of an
+        earlier start_edge_squares call.
         """
 
         # Nothing to be done for 2x2x2
         if self.width == 2:
             return
-        elif self.width == 3:
-            from rubikscolorresolver.cube_333 import edge_orbit_id
-        elif self.width == 4:
-            from rubikscolorresolver.cube_444 import edge_orbit_id
-        elif self.width == 5:
-            from rubikscolorresolver.cube_555 import edge_orbit_id
-        elif self.width == 6:
-            from rubikscolorresolver.cube_666 import edge_orbit_id
-        elif self.width == 7:
-            from rubikscolorresolver.cube_777 import edge_orbit_id
-
-        white = Square(None, "Wh", self.color_box["Wh"].red, self.color_box["Wh"].green, self.color_box["Wh"].blue)
-        yellow = Square(None, "Ye", self.color_box["Ye"].red, self.color_box["Ye"].green, self.color_box["Ye"].blue)
-        orange = Square(None, "OR", self.color_box["OR"].red, self.color_box["OR"].green, self.color_box["OR"].blue)
-        red = Square(None, "Rd", self.color_box["Rd"].red, self.color_box["Rd"].green, self.color_box["Rd"].blue)
-        green = Square(None, "Gr", self.color_box["Gr"].red, self.color_box["Gr"].green, self.color_box["Gr"].blue)
-        blue = Square(None, "Bu", self.color_box["Bu"].red, self.color_box["Bu"].green, self.color_box["Bu"].blue)
-
-        white.color_name = "Wh"
-        yellow.color_name = "Ye"
-        orange.color_name = "OR"
-        red.color_name = "Rd"
-        green.color_name = "Gr"
-        blue.color_name = "Bu"
-
-        for target_orbit_id in range(self.orbits):
-            edge_pairs = []
 
-            for side in (self.sideU, self.sideD, self.sideL, self.sideR):
-                for square in side.edge_squares:
-                    orbit_id = edge_orbit_id[square.position]
-
-                    if orbit_id == target_orbit_id:
-                        partner_index = side.get_wing_partner(square.position)
-                        partner = self.pos2square[partner_index]
-                        edge_pair = (square, partner)
-
-                        if edge_pair not in edge_pairs and (edge_pair[1], edge_pair[0]) not in edge_pairs:
-                            edge_pairs.append(edge_pair)
-
-            if len(edge_pairs) == 12:
-                target_edge_pairs = [
-                    (white, orange),
-                    (white, red),
-                    (white, green),
-                    (white, blue),
-                    (green, orange),
-                    (green, red),
-                    (blue, orange),
-                    (blue, red),
-                    (yellow, orange),
-                    (yellow, red),
-                    (yellow, green),
-                    (yellow, blue),
-                ]
-
-            elif len(edge_pairs) == 24:
-                target_edge_pairs = [
-                    (white, orange),
-                    (white, orange),
-                    (white, red),
-                    (white, red),
-                    (white, green),
-                    (white, green),
-                    (white, blue),
-                    (white, blue),
-                    (green, orange),
-                    (green, orange),
-                    (green, red),
-                    (green, red),
-                    (blue, orange),
-                    (blue, orange),
-                    (blue, red),
-                    (blue, red),
-                    (yellow, orange),
-                    (yellow, orange),
-                    (yellow, red),
-                    (yellow, red),
-                    (yellow, green),
-                    (yellow, green),
-                    (yellow, blue),
-                    (yellow, blue),
-                ]
-            else:
-                raise ValueError("found {} edge pairs".format(len(edge_pairs)))
+        if started is None:
+            started = self.start_edge_squares(executor)
+
+        (references, reference_index, orbit_edge_pairs, tasks, results) = started
 
-            sorted_edge_pairs = traveling_salesman_edge_pairs(target_edge_pairs + edge_pairs, "edge pairs")
+        if tasks is not None:
+            if hasattr(results[0], "result"):
+                results = [future.result() for future in results]
+
+            orbit_sorted_edge_pairs = []
+
+            for ((target_pairs, wing_pairs), result, edge_pairs) in zip(tasks, results, orbit_edge_pairs):
+                sorted_edge_pairs = []
+
+                for (target_index, edge_pair_index, flipped) in result:
+                    (target0, target1) = target_pairs[target_index]
+                    edge_pair = edge_pairs[edge_pair_index]
+
+                    if flipped:
+                        edge_pair = (edge_pair[1], edge_pair[0])
+
+                    sorted_edge_pairs.append((references[target0], references[target1]))
+                    sorted_edge_pairs.append(edge_pair)
+
+                orbit_sorted_edge_pairs.append(sorted_edge_pairs)
+
+        else:
+            orbit_sorted_edge_pairs = []
+
+            for edge_pairs in orbit_edge_pairs:
+                target_edge_pairs = []
+
+                for (color_name0, color_name1) in EDGE_COLOR_PAIRS:
+                    target_pair = (references[reference_index[color_name0]], references[reference_index[color_name1]])
+
+                    for x in range(len(edge_pairs) // 12):
+                        target_edge_pairs.append(target_pair)
+
+                orbit_sorted_edge_pairs.append(traveling_salesman_edge_pairs(target_edge_pairs + edge_pairs, "edge pairs"))
+
+        for (target_orbit_id, sorted_edge_pairs) in enumerate(orbit_sorted_edge_pairs):
 
             # assign color names
             for x in range(0, len(sorted_edge_pairs), 2):
@@ -1622,29 +2012,34 @@ $(document).ready(function()
                 pair2[0].color_name = pair1[0].position
                 pair2[1].color_name = pair1[1].position
 
-            if self.write_debug_file:
+            if self.report.enabled:
                 self.write_color_edge_pairs("edges - orbit %d" % target_orbit_id, sorted_edge_pairs)
 
-    # @timed_function
-    def resolve_center_squares(self):
+    @timed_function
+    def start_center_squares(self, executor):
         """
-        Use traveling salesman algorithm to sort the squares by color
+        Submit the traveling salesman of each center group to executor,
+        returns a dict of center group to the future of its path
         """
+        center_paths = {}
 
-        if self.width == 2:
-            return
-        elif self.width == 3:
-            from rubikscolorresolver.cube_333 import center_groups
-        elif self.width == 4:
-            from rubikscolorresolver.cube_444 import center_groups
-        elif self.width == 5:
-            from rubikscolorresolver.cube_555 import center_groups
-        elif self.width == 6:
-            from rubikscolorresolver.cube_666 import center_groups
-        elif self.width == 7:
-            from rubikscolorresolver.cube_777 import center_groups
-
-        for (desc, centers_squares) in center_groups:
+        for (desc, centers_squares) in self.layout.center_groups:
+            if desc != "centers":
+                center_squares = [self.pos2square[position] for position in centers_squares]
+                center_paths[desc] = executor.submit(
+                    solve_tsp, tsp_matrix(center_squares, self.get_square_distances()), self.tsp_optim_steps,
+                    desc=desc, time_budget_ms=self.tsp_time_budget_ms, rows=self.get_tsp_rows(6))
+
+        return center_paths
+
+    @timed_function
+    def resolve_center_squares(self, center_paths=None):
+        """
+        Use traveling salesman algorithm to sort the squares by color.
+        center_paths is the result of an earlier start_center_squares call.
+        """
+
+        for (desc, centers_squares) in self.layout.center_groups:
             #log.debug("\n\n\n\n")
             #log.info("Resolve {}".format(desc))
             center_squares = []
@@ -1656,71 +2051,121 @@ $(document).ready(function()
             if desc == "centers":
                 sorted_center_squares = center_squares[:]
                 permutations = "odd_cube_center_color_permutations"
+            elif center_paths is not None:
+                sorted_center_squares = [center_squares[x] for x in center_paths[desc].result()]
+                permutations = "even_cube_center_color_permutations"
             else:
-                sorted_center_squares = traveling_salesman(center_squares, desc)
+                sorted_center_squares = traveling_salesman(
+                    center_squares, desc, distances=self.get_square_distances(),
+                    optim_steps=self.tsp_optim_steps, time_budget_ms=self.tsp_time_budget_ms,
+                    rows=self.get_tsp_rows(6))
                 permutations = "even_cube_center_color_permutations"
 
             self.assign_color_names(desc, sorted_center_squares, permutations, self.color_box)
 
-            if self.write_debug_file:
+            if self.report.enabled:
                 self.write_colors(desc, sorted_center_squares)
 
-    # @timed_function
-    def crunch_colors(self):
-        if self.write_debug_file:
-            html_init_cube = self.html_cube("Initial RGB values", False, "initial_rgb_values")
-            self.write_html(html_init_cube)
-            self.write_crayola_colors()
-
-        gc.collect()
-        self.resolve_color_box()
-
-        # corners
-        gc.collect()
-        self.resolve_corner_squares()
-
-        # centers
-        gc.collect()
-        self.resolve_center_squares()
-
-        # edges
-        gc.collect()
-        self.resolve_edge_squares()
-        gc.collect()
-        self.set_state()
-        gc.collect()
-        self.sanity_check_edge_squares()
-        gc.collect()
-        self.validate_all_corners_found()
-        gc.collect()
-        self.validate_odd_cube_midge_vs_corner_parity()
-        gc.collect()
-
-        if self.write_debug_file:
-            html_final_cube = self.html_cube("Final Cube", True, "final_cube")
-            html = "<div id='bottom'>{}{}</div>".format(html_init_cube, html_final_cube)
-
-            self.write_html(html)
-            self.www_footer()
+    @timed_function
+    def crunch_colors(self, executor=None):
+        """
+        Resolve the color of every square. executor is an optional
+        concurrent.futures thread or process pool, the center groups and the
+        edge orbits are then resolved on it while the corners are resolved
+        here, as are the extra tsp_starts of the color box. The results are
+        the same either way unless tsp_deadline_ms drops some of those starts.
+        """
+        try:
+            if self.report.enabled:
+                html_init_cube = self.html_cube("Initial RGB values", False, "initial_rgb_values")
+                self.write_html(html_init_cube)
+                self.write_crayola_colors()
+
+            gc.collect()
+            self.resolve_color_box(executor)
+
+            if executor is not None:
+                # The corners, center groups and edge orbits are disjoint sets
+                # of squares. Start the center groups and edge orbits on
+                # executor and resolve the corners while they run.
+                center_paths = self.start_center_squares(executor)
+
+                if self.width > 2:
+                    started_edges = self.start_edge_squares(executor)
+
+                self.resolve_corner_squares()
+                self.resolve_center_squares(center_paths)
+
+                if self.width > 2:
+                    self.resolve_edge_squares(started=started_edges)
+
+            else:
+                # corners
+                gc.collect()
+                self.resolve_corner_squares()
+
+                # centers
+                gc.collect()
+                self.resolve_center_squares()
+
+                # edges
+                gc.collect()
+                self.resolve_edge_squares()
+
+            gc.collect()
+            self.set_state()
+            gc.collect()
+            self.sanity_check_edge_squares()
+            gc.collect()
+            self.validate_all_corners_found()
+            gc.collect()
+            self.validate_odd_cube_midge_vs_corner_parity()
+            gc.collect()
+
+            if self.report.enabled:
+                html_final_cube = self.html_cube("Final Cube", True, "final_cube")
+                html = "<div id='bottom'>{}{}</div>".format(html_init_cube, html_final_cube)
+
+                self.write_html(html)
+                self.www_footer()
+
+        finally:
+            # A FileReport is written here, once, even if resolving failed
+            if self.report.enabled:
+                self.report.flush()
 
     def print_profile_data(self):
-        #print_profile_data()
-        pass
+        print_profile_data()
 
 
-# @timed_function
+@timed_function
 def resolve_colors(argv):
     help_string = """usage: rubiks-color-resolver.py [-h] [-j] [--filename FILENAME] [--rgb RGB]
+                                [--batch FILENAME] [--processes PROCESSES] [--unordered]
+                                [--serve-http PORT] [--serve-unix PATH]
 
     optional arguments:
-      -h, --help           show this help message and exit
-      -j, --json           Print json results
-      --filename FILENAME  Print json results
-      --rgb RGB            RGB json
+      -h, --help             show this help message and exit
+      -j, --json             Print json results
+      --filename FILENAME    RGB json or binary scan file
+      --rgb RGB              RGB json
+      --batch FILENAME       Resolve one RGB json per line of FILENAME, - is stdin,
+                             and print one json result per line
+      --processes PROCESSES  Number of worker processes for --batch and --serve-*, default one per CPU.
+                             For a single scan, resolve its center groups and edge orbits on
+                             this many worker processes, default none
+      --unordered            Print --batch results as they are ready instead of in input order
+      --serve-http PORT      Resolve scans POSTed to http://127.0.0.1:PORT/resolve until interrupted
+      --serve-unix PATH      Resolve scans sent to the Unix domain socket PATH until interrupted
     """
     filename = None
     rgb = None
     use_json = False
+    batch_filename = None
+    processes = None
+    ordered = True
+    http_port = None
+    unix_path = None
     argv_index = 1
 
     while argv_index < len(argv):
@@ -1741,13 +2186,56 @@ def resolve_colors(argv):
             use_json = True
             argv_index += 1
 
+        elif argv[argv_index] == "--batch":
+            batch_filename = argv[argv_index + 1]
+            argv_index += 2
+
+        elif argv[argv_index] == "--processes":
+            try:
+                processes = int(argv[argv_index + 1])
+            except (IndexError, ValueError):
+                processes = 0
+
+            if processes < 1:
+                print("ERROR: --processes must be a positive integer")
+                print(help_string)
+                sys.exit(1)
+
+            argv_index += 2
+
+        elif argv[argv_index] == "--unordered":
+            ordered = False
+            argv_index += 1
+
+        elif argv[argv_index] == "--serve-http":
+            http_port = int(argv[argv_index + 1])
+            argv_index += 2
+
+        elif argv[argv_index] == "--serve-unix":
+            unix_path = argv[argv_index + 1]
+            argv_index += 2
+
         else:
             print(help_string)
             sys.exit(1)
 
+    if http_port is not None or unix_path is not None:
+        from rubikscolorresolver.service import serve
+        serve(http_port, unix_path, processes)
+        return None
+
+    if batch_filename:
+        from rubikscolorresolver.batch import resolve_batch
+
+        if batch_filename == "-":
+            return resolve_batch(sys.stdin, sys.stdout, processes, use_json, ordered)
+
+        with open(batch_filename, "r") as fh:
+            return resolve_batch(fh, sys.stdout, processes, use_json, ordered)
+
     if filename:
-        with open(filename, "r") as fh:
-            rgb = "".join(fh.readlines())
+        with open(filename, "rb") as fh:
+            rgb = fh.read()
     elif rgb:
         pass
     else:
@@ -1755,19 +2243,25 @@ def resolve_colors(argv):
         sys.exit(1)
 
     argv = None
-    scan_data = eval(rgb)
 
-    for key, value in scan_data.items():
-        scan_data[key] = tuple(value)
-
-    square_count = len(list(scan_data.keys()))
-    square_count_per_side = int(square_count / 6)
-    width = int(sqrt(square_count_per_side))
+    try:
+        (width, rgb) = decode_scan(rgb)
+    except ScanDataError as e:
+        print("ERROR: {}".format(e))
+        sys.exit(1)
 
     cube = RubiksColorSolverGeneric(width)
-    cube.write_debug_file = True
-    cube.enter_scan_data(scan_data)
-    cube.crunch_colors()
+    cube.report = FileReport(HTML_FILENAME)
+    cube.enter_scan_data(rgb)
+
+    if processes is not None and processes > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(processes) as executor:
+            cube.crunch_colors(executor)
+    else:
+        cube.crunch_colors()
+
     cube.print_profile_data()
     cube.print_cube()
 
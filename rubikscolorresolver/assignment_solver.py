@@ -0,0 +1,90 @@
+"""
+Solve the linear assignment problem: given a cost matrix with one row per
+worker and one column per job, assign each row a distinct column such that
+the total cost is minimal.
+
+This is the shortest augmenting path formulation of the Hungarian algorithm
+(Jonker-Volgenant), it runs in O(rows * rows * cols).
+"""
+
+
+def solve_assignment(costs):
+    """
+    :arg: costs : list of rows, each row is a list of costs. There must not be
+                  more rows than columns.
+
+    Returns a list where entry x is the column assigned to row x.
+    """
+    rows = len(costs)
+
+    if rows == 0:
+        return []
+
+    cols = len(costs[0])
+
+    if rows > cols:
+        raise ValueError("{} rows but only {} columns".format(rows, cols))
+
+    INF = float("inf")
+
+    # Row and column potentials. Column 0 is a virtual column used to
+    # start each augmenting path.
+    u = [0] * (rows + 1)
+    v = [0] * (cols + 1)
+
+    # col_to_row[col] is the row (1 based) assigned to col, 0 means none
+    col_to_row = [0] * (cols + 1)
+    way = [0] * (cols + 1)
+
+    for row in range(1, rows + 1):
+        col_to_row[0] = row
+        col0 = 0
+        min_slack = [INF] * (cols + 1)
+        used = [False] * (cols + 1)
+
+        # Dijkstra like search for the shortest augmenting path from row
+        while True:
+            used[col0] = True
+            row0 = col_to_row[col0]
+            row0_costs = costs[row0 - 1]
+            row0_u = u[row0]
+            delta = INF
+            col1 = 0
+
+            for col in range(1, cols + 1):
+                if not used[col]:
+                    slack = row0_costs[col - 1] - row0_u - v[col]
+
+                    if slack < min_slack[col]:
+                        min_slack[col] = slack
+                        way[col] = col0
+
+                    if min_slack[col] < delta:
+                        delta = min_slack[col]
+                        col1 = col
+
+            for col in range(cols + 1):
+                if used[col]:
+                    u[col_to_row[col]] += delta
+                    v[col] -= delta
+                else:
+                    min_slack[col] -= delta
+
+            col0 = col1
+
+            if col_to_row[col0] == 0:
+                break
+
+        # Flip the assignments along the augmenting path
+        while col0:
+            col1 = way[col0]
+            col_to_row[col0] = col_to_row[col1]
+            col0 = col1
+
+    assignment = [0] * rows
+
+    for col in range(1, cols + 1):
+        if col_to_row[col]:
+            assignment[col_to_row[col] - 1] = col - 1
+
+    return assignment
@@ -1,6 +1,9 @@
 
-#from rubikscolorresolver.profile import timed_function
+from rubikscolorresolver.profile import timed_function
+from array import array
 from math import ceil, sqrt
+from rubikscolorresolver.layout import get_layout
+from rubikscolorresolver.report import NullReport
 import sys
 
 if sys.version_info < (3, 4):
@@ -13,12 +16,23 @@ def is_micropython():
 
 if is_micropython():
     from ucollections import OrderedDict
+    numpy = None
+
+    # LEGO SPIKE micropython builds use single precision floats
+    LAB_TYPECODE = "f"
 else:
     from collections import OrderedDict
-    from rubikscolorresolver.cie2000 import lab_distance_cie2000
+    from rubikscolorresolver.cie2000 import lab_distance_cie2000, numpy
+    LAB_TYPECODE = "d"
+
+# CubeStore keeps color names and side names as uint8 codes, 0 is None
+COLOR_NAMES = (None, "Bu", "Gr", "OR", "Rd", "Wh", "Ye")
+SIDE_NAMES = (None, "U", "L", "F", "R", "B", "D")
+color_name_to_code = {name: code for (code, name) in enumerate(COLOR_NAMES)}
+side_name_to_code = {name: code for (code, name) in enumerate(SIDE_NAMES)}
 
 
-# @timed_function
+@timed_function
 def lab_distance(lab1, lab2):
     """
     http://www.w3resource.com/python-exercises/math/python-math-exercise-79.php
@@ -83,7 +97,7 @@ class ListMissingValue(Exception):
     pass
 
 
-# @timed_function
+@timed_function
 def find_index_for_value(list_foo, target, min_index):
     for (index, value) in enumerate(list_foo):
         if value == target and index >= min_index:
@@ -91,7 +105,7 @@ def find_index_for_value(list_foo, target, min_index):
     raise ListMissingValue("Did not find %s in list %s".format(target, list_foo))
 
 
-# @timed_function
+@timed_function
 def get_swap_count(listA, listB):
     """
     How many swaps do we have to make in listB for it to match listA
@@ -146,8 +160,9 @@ def get_swap_count(listA, listB):
 
 
 class LabColor(object):
+    __slots__ = ("L", "a", "b", "red", "green", "blue")
 
-    # @timed_function
+    @timed_function
     def __init__(self, L, a, b, red, green, blue):
         self.L = L
         self.a = a
@@ -172,39 +187,29 @@ class LabColor(object):
         return self.b < other.b
 
 
-# @timed_function
-def rgb2lab(inputColor):
-    (red, green, blue) = inputColor
-
-    # XYZ -> Standard-RGB
-    # https://www.easyrgb.com/en/math.php
-    var_R = red / 255
-    var_G = green / 255
-    var_B = blue / 255
+def srgb_to_linear(value):
+    """
+    Standard-RGB channel value (0 - 255) to a linear RGB value (0 - 100)
+    """
+    value = value / 255
 
-    if var_R > 0.04045:
-        var_R = pow(((var_R + 0.055) / 1.055), 2.4)
+    if value > 0.04045:
+        value = pow(((value + 0.055) / 1.055), 2.4)
     else:
-        var_R = var_R / 12.92
+        value = value / 12.92
 
-    if var_G > 0.04045:
-        var_G = pow(((var_G + 0.055) / 1.055), 2.4)
-    else:
-        var_G = var_G / 12.92
+    return value * 100
 
-    if var_B > 0.04045:
-        var_B = pow(((var_B + 0.055) / 1.055), 2.4)
-    else:
-        var_B = var_B / 12.92
 
-    var_R = var_R * 100
-    var_G = var_G * 100
-    var_B = var_B * 100
+# The same gamma expansion is used for red, green and blue so a single
+# 256 entry table covers all three channels
+srgb_to_linear_table = tuple(srgb_to_linear(value) for value in range(256))
+
+if numpy is not None:
+    srgb_to_linear_array = numpy.array(srgb_to_linear_table, dtype=float)
 
-    X = var_R * 0.4124 + var_G * 0.3576 + var_B * 0.1805
-    Y = var_R * 0.2126 + var_G * 0.7152 + var_B * 0.0722
-    Z = var_R * 0.0193 + var_G * 0.1192 + var_B * 0.9505
 
+def xyz2lab(X, Y, Z, red, green, blue):
     reference_X = 95.047
     reference_Y = 100.0
     reference_Z = 108.883
@@ -238,6 +243,74 @@ def rgb2lab(inputColor):
     return LabColor(L, a, b, red, green, blue)
 
 
+@timed_function
+def rgb2lab(inputColor):
+    (red, green, blue) = inputColor
+
+    # XYZ -> Standard-RGB
+    # https://www.easyrgb.com/en/math.php
+    try:
+        # A negative index would read the table from the end
+        if red < 0 or green < 0 or blue < 0:
+            raise IndexError
+
+        var_R = srgb_to_linear_table[red]
+        var_G = srgb_to_linear_table[green]
+        var_B = srgb_to_linear_table[blue]
+    except (IndexError, TypeError):
+        # Not an int between 0 and 255
+        var_R = srgb_to_linear(red)
+        var_G = srgb_to_linear(green)
+        var_B = srgb_to_linear(blue)
+
+    X = var_R * 0.4124 + var_G * 0.3576 + var_B * 0.1805
+    Y = var_R * 0.2126 + var_G * 0.7152 + var_B * 0.0722
+    Z = var_R * 0.0193 + var_G * 0.1192 + var_B * 0.9505
+
+    return xyz2lab(X, Y, Z, red, green, blue)
+
+
+@timed_function
+def rgb2lab_many(buffer):
+    """
+    Convert a flat buffer of red, green, blue values (bytes, bytearray, array
+    or list of ints 0 - 255) to a list of LabColor objects, one per RGB triple.
+
+    The results are identical to calling rgb2lab for each triple. With numpy
+    the gamma expansion and XYZ conversion are done for the whole buffer at once.
+    """
+    if len(buffer) % 3:
+        raise ValueError("buffer length {} is not a multiple of 3".format(len(buffer)))
+
+    if numpy is None:
+        return [rgb2lab((buffer[index], buffer[index + 1], buffer[index + 2])) for index in range(0, len(buffer), 3)]
+
+    if isinstance(buffer, (bytes, bytearray)):
+        rgb = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    else:
+        rgb = numpy.array(buffer, dtype=numpy.intp)
+
+    if rgb.size and (rgb.min() < 0 or rgb.max() > 255):
+        raise ValueError("RGB values must be between 0 and 255")
+
+    rgb = rgb.reshape(-1, 3)
+    linear = srgb_to_linear_array[rgb]
+    var_R = linear[:, 0]
+    var_G = linear[:, 1]
+    var_B = linear[:, 2]
+
+    X = var_R * 0.4124 + var_G * 0.3576 + var_B * 0.1805
+    Y = var_R * 0.2126 + var_G * 0.7152 + var_B * 0.0722
+    Z = var_R * 0.0193 + var_G * 0.1192 + var_B * 0.9505
+
+    # numpy.power does not always match pow() in the last bit so the cube
+    # roots in xyz2lab are done one value at a time
+    return [
+        xyz2lab(X, Y, Z, red, green, blue)
+        for ((red, green, blue), X, Y, Z) in zip(rgb.tolist(), X.tolist(), Y.tolist(), Z.tolist())
+    ]
+
+
 def rgb_to_hsv(r, g, b):
     mx = max(r, g, b)
     mn = min(r, g, b)
@@ -261,14 +334,143 @@ def rgb_to_hsv(r, g, b):
     return (h, s, v)
 
 
+class CubeStore(object):
+    """
+    Structure of arrays holding the Lab and RGB values, color name and side
+    name of each square, indexed by square position (index 0 is unused for a
+    cube).  Square and SquareLab objects are views into a CubeStore.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.L = array(LAB_TYPECODE, [0] * size)
+        self.a = array(LAB_TYPECODE, [0] * size)
+        self.b = array(LAB_TYPECODE, [0] * size)
+        self.red = array("B", [0] * size)
+        self.green = array("B", [0] * size)
+        self.blue = array("B", [0] * size)
+        self.color = array("B", [0] * size)
+        self.side = array("B", [0] * size)
+
+    def set_lab(self, index, lab):
+        self.L[index] = lab.L
+        self.a[index] = lab.a
+        self.b[index] = lab.b
+        self.red[index] = lab.red
+        self.green[index] = lab.green
+        self.blue[index] = lab.blue
+
+
+class SquareLab(object):
+    """
+    A read only LabColor view of one square in a CubeStore
+    """
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def L(self):
+        return self.store.L[self.index]
+
+    @property
+    def a(self):
+        return self.store.a[self.index]
+
+    @property
+    def b(self):
+        return self.store.b[self.index]
+
+    @property
+    def red(self):
+        return self.store.red[self.index]
+
+    @property
+    def green(self):
+        return self.store.green[self.index]
+
+    @property
+    def blue(self):
+        return self.store.blue[self.index]
+
+    def to_labcolor(self):
+        """
+        Copy the values to a LabColor, plain attribute access on a LabColor is
+        cheaper than going through the properties here in hot loops
+        """
+        store = self.store
+        index = self.index
+        return LabColor(
+            store.L[index],
+            store.a[index],
+            store.b[index],
+            store.red[index],
+            store.green[index],
+            store.blue[index],
+        )
+
+    def __str__(self):
+        return "Lab (%s, %s, %s)" % (self.L, self.a, self.b)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __lt__(self, other):
+        if self.L != other.L:
+            return self.L < other.L
+
+        if self.a != other.a:
+            return self.a < other.a
+
+        return self.b < other.b
+
+
 class Square(object):
+    """
+    A view of one square in a CubeStore.  A Square that is not part of a cube
+    (the color_box reference squares) gets a CubeStore of its own.
+    """
 
-    def __init__(self, side, position, red, green, blue, side_name=None, color_name=None):
+    __slots__ = ("side", "position", "store", "index", "lab")
+
+    def __init__(self, side, position, red, green, blue, side_name=None, color_name=None, store=None, lab=None):
+        if store is None:
+            store = CubeStore(1)
+            index = 0
+        else:
+            index = position
+
+        if lab is None:
+            lab = rgb2lab((red, green, blue))
+
+        self.side = side
         self.position = position
-        self.lab = rgb2lab((red, green, blue))
-        self.side_name = side_name # ULFRBD
+        self.store = store
+        self.index = index
+        self.lab = SquareLab(store, index)
+        store.set_lab(index, lab)
+        self.side_name = side_name  # ULFRBD
         self.color_name = color_name
 
+    @property
+    def color_name(self):
+        return COLOR_NAMES[self.store.color[self.index]]
+
+    @color_name.setter
+    def color_name(self, color_name):
+        self.store.color[self.index] = color_name_to_code[color_name]
+
+    @property
+    def side_name(self):
+        return SIDE_NAMES[self.store.side[self.index]]
+
+    @side_name.setter
+    def side_name(self, side_name):
+        self.store.side[self.index] = side_name_to_code[side_name]
+
     def __str__(self):
         return "{}{}-{}".format(self.side, self.position, self.color_name)
 
@@ -364,9 +566,9 @@ class Side(object):
     def __repr__(self):
         return self.__str__()
 
-    # @timed_function
-    def set_square(self, position, red, green, blue, side_name=None, color_name=None):
-        self.squares[position] = Square(self, position, red, green, blue, side_name, color_name)
+    @timed_function
+    def set_square(self, position, red, green, blue, side_name=None, color_name=None, lab=None):
+        self.squares[position] = Square(self, position, red, green, blue, side_name, color_name, self.cube.store, lab)
 
         if position in self.center_pos:
             self.center_squares.append(self.squares[position])
@@ -380,7 +582,7 @@ class Side(object):
         else:
             raise Exception("Could not determine egde vs corner vs center")
 
-    # @timed_function
+    @timed_function
     def calculate_wing_partners(self):
         for (pos1, pos2) in self.cube.all_edge_positions:
             if pos1 >= self.min_pos and pos1 <= self.max_pos:
@@ -388,7 +590,7 @@ class Side(object):
             elif pos2 >= self.min_pos and pos2 <= self.max_pos:
                 self.wing_partner[pos2] = pos1
 
-    # @timed_function
+    @timed_function
     def get_wing_partner(self, wing_index):
         try:
             return self.wing_partner[wing_index]
@@ -408,7 +610,46 @@ class RubiksColorSolverGenericBase(object):
         self.orange_baseline = None
         self.red_baseline = None
         self.all_edge_positions = []
-        self.write_debug_file = False
+        self.report = NullReport()
+
+        # The distances between squares and from squares to the reference
+        # colors, see RubiksColorSolverGeneric.get_square_distances
+        self.square_distances = None
+        self.reference_distances = None
+        self.store = CubeStore((self.squares_per_side * 6) + 1)
+        self.layout = get_layout(self.width)
+
+        # How RubiksColorSolverGeneric.assign_color_names matches 6 buckets of
+        # squares to 6 colors, "hungarian" or the "permutations" reference scan
+        self.assignment_engine = "hungarian"
+
+        # How RubiksColorSolverGeneric.resolve_corner_squares pairs the scanned
+        # corners with the 8 target corners, "matching" or "tsp"
+        self.corner_engine = "matching"
+
+        # How RubiksColorSolverGeneric.resolve_edge_squares pairs the scanned
+        # edge pairs of each orbit with the 12 target edges, "assignment" or "tsp"
+        self.edge_engine = "assignment"
+
+        # The local search solve_tsp runs on the greedy path of the color box
+        # and center group traveling salesman problems: at most tsp_optim_steps
+        # moves (0 is no limit) for at most tsp_time_budget_ms each. Neither
+        # set is the greedy path alone.
+        self.tsp_optim_steps = 0
+        self.tsp_time_budget_ms = None
+
+        # What the color box and center group traveling salesman problems
+        # minimize: "path" is the length of the whole path, "rows" is
+        # calc_path_cost, the length within each of the buckets that
+        # assign_color_names cuts the path into
+        self.tsp_objective = "path"
+
+        # How many greedy solves the pass 1 color box traveling salesman keeps
+        # the best of, see tsp_solver_multistart.py. Starts still running after
+        # tsp_deadline_ms on the crunch_colors executor are dropped; they are
+        # not stopped, so this bounds which paths are used, not the runtime.
+        self.tsp_starts = 1
+        self.tsp_deadline_ms = None
 
         if self.width % 2 == 0:
             self.even = True
@@ -436,8 +677,9 @@ class RubiksColorSolverGenericBase(object):
         self.sideB = self.sides["B"]
         self.sideD = self.sides["D"]
         self.side_order = ("U", "L", "F", "R", "B", "D")
-        self.pos2side = {}
-        self.pos2square = {}
+        # indexed by square position, index 0 is unused
+        self.pos2side = [None] * ((self.squares_per_side * 6) + 1)
+        self.pos2square = [None] * ((self.squares_per_side * 6) + 1)
 
         # U and B
         for (pos1, pos2) in zip(self.sideU.edge_north_pos, reversed(self.sideB.edge_north_pos)):
@@ -495,13 +737,13 @@ class RubiksColorSolverGenericBase(object):
         # This is no longer neeeded now that the Side objects have been created
         self.all_edge_positions = []
 
-    # @timed_function
+    @timed_function
     def calculate_pos2side(self):
         for side in self.sides.values():
             for x in range(side.min_pos, side.max_pos + 1):
                 self.pos2side[x] = side
 
-    # @timed_function
+    @timed_function
     def calculate_pos2square(self):
         for side in self.sides.values():
             for (position, square) in side.squares.items():
@@ -574,7 +816,7 @@ class RubiksColorSolverGenericBase(object):
 
         self.calculate_pos2square()
 
-    # @timed_function
+    @timed_function
     def print_cube(self):
         data = []
         for x in range(3 * self.height):
@@ -621,7 +863,7 @@ class RubiksColorSolverGenericBase(object):
 
         sys.stderr.write("Cube\n\n%s\n" % "\n".join(output))
 
-    # @timed_function
+    @timed_function
     def cube_for_kociemba_strict(self):
         #log.info("color_to_side_name:\n{}\n".format(self.color_to_side_name))
         data = []
@@ -632,28 +874,14 @@ class RubiksColorSolverGenericBase(object):
 
         return data
 
-    # @timed_function
+    @timed_function
     def validate_edge_orbit(self, orbit_id):
-
-        if self.width == 2:
-            from rubikscolorresolver.cube_333 import edge_orbit_wing_pairs
-        elif self.width == 3:
-            from rubikscolorresolver.cube_333 import edge_orbit_wing_pairs
-        elif self.width == 4:
-            from rubikscolorresolver.cube_444 import edge_orbit_wing_pairs
-        elif self.width == 5:
-            from rubikscolorresolver.cube_555 import edge_orbit_wing_pairs
-        elif self.width == 6:
-            from rubikscolorresolver.cube_666 import edge_orbit_wing_pairs
-        elif self.width == 7:
-            from rubikscolorresolver.cube_777 import edge_orbit_wing_pairs
-
         valid = True
 
         # We need to see which orange/red we can flip that will make the edges valid
         wing_pair_counts = {}
 
-        for (square1_position, square2_position) in edge_orbit_wing_pairs[orbit_id]:
+        for (square1_position, square2_position) in self.layout.edge_orbit_wing_pairs[orbit_id]:
             square1 = self.pos2square[square1_position]
             square2 = self.pos2square[square2_position]
             wing_pair_string = ", ".join(
@@ -682,27 +910,14 @@ class RubiksColorSolverGenericBase(object):
 
         return valid
 
-    # @timed_function
+    @timed_function
     def find_corners_by_color(self):
         green_white_corners = []
         green_yellow_corners = []
         blue_white_corners = []
         blue_yellow_corners = []
 
-        if self.width == 2:
-            from rubikscolorresolver.cube_222 import corner_tuples
-        elif self.width == 3:
-            from rubikscolorresolver.cube_333 import corner_tuples
-        elif self.width == 4:
-            from rubikscolorresolver.cube_444 import corner_tuples
-        elif self.width == 5:
-            from rubikscolorresolver.cube_555 import corner_tuples
-        elif self.width == 6:
-            from rubikscolorresolver.cube_666 import corner_tuples
-        elif self.width == 7:
-            from rubikscolorresolver.cube_777 import corner_tuples
-
-        for corner_tuple in corner_tuples:
+        for corner_tuple in self.layout.corner_tuples:
             corner_colors = []
 
             for position in corner_tuple:
@@ -729,22 +944,9 @@ class RubiksColorSolverGenericBase(object):
             blue_yellow_corners,
         )
 
-    # @timed_function
+    @timed_function
     def find_edges_by_color(self, orbit_id):
 
-        if self.width == 2:
-            from rubikscolorresolver.cube_333 import edge_orbit_wing_pairs
-        elif self.width == 3:
-            from rubikscolorresolver.cube_333 import edge_orbit_wing_pairs
-        elif self.width == 4:
-            from rubikscolorresolver.cube_444 import edge_orbit_wing_pairs
-        elif self.width == 5:
-            from rubikscolorresolver.cube_555 import edge_orbit_wing_pairs
-        elif self.width == 6:
-            from rubikscolorresolver.cube_666 import edge_orbit_wing_pairs
-        elif self.width == 7:
-            from rubikscolorresolver.cube_777 import edge_orbit_wing_pairs
-
         green_red_orange_color_names = ("Gr", "Rd", "OR")
         blue_red_orange_color_names = ("Bu", "Rd", "OR")
         white_red_orange_color_names = ("Wh", "Rd", "OR")
@@ -754,7 +956,7 @@ class RubiksColorSolverGenericBase(object):
         white_red_or_orange_edges = []
         yellow_red_or_orange_edges = []
 
-        for (square_index, partner_index) in edge_orbit_wing_pairs[orbit_id]:
+        for (square_index, partner_index) in self.layout.edge_orbit_wing_pairs[orbit_id]:
             square = self.pos2square[square_index]
             partner = self.pos2square[partner_index]
 
@@ -801,10 +1003,13 @@ class RubiksColorSolverGenericBase(object):
             yellow_red_or_orange_edges,
         )
 
-    # @timed_function
+    @timed_function
     def sanity_check_edges_red_orange_count_for_orbit(self, target_orbit_id):
 
-        if (self.width == 4 or self.width == 6 or (self.width == 5 and target_orbit_id == 0)):
+        # Midges do not have a high/low wing, every other orbit does
+        use_high_low = bool(self.layout.wing_chirality[self.layout.edge_orbit_wing_pairs[target_orbit_id][0][0]])
+
+        if use_high_low:
             high_low_edge_per_color = self.get_high_low_per_edge_color(target_orbit_id)
         else:
             high_low_edge_per_color = None
@@ -848,7 +1053,7 @@ class RubiksColorSolverGenericBase(object):
                     partner_square.color_name = red_orange
                     partner_square.side_name = self.color_to_side_name[partner_square.color_name]
 
-                if (self.width == 4 or self.width == 6 or (self.width == 5 and target_orbit_id == 0)):
+                if use_high_low:
 
                     for (index, (target_color_square, partner_square)) in enumerate(target_color_red_or_orange_edges):
                         red_orange = red_orange_permutation[index]
@@ -924,18 +1129,8 @@ class RubiksColorSolverGenericBase(object):
 
         self.validate_edge_orbit(target_orbit_id)
 
-    # @timed_function
+    @timed_function
     def get_high_low_per_edge_color(self, target_orbit_id):
-
-        if self.width == 4:
-            from rubikscolorresolver.cube_444 import edge_orbit_wing_pairs, highlow_edge_values
-        elif self.width == 5:
-            from rubikscolorresolver.cube_555 import edge_orbit_wing_pairs, highlow_edge_values
-        elif self.width == 6:
-            from rubikscolorresolver.cube_666 import edge_orbit_wing_pairs, highlow_edge_values
-        else:
-            raise Exception("Add support for %sx%sx%s" % (self.width, self.width, self.width))
-
         high_low_per_edge_color = {
             "Gr/Wh": set(),
             "Bu/Wh": set(),
@@ -951,16 +1146,10 @@ class RubiksColorSolverGenericBase(object):
             "Rd/Ye": set(),
         }
 
-        for (square_index, partner_index) in edge_orbit_wing_pairs[target_orbit_id]:
+        for (square_index, partner_index) in self.layout.edge_orbit_wing_pairs[target_orbit_id]:
             square = self.pos2square[square_index]
             partner = self.pos2square[partner_index]
-
-            if self.width == 4:
-                highlow = highlow_edge_values[(square_index, partner_index, square.side_name, partner.side_name)]
-            elif self.width == 5:
-                highlow = highlow_edge_values[(square_index, partner_index, square.side_name, partner.side_name)]
-            elif self.width == 6:
-                highlow = highlow_edge_values[(square_index, partner_index, square.side_name, partner.side_name)]
+            highlow = self.layout.highlow(square_index, partner_index, square.side_name, partner.side_name)
 
             edge_color_pair = edge_color_pair_map["%s/%s" % (square.color_name, partner.color_name)]
             high_low_per_edge_color[edge_color_pair].add(highlow)
@@ -969,12 +1158,12 @@ class RubiksColorSolverGenericBase(object):
         # log.info("")
         return high_low_per_edge_color
 
-    # @timed_function
+    @timed_function
     def sanity_check_edge_squares(self):
         for orbit_id in range(self.orbits):
             self.sanity_check_edges_red_orange_count_for_orbit(orbit_id)
 
-    # @timed_function
+    @timed_function
     def assign_green_white_corners(self, green_white_corners):
         # log.info("Gr/Wh corner tuples %s".format(green_white_corners))
         valid_green_orange_white = (
@@ -1031,7 +1220,7 @@ class RubiksColorSolverGenericBase(object):
                     #    "change Gr/Wh corner partner %s from Rd to OR" % corner3
                     #)
 
-    # @timed_function
+    @timed_function
     def assign_green_yellow_corners(self, green_yellow_corners):
         valid_green_yellow_orange = (
             ["Gr", "Ye", "OR"],
@@ -1088,7 +1277,7 @@ class RubiksColorSolverGenericBase(object):
                     #    "change Gr/Ye corner partner %s from Rd to OR" % corner3
                     #)
 
-    # @timed_function
+    @timed_function
     def assign_blue_white_corners(self, blue_white_corners):
         # log.info("Bu/Wh corner tuples %s".format(blue_white_corners))
         valid_blue_white_orange = (
@@ -1146,7 +1335,7 @@ class RubiksColorSolverGenericBase(object):
                     #    "change Bu/Wh corner partner %s from Rd to OR" % corner3
                     #)
 
-    # @timed_function
+    @timed_function
     def assign_blue_yellow_corners(self, blue_yellow_corners):
         valid_blue_yellow_red = (
             ["Bu", "Ye", "Rd"],
@@ -1203,7 +1392,7 @@ class RubiksColorSolverGenericBase(object):
                     #    "change Bu/Ye corner partner %s from Rd to OR" % corner3
                     #)
 
-    # @timed_function
+    @timed_function
     def sanity_check_corner_squares(self):
         (green_white_corners, green_yellow_corners, blue_white_corners, blue_yellow_corners) = self.find_corners_by_color()
         self.assign_green_white_corners(green_white_corners)
@@ -1211,7 +1400,7 @@ class RubiksColorSolverGenericBase(object):
         self.assign_blue_white_corners(blue_white_corners)
         self.assign_blue_yellow_corners(blue_yellow_corners)
 
-    # @timed_function
+    @timed_function
     def get_corner_swap_count(self):
 
         needed_corners = ["BLU", "BRU", "FLU", "FRU", "DFL", "DFR", "BDL", "BDR"]
@@ -1271,19 +1460,19 @@ class RubiksColorSolverGenericBase(object):
 
         return get_swap_count(needed_corners, current_corners)
 
-    # @timed_function
+    @timed_function
     def corner_swaps_even(self):
         if self.get_corner_swap_count() % 2 == 0:
             return True
         return False
 
-    # @timed_function
+    @timed_function
     def corner_swaps_odd(self):
         if self.get_corner_swap_count() % 2 == 1:
             return True
         return False
 
-    # @timed_function
+    @timed_function
     def get_edge_swap_count(self, orbit):
         needed_edges = []
         to_check = []
@@ -1377,19 +1566,19 @@ class RubiksColorSolverGenericBase(object):
 
         return get_swap_count(needed_edges, current_edges)
 
-    # @timed_function
+    @timed_function
     def edge_swaps_even(self, orbit):
         if self.get_edge_swap_count(orbit) % 2 == 0:
             return True
         return False
 
-    # @timed_function
+    @timed_function
     def edge_swaps_odd(self, orbit):
         if self.get_edge_swap_count(orbit) % 2 == 1:
             return True
         return False
 
-    # @timed_function
+    @timed_function
     def validate_all_corners_found(self):
         needed_corners = ["BLU", "BRU", "FLU", "FRU", "DFL", "DFR", "BDL", "BDR"]
 
@@ -1452,7 +1641,7 @@ class RubiksColorSolverGenericBase(object):
             if corner not in current_corners:
                 raise Exception("corner {} is missing".format(corner))
 
-    # @timed_function
+    @timed_function
     def validate_odd_cube_midge_vs_corner_parity(self):
         """
         http://www.ryanheise.com/cube/parity.html
@@ -0,0 +1,181 @@
+"""
+Resolve a stream of scans, one JSON object per line, and write one JSON
+object per line for each of them.
+
+A scan record is either the RGB json the robot produces or an object with an
+"id" and a "scan" of that RGB json. Scans of different widths can be mixed:
+
+    {"id": "robot-1-0001", "scan": {"1": [201, 96, 67], "2": [200, 95, 64], ...}}
+
+The result for a record is tagged with its "id", or with the line number of
+the record if it does not have one:
+
+    {"id": "robot-1-0001", "kociemba": "FFBFUBFBBUDDURDUUD..."}
+    {"id": "robot-1-0002", "error": "..."}
+
+The records are resolved by a multiprocessing pool. Each worker process
+resolves many scans so the import and the layout and CIEDE2000 caches are
+paid for once per worker rather than once per scan. At most max_pending
+records are read ahead of the results that have been written so memory use
+does not depend on the length of the input.
+"""
+
+from collections import deque
+from json import dumps as json_dumps
+from json import loads as json_loads
+from rubikscolorresolver import RubiksColorSolverGeneric
+from rubikscolorresolver.scan import ScanDataError, decode_scan, decode_scan_dict
+import queue
+
+# How many records to read ahead per worker process
+PENDING_PER_PROCESS = 4
+
+
+def resolve_rgb(width, rgb, use_json=False):
+    """
+    Resolve one decoded scan, see rubikscolorresolver/scan.py. Return the
+    kociemba string or, if use_json is True, the cube_for_json dictionary.
+    """
+    cube = RubiksColorSolverGeneric(width)
+    cube.enter_scan_data(rgb)
+    cube.crunch_colors()
+
+    if use_json:
+        return cube.cube_for_json()
+    else:
+        return "".join(cube.cube_for_kociemba_strict())
+
+
+def resolve_scan(scan, use_json=False):
+    """
+    Resolve one scan in any of the formats decode_scan() takes
+    """
+    (width, rgb) = decode_scan(scan)
+    return resolve_rgb(width, rgb, use_json)
+
+
+def parse_record(record, default_id=None):
+    """
+    Return the (id, width, rgb) of a json decoded scan record
+    """
+    if not isinstance(record, dict):
+        raise ScanDataError("scan record is not an object")
+
+    record_id = default_id
+
+    if "scan" in record:
+        record_id = record.get("id", default_id)
+        record = record["scan"]
+
+        if not isinstance(record, dict):
+            raise ScanDataError("scan is not an object")
+
+    (width, rgb) = decode_scan_dict(record)
+    return (record_id, width, rgb)
+
+
+def resolve_record(line_number, line, use_json=False):
+    """
+    Resolve the scan record on one line of input, return the result as one
+    line of json. A record that cannot be resolved gets an "error" instead.
+    """
+    result = {"id": line_number}
+
+    try:
+        (result["id"], width, rgb) = parse_record(json_loads(line), line_number)
+
+        if use_json:
+            result["cube"] = resolve_rgb(width, rgb, use_json=True)
+        else:
+            result["kociemba"] = resolve_rgb(width, rgb)
+
+    except Exception as e:
+        result["error"] = "{}: {}".format(e.__class__.__name__, e)
+
+    return json_dumps(result, sort_keys=True)
+
+
+def read_records(fh):
+    """
+    Yield (line_number, line) for each line of fh that is not blank
+    """
+    for (line_number, line) in enumerate(fh, 1):
+        line = line.strip()
+
+        if line:
+            yield (line_number, line)
+
+
+def resolve_batch(input_fh, output_fh, processes=None, use_json=False, ordered=True, max_pending=None):
+    """
+    Resolve every scan record read from input_fh and write the results to
+    output_fh, one line each. If ordered is True the results are written in
+    input order, otherwise as soon as they are ready. processes is the size
+    of the pool, None is one per CPU and 1 resolves in this process.
+
+    Return the number of records resolved.
+    """
+    count = 0
+
+    if processes == 1:
+        for (line_number, line) in read_records(input_fh):
+            output_fh.write(resolve_record(line_number, line, use_json) + "\n")
+            count += 1
+
+        return count
+
+    import multiprocessing
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if max_pending is None:
+        max_pending = processes * PENDING_PER_PROCESS
+
+    pool = multiprocessing.Pool(processes)
+
+    try:
+        if ordered:
+            pending = deque()
+
+            for (line_number, line) in read_records(input_fh):
+                pending.append(pool.apply_async(resolve_record, (line_number, line, use_json)))
+
+                if len(pending) >= max_pending:
+                    output_fh.write(pending.popleft().get() + "\n")
+                    count += 1
+
+            while pending:
+                output_fh.write(pending.popleft().get() + "\n")
+                count += 1
+
+        else:
+            done = queue.Queue()
+            pending = 0
+
+            for (line_number, line) in read_records(input_fh):
+                pool.apply_async(
+                    resolve_record,
+                    (line_number, line, use_json),
+                    callback=done.put,
+                    error_callback=lambda e, line_number=line_number: done.put(
+                        json_dumps({"id": line_number, "error": "{}: {}".format(e.__class__.__name__, e)}, sort_keys=True)
+                    ),
+                )
+                pending += 1
+
+                if pending >= max_pending:
+                    output_fh.write(done.get() + "\n")
+                    pending -= 1
+                    count += 1
+
+            while pending:
+                output_fh.write(done.get() + "\n")
+                pending -= 1
+                count += 1
+
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return count
@@ -1,6 +1,96 @@
+from collections import OrderedDict
 from math import atan2, ceil, cos, degrees, exp, radians, sin, sqrt
+from threading import Lock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A 7x7x7 resolves with ~37k distinct Lab pairs so this holds an entire cube
+DEFAULT_CIE2000_CACHE_SIZE = 65536
+
+
+class LabDistanceCache(object):
+    """
+    A size bounded LRU cache of delta CIE 2000 values keyed by the six L, a, b
+    floats of a pair of Lab colors.  Pass maxsize=None for an unbounded cache
+    or maxsize=0 to disable caching. It is safe to use from several threads.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CIE2000_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key):
+        with self.lock:
+            delta_e = self.data.get(key)
+
+            if delta_e is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.data.move_to_end(key)
+
+        return delta_e
+
+    def set(self, key, delta_e):
+        if self.maxsize == 0:
+            return
+
+        with self.lock:
+            self.data[key] = delta_e
+
+            if self.maxsize is not None and len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def resize(self, maxsize):
+        """
+        Change the maximum number of entries, evicting the least recently used
+        entries if the cache is now over the limit
+        """
+        with self.lock:
+            self.maxsize = maxsize
+
+            if maxsize is not None:
+                while len(self.data) > maxsize:
+                    self.data.popitem(last=False)
+                    self.evictions += 1
+
+    def clear(self):
+        """
+        Drop all entries and reset the counters
+        """
+        with self.lock:
+            self.data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "size": len(self.data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+cie2000_cache = LabDistanceCache()
 
-cie2000_cache = {}
 
 def lab_distance_cie2000(lab1, lab2):
     """
@@ -9,7 +99,6 @@ def lab_distance_cie2000(lab1, lab2):
     Ported from this php implementation
     https://github.com/renasboy/php-color-difference/blob/master/lib/color_difference.class.php
     """
-    global cie2000_cache
     l1 = lab1.L
     a1 = lab1.a
     b1 = lab1.b
@@ -18,12 +107,13 @@ def lab_distance_cie2000(lab1, lab2):
     a2 = lab2.a
     b2 = lab2.b
 
-    delta_e = cie2000_cache.get((l1, a1, b1, l2, a2, b2))
+    # Put the lower Lab color first so that (lab1, lab2) and (lab2, lab1)
+    # share a single cache entry
+    if l1 > l2 or (l1 == l2 and (a1 > a2 or (a1 == a2 and b1 > b2))):
+        (l1, a1, b1, l2, a2, b2) = (l2, a2, b2, l1, a1, b1)
 
-    if delta_e is not None:
-        return delta_e
-
-    delta_e = cie2000_cache.get((l2, a2, b2, l1, a1, b1))
+    key = (l1, a1, b1, l2, a2, b2)
+    delta_e = cie2000_cache.get(key)
 
     if delta_e is not None:
         return delta_e
@@ -89,7 +179,79 @@ def lab_distance_cie2000(lab1, lab2):
         + r_t * (delta_cp / (s_c * kc)) * (delta_hp / (s_h * kh))
     )
 
-    cie2000_cache[(l1, a1, b1, l2, a2, b2)] = delta_e
-    cie2000_cache[(l2, a2, b2, l1, a1, b1)] = delta_e
+    cie2000_cache.set(key, delta_e)
+
+    return delta_e
+
+
+if numpy is None:
+    lab_distance_cie2000_pairs = None
+
+else:
+
+    def lab_distance_cie2000_pairs(l1, a1, b1, l2, a2, b2):
+        """
+        numpy version of lab_distance_cie2000, the arguments are arrays of L, a, b
+        values and the result is an array of delta CIE 2000 values, one per element.
+
+        This mirrors lab_distance_cie2000 one operation at a time. numpy's exp,
+        atan2 and pow can differ from the math module in the last bit so the
+        results may not be bit for bit identical with the scalar version.
+        """
+        avg_lp = (l1 + l2) / 2.0
+        c1 = numpy.sqrt(a1 ** 2 + b1 ** 2)
+        c2 = numpy.sqrt(a2 ** 2 + b2 ** 2)
+        avg_c = (c1 + c2) / 2.0
+        g = (1 - numpy.sqrt(avg_c ** 7 / (avg_c ** 7 + 25 ** 7))) / 2.0
+        a1p = a1 * (1 + g)
+        a2p = a2 * (1 + g)
+        c1p = numpy.sqrt(a1p ** 2 + b1 ** 2)
+        c2p = numpy.sqrt(a2p ** 2 + b2 ** 2)
+        avg_cp = (c1p + c2p) / 2.0
+
+        h1p = numpy.degrees(numpy.arctan2(b1, a1p))
+        h1p = numpy.where(h1p < 0, h1p + 360, h1p)
+
+        h2p = numpy.degrees(numpy.arctan2(b2, a2p))
+        h2p = numpy.where(h2p < 0, h2p + 360, h2p)
+
+        avg_hp = numpy.where(
+            numpy.abs(h1p - h2p) > 180,
+            (h1p + h2p + 360) / 2.0,
+            (h1p + h2p) / 2.0,
+        )
+
+        t = (
+            1
+            - 0.17 * numpy.cos(numpy.radians(avg_hp - 30))
+            + 0.24 * numpy.cos(numpy.radians(2 * avg_hp))
+            + 0.32 * numpy.cos(numpy.radians(3 * avg_hp + 6))
+            - 0.2 * numpy.cos(numpy.radians(4 * avg_hp - 63))
+        )
+        delta_hp = h2p - h1p
+        delta_hp = numpy.where(
+            numpy.abs(delta_hp) > 180,
+            numpy.where(h2p <= h1p, delta_hp + 360, delta_hp - 360),
+            delta_hp,
+        )
+
+        delta_lp = l2 - l1
+        delta_cp = c2p - c1p
+        delta_hp = 2 * numpy.sqrt(c1p * c2p) * numpy.sin(numpy.radians(delta_hp) / 2.0)
+        s_l = 1 + ((0.015 * ((avg_lp - 50) ** 2)) / numpy.sqrt(20 + ((avg_lp - 50) ** 2)))
+        s_c = 1 + 0.045 * avg_cp
+        s_h = 1 + 0.015 * avg_cp * t
+
+        delta_ro = 30 * numpy.exp(-((((avg_hp - 275) / 25.0) ** 2)))
 
-    return delta_e
\ No newline at end of file
+        r_c = 2 * numpy.sqrt((avg_cp ** 7) / ((avg_cp ** 7) + (25 ** 7)))
+        r_t = -r_c * numpy.sin(2 * numpy.radians(delta_ro))
+        kl = 1.0
+        kc = 1.0
+        kh = 1.0
+        return numpy.sqrt(
+            ((delta_lp / (s_l * kl)) ** 2)
+            + ((delta_cp / (s_c * kc)) ** 2)
+            + ((delta_hp / (s_h * kh)) ** 2)
+            + r_t * (delta_cp / (s_c * kc)) * (delta_hp / (s_h * kh))
+        )
@@ -0,0 +1,303 @@
+"""
+The geometry of an NxNxN cube, derived from the width.
+
+Squares are numbered 1 to 6 * width * width in the order of the sides U, L,
+F, R, B, D. Each side is numbered row by row as it appears in this layout:
+
+               U
+           L   F   R   B
+               D
+
+Every square is given the (x, y, z) coordinate of the cubie it belongs to,
+where x goes from L to R, y from D to U and z from B to F. Each coordinate
+is in range(-(width - 1), width, 2). Squares that share a cubie are the
+stickers of a corner or an edge.
+"""
+
+SIDE_NAMES = ("U", "L", "F", "R", "B", "D")
+
+# The outward normal of each side
+SIDE_NORMALS = {
+    "U": (0, 1, 0),
+    "L": (-1, 0, 0),
+    "F": (0, 0, 1),
+    "R": (1, 0, 0),
+    "B": (0, 0, -1),
+    "D": (0, -1, 0),
+}
+
+# Within an edge the sticker of the higher ranked side is listed first
+SIDE_RANK = {
+    "U": 0,
+    "D": 0,
+    "L": 1,
+    "R": 1,
+    "F": 2,
+    "B": 2,
+}
+
+layouts = {}
+
+
+def cross(u, v):
+    return (
+        u[1] * v[2] - u[2] * v[1],
+        u[2] * v[0] - u[0] * v[2],
+        u[0] * v[1] - u[1] * v[0],
+    )
+
+
+def dot(u, v):
+    return u[0] * v[0] + u[1] * v[1] + u[2] * v[2]
+
+
+def square_coordinates(width, position):
+    """
+    Return the side name of the square at position and the coordinate of its cubie
+    """
+    squares_per_side = width * width
+    side_name = SIDE_NAMES[(position - 1) // squares_per_side]
+    (row, col) = divmod((position - 1) % squares_per_side, width)
+    m = width - 1
+    across = (2 * col) - m
+    down = m - (2 * row)
+
+    if side_name == "U":
+        return (side_name, (across, m, (2 * row) - m))
+    elif side_name == "L":
+        return (side_name, (-m, down, across))
+    elif side_name == "F":
+        return (side_name, (across, down, m))
+    elif side_name == "R":
+        return (side_name, (m, down, -across))
+    elif side_name == "B":
+        return (side_name, (-across, down, -m))
+    else:
+        return (side_name, (across, -m, m - (2 * row)))
+
+
+class CubeLayout(object):
+    """
+    The corner, edge and center tables for one width. Use get_layout() to
+    get the shared, read only, instance for a width.
+
+    corner_tuples
+        the three positions of each corner. The U or D square comes first and
+        the other two follow in the same rotational direction for every corner.
+
+    edge_orbit_id
+        indexed by position, the edge orbit of each edge square or None.
+        Orbit 0 is the outermost wings, the midges of an odd cube are the
+        last orbit.
+
+    edge_orbit_wing_pairs
+        per orbit, the (position, partner position) of each wing pair
+
+    wing_chirality
+        indexed by position, for the edge square at position and its partner
+        this is +1 or -1 depending on which way the pair is turned relative to
+        the middle of the edge. It is 0 for midges and non-edge squares.
+
+    center_groups
+        (description, positions) for each group of center squares that can be
+        swapped with each other by turning the cube
+    """
+
+    __slots__ = (
+        "width",
+        "corner_tuples",
+        "edge_orbit_id",
+        "edge_orbit_wing_pairs",
+        "wing_chirality",
+        "center_groups",
+    )
+
+    def __init__(self, width):
+        self.width = width
+        squares_total = (width * width * 6) + 1
+        m = width - 1
+        cubies = {}
+
+        for position in range(1, squares_total):
+            (side_name, cubie) = square_coordinates(width, position)
+
+            if cubie not in cubies:
+                cubies[cubie] = []
+            cubies[cubie].append((position, side_name))
+
+        corner_tuples = []
+        edge_orbit_id = [None] * squares_total
+        orbit_edges = [{} for x in range((width - 1) // 2)]
+        wing_chirality = [0] * squares_total
+
+        for (cubie, stickers) in cubies.items():
+
+            if len(stickers) == 3:
+                stickers.sort(key=lambda sticker: SIDE_RANK[sticker[1]])
+                (first, second, third) = [SIDE_NORMALS[sticker[1]] for sticker in stickers]
+
+                if dot(first, cross(second, third)) > 0:
+                    stickers = [stickers[0], stickers[2], stickers[1]]
+
+                corner_tuples.append(tuple([sticker[0] for sticker in stickers]))
+
+            elif len(stickers) == 2:
+                stickers.sort(key=lambda sticker: SIDE_RANK[sticker[1]])
+                ((position, side_name), (partner, partner_side_name)) = stickers
+
+                # direction from the middle of the edge to this cubie
+                along = tuple([0 if abs(value) == m else value for value in cubie])
+                offset = (abs(sum(along)) + m) // 2
+                orbit_id = min(offset, m - offset) - 1
+                edge_orbit_id[position] = orbit_id
+                edge_orbit_id[partner] = orbit_id
+
+                chirality = dot(SIDE_NORMALS[side_name], cross(SIDE_NORMALS[partner_side_name], along))
+
+                if chirality:
+                    chirality = 1 if chirality > 0 else -1
+                    wing_chirality[position] = chirality
+                    wing_chirality[partner] = -chirality
+
+                edge = (side_name, partner_side_name)
+
+                if edge not in orbit_edges[orbit_id]:
+                    orbit_edges[orbit_id][edge] = []
+                orbit_edges[orbit_id][edge].append((position, partner))
+
+        # Wing pairs are grouped by edge, edges are listed in the order of their first square
+        edge_orbit_wing_pairs = []
+
+        for edges in orbit_edges:
+            wing_pairs = []
+
+            for edge_wing_pairs in sorted([sorted(edge_wing_pairs) for edge_wing_pairs in edges.values()]):
+                wing_pairs.extend(edge_wing_pairs)
+
+            edge_orbit_wing_pairs.append(tuple(wing_pairs))
+
+        self.corner_tuples = tuple(sorted(corner_tuples))
+        self.edge_orbit_id = tuple(edge_orbit_id)
+        self.edge_orbit_wing_pairs = tuple(edge_orbit_wing_pairs)
+        self.wing_chirality = tuple(wing_chirality)
+        self.center_groups = self.get_center_groups()
+
+    def get_center_groups(self):
+        """
+        The center squares of a side are grouped by the ring they are in when
+        the side is turned, each group holds the squares of one ring for all
+        six sides.
+        """
+        width = self.width
+        squares_per_side = width * width
+        m = width - 1
+        groups = {}
+
+        for row in range(1, m):
+            for col in range(1, m):
+                ring = (
+                    (row, col),
+                    (col, m - row),
+                    (m - row, m - col),
+                    (m - col, row),
+                )
+                (ring_row, ring_col) = min(ring)
+
+                if (ring_row, ring_col) not in groups:
+                    groups[(ring_row, ring_col)] = []
+                groups[(ring_row, ring_col)].append((row * width) + col + 1)
+
+        center_groups = []
+
+        for (ring_row, ring_col) in sorted(groups.keys()):
+
+            if ring_row == ring_col and ring_col * 2 == m:
+                desc = "centers"
+            elif ring_row == ring_col:
+                desc = "x-centers %d" % ring_row
+            elif ring_col * 2 == m:
+                desc = "t-centers %d" % ring_row
+            elif ring_col * 2 < m:
+                desc = "left obliques %d-%d" % (ring_row, ring_col)
+            else:
+                desc = "right obliques %d-%d" % (ring_row, m - ring_col)
+
+            positions = []
+
+            for side_index in range(len(SIDE_NAMES)):
+                for position in sorted(groups[(ring_row, ring_col)]):
+                    positions.append((side_index * squares_per_side) + position)
+
+            center_groups.append((desc, tuple(positions)))
+
+        # the centers of an odd cube come first, the other groups use them
+        center_groups.sort(key=lambda group: group[0] != "centers")
+        return tuple(center_groups)
+
+    def get_wing_chirality(self, position, partner, side_name, partner_side_name):
+        """
+        The chirality of the wing at (position, partner) that shows the colors
+        of sides (side_name, partner_side_name). Unlike wing_chirality this
+        follows the wing as it moves around the cube. It is 0 for midges.
+        """
+        if self.edge_orbit_id[position] is None or self.edge_orbit_id[partner] is None:
+            raise KeyError((position, partner, side_name, partner_side_name))
+
+        chirality = self.wing_chirality[position]
+
+        if SIDE_RANK[side_name] > SIDE_RANK[partner_side_name]:
+            return -chirality
+        elif SIDE_RANK[side_name] < SIDE_RANK[partner_side_name]:
+            return chirality
+        else:
+            raise KeyError((position, partner, side_name, partner_side_name))
+
+    def highlow(self, position, partner, side_name, partner_side_name):
+        """
+        For the wing at (position, partner) that shows the colors of sides
+        (side_name, partner_side_name) return "U" or "D". The two wings of an
+        edge in an orbit are always one "U" and one "D", no matter where on the
+        cube they are.
+        """
+        chirality = self.get_wing_chirality(position, partner, side_name, partner_side_name)
+
+        if chirality > 0:
+            return "U"
+        elif chirality < 0:
+            return "D"
+        else:
+            raise KeyError((position, partner, side_name, partner_side_name))
+
+    def orbit_index(self, position, partner, side_name, partner_side_name):
+        """
+        For the wing at (position, partner) that shows the colors of sides
+        (side_name, partner_side_name) return the edge it belongs to and where
+        along that edge it belongs, "UB0" through "UB%d" % (width - 3) for the
+        wings of the UB edge. Wings are numbered clockwise around U and D, and
+        from D to U for LB and RF, from U to D for LF and RB.
+        """
+        chirality = self.get_wing_chirality(position, partner, side_name, partner_side_name)
+        orbit_id = self.edge_orbit_id[position]
+
+        if SIDE_RANK[side_name] < SIDE_RANK[partner_side_name]:
+            edge = side_name + partner_side_name
+        else:
+            edge = partner_side_name + side_name
+
+        if chirality > 0:
+            return "%s%d" % (edge, orbit_id)
+        elif chirality < 0:
+            return "%s%d" % (edge, self.width - 3 - orbit_id)
+        else:
+            return "%s%d" % (edge, (self.width - 3) // 2)
+
+
+def get_layout(width):
+    """
+    Return the CubeLayout for width, it is built once and then shared
+    """
+    try:
+        return layouts[width]
+    except KeyError:
+        # Two threads may both build it, setdefault keeps the first one
+        return layouts.setdefault(width, CubeLayout(width))
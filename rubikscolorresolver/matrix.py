@@ -0,0 +1,208 @@
+"""
+A compact distance matrix for the traveling salesman solver.
+
+The distances between squares are symmetric with a zero diagonal so only the
+N * (N - 1) / 2 entries below the diagonal are kept, packed row by row in an
+array("f"): (1, 0), (2, 0), (2, 1), (3, 0), ...  A 17x17x17 has 1,734 squares,
+as a tuple of tuples of floats its distances take over 100 MB while packed
+they take 6 MB.
+"""
+
+from array import array as pyarray
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def triangle_index(i, j):
+    """
+    Return where the distance between i and j is in the packed values, i != j
+    """
+    if i < j:
+        (i, j) = (j, i)
+
+    return ((i * (i - 1)) >> 1) + j
+
+
+class TriangularMatrix(object):
+    """
+    A symmetric N x N matrix with a zero diagonal, see the module docstring
+    """
+
+    __slots__ = ("size", "values")
+
+    def __init__(self, size, values=None):
+        self.size = size
+
+        if values is None:
+            values = pyarray("f", bytes(4 * ((size * (size - 1)) >> 1)))
+        elif numpy is not None and isinstance(values, numpy.ndarray):
+            values = pyarray("f", values.astype(numpy.float32).tobytes())
+
+        self.values = values
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Pack a full matrix, a list of lists or tuple of tuples
+        """
+        size = len(rows)
+        values = pyarray("f")
+
+        for i in range(size):
+            row = rows[i]
+
+            for j in range(i):
+                values.append(row[j])
+
+        return cls(size, values)
+
+    def __len__(self):
+        return self.size
+
+    def get(self, i, j):
+        if i == j:
+            return 0.0
+
+        if i < j:
+            (i, j) = (j, i)
+
+        return self.values[((i * (i - 1)) >> 1) + j]
+
+    def set(self, i, j, distance):
+        self.values[triangle_index(i, j)] = distance
+
+    def sub_matrix(self, indexes):
+        """
+        Return the TriangularMatrix of the rows and columns indexes
+        """
+        size = len(indexes)
+
+        if numpy is not None and size > 1:
+            indexes = numpy.array(indexes, dtype=numpy.int64)
+            (x, y) = numpy.tril_indices(size, -1)
+            i = numpy.maximum(indexes[x], indexes[y])
+            j = numpy.minimum(indexes[x], indexes[y])
+            values = numpy.frombuffer(self.values, dtype=numpy.float32)
+            return TriangularMatrix(size, values[((i * (i - 1)) >> 1) + j])
+
+        get = self.get
+        values = pyarray("f")
+
+        for x in range(size):
+            index_x = indexes[x]
+
+            for y in range(x):
+                values.append(get(index_x, indexes[y]))
+
+        return TriangularMatrix(size, values)
+
+    def sorted_pairs(self):
+        """
+        Return the (i, j) pairs, i > j, sorted by distance. Pairs with the same
+        distance stay in row order.
+        """
+        size = self.size
+
+        if numpy is not None:
+            order = numpy.argsort(numpy.frombuffer(self.values, dtype=numpy.float32), kind="stable")
+            (x, y) = numpy.tril_indices(size, -1)
+            return zip(x[order].tolist(), y[order].tolist())
+
+        pairs = [(i, j) for i in range(size) for j in range(i)]
+        order = list(range(len(pairs)))
+        order.sort(key=self.values.__getitem__)
+        return (pairs[k] for k in order)
+
+    def sorted_row(self, i, count=None):
+        """
+        Return the columns j < i of row i sorted by distance, ties in column
+        order, and the largest distance returned. With count only the nearest
+        count columns are returned, plus any that tie with the last of them;
+        sorted_row_after returns the rest.
+        """
+        start = (i * (i - 1)) >> 1
+
+        if numpy is not None:
+            row = numpy.frombuffer(self.values, dtype=numpy.float32, count=i, offset=start * 4)
+
+            if count is not None and count < i:
+                limit = row[numpy.argpartition(row, count - 1)[count - 1]]
+                columns = numpy.flatnonzero(row <= limit)
+                columns = columns[numpy.argsort(row[columns], kind="stable")]
+            else:
+                columns = numpy.argsort(row, kind="stable")
+
+            columns = columns.tolist()
+
+        else:
+            row = self.values[start:start + i]
+            columns = sorted(range(i), key=row.__getitem__)
+
+            if count is not None and count < i:
+                limit = row[columns[count - 1]]
+
+                while count < i and row[columns[count]] == limit:
+                    count += 1
+
+                columns = columns[:count]
+
+        if not columns:
+            return (columns, None)
+
+        return (columns, self.values[start + columns[-1]])
+
+    def sorted_row_after(self, i, limit):
+        """
+        Return the columns j < i of row i whose distance is over limit, sorted
+        by distance, ties in column order
+        """
+        start = (i * (i - 1)) >> 1
+
+        if numpy is not None:
+            row = numpy.frombuffer(self.values, dtype=numpy.float32, count=i, offset=start * 4)
+            columns = numpy.flatnonzero(row > numpy.float32(limit))
+            return columns[numpy.argsort(row[columns], kind="stable")].tolist()
+
+        row = self.values[start:start + i]
+        return sorted([j for j in range(i) if row[j] > limit], key=row.__getitem__)
+
+    def nearest(self, count):
+        """
+        Return a list with, for each node, its count nearest other nodes sorted
+        by distance
+        """
+        size = self.size
+        count = min(count, size - 1)
+
+        if count < 1:
+            return [[] for i in range(size)]
+
+        if numpy is not None:
+            full = numpy.zeros((size, size), dtype=numpy.float32)
+            (x, y) = numpy.tril_indices(size, -1)
+            full[x, y] = numpy.frombuffer(self.values, dtype=numpy.float32)
+            full[y, x] = full[x, y]
+            numpy.fill_diagonal(full, numpy.inf)
+            columns = numpy.argpartition(full, count - 1, axis=1)[:, :count]
+            order = numpy.argsort(numpy.take_along_axis(full, columns, axis=1), axis=1, kind="stable")
+            return numpy.take_along_axis(columns, order, axis=1).tolist()
+
+        get = self.get
+        result = []
+
+        for i in range(size):
+            others = [j for j in range(size) if j != i]
+            others.sort(key=lambda j: get(i, j))
+            result.append(others[:count])
+
+        return result
+
+    def to_rows(self):
+        """
+        Return the full matrix as a tuple of tuples
+        """
+        get = self.get
+        return tuple(tuple(get(i, j) for j in range(self.size)) for i in range(self.size))
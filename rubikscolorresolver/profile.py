@@ -6,10 +6,43 @@ profile_stats_time_including_children = {}
 profile_stats_calls = {}
 timed_function_stack = []
 
+# Profiling is off by default, a function decorated with @timed_function is
+# then the undecorated function so there is no cost at all.
+enabled = False
+
 if sys.implementation.name == "micropython":
     import utime
 
+    # time is measured in us
+    TIME_PER_MS = 1000
+
+    class NoLock(object):
+        # micropython resolves on one thread
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+    stats_lock = NoLock()
+
+    def enable():
+        """
+        micropython has no way to swap functions that are already imported so
+        this must be called before importing the rest of rubikscolorresolver
+        """
+        global enabled
+        enabled = True
+
+    def disable():
+        global enabled
+        enabled = False
+
     def timed_function(f, *args, **kwargs):
+        if not enabled:
+            return f
+
         myname = str(f).split(' ')[1]
 
         def new_func(*args, **kwargs):
@@ -40,31 +73,144 @@ if sys.implementation.name == "micropython":
         return new_func
 
 else:
-    #import time
+    import os
+    import threading
+    import time
 
-    def timed_function(f, *args, **kwargs):
-        #myname = str(f).split(' ')[1]
+    # time is measured in ns
+    TIME_PER_MS = 1000000
+
+    try:
+        perf_counter_ns = time.perf_counter_ns
+    except AttributeError:
+        # python < 3.7
+        def perf_counter_ns():
+            return int(time.perf_counter() * 1000000000)
+
+    # Every function decorated with @timed_function, mapped to its timing
+    # wrapper while profiling is enabled or to None while it is disabled
+    timed_functions = {}
+
+    # Each thread has its own stack of timed functions, the totals are shared
+    thread_state = threading.local()
+    stats_lock = threading.Lock()
+
+    def wrap_function(f):
+        myname = f.__qualname__
 
         def new_func(*args, **kwargs):
-            #t = utime.ticks_us()
-            result = f(*args, **kwargs)
+            try:
+                stack = thread_state.stack
+            except AttributeError:
+                stack = thread_state.stack = []
 
-            #if myname not in profile_stats_time_including_children:
-            #    profile_stats_time_including_children[myname] = 0
-            #    profile_stats_calls[myname] = 0
+            t0 = perf_counter_ns()
+            stack.append(myname)
 
-            #profile_stats_time_including_children[myname] += utime.ticks_diff(utime.ticks_us(), t)
-            #profile_stats_calls[myname] += 1
+            try:
+                return f(*args, **kwargs)
+            finally:
+                delta_ns = perf_counter_ns() - t0
 
-            return result
+                with stats_lock:
+                    if myname not in profile_stats_time_including_children:
+                        profile_stats_time_including_children[myname] = 0
+                        profile_stats_calls[myname] = 0
+
+                    profile_stats_time_including_children[myname] += delta_ns
+                    profile_stats_calls[myname] += 1
+
+                    if len(stack) >= 2:
+                        stack_last_two = tuple(stack[-2:])
+
+                        if stack_last_two not in stack_history:
+                            stack_history[stack_last_two] = 0
+                        stack_history[stack_last_two] += delta_ns
+
+                stack.pop()
 
+        new_func.__name__ = f.__name__
+        new_func.__qualname__ = f.__qualname__
+        new_func.__doc__ = f.__doc__
+        new_func.__module__ = f.__module__
+        new_func.__wrapped__ = f
         return new_func
 
+    def replace_function(old, new):
+        """
+        Replace old with new everywhere it is bound in rubikscolorresolver: the
+        module or class that defines it and the modules that imported it
+        """
+        qualname = old.__qualname__.split(".")
+
+        for (module_name, module) in list(sys.modules.items()):
+            if module is None or not (module_name == "rubikscolorresolver" or module_name.startswith("rubikscolorresolver.")):
+                continue
+
+            if len(qualname) == 2 and module_name == old.__module__:
+                cls = getattr(module, qualname[0], None)
+
+                if cls is not None and cls.__dict__.get(qualname[1]) is old:
+                    setattr(cls, qualname[1], new)
+
+            for (name, value) in list(vars(module).items()):
+                if value is old:
+                    setattr(module, name, new)
+
+    def enable():
+        """
+        Time every @timed_function from now on
+        """
+        global enabled
+
+        for (f, wrapper) in list(timed_functions.items()):
+            if wrapper is None:
+                wrapper = wrap_function(f)
+                replace_function(f, wrapper)
+                timed_functions[f] = wrapper
+
+        enabled = True
+
+    def disable():
+        """
+        Put back the undecorated functions
+        """
+        global enabled
+
+        for (f, wrapper) in list(timed_functions.items()):
+            if wrapper is not None:
+                replace_function(wrapper, f)
+                timed_functions[f] = None
+
+        enabled = False
+
+    def timed_function(f, *args, **kwargs):
+        if enabled:
+            timed_functions[f] = wrap_function(f)
+        else:
+            timed_functions[f] = None
+
+        return timed_functions[f] or f
+
+    if os.environ.get("RUBIKS_COLOR_RESOLVER_PROFILE", "0") not in ("", "0"):
+        enabled = True
+
+
+def reset():
+    with stats_lock:
+        stack_history.clear()
+        profile_stats_time_excluding_children.clear()
+        profile_stats_time_including_children.clear()
+        profile_stats_calls.clear()
+
+
+def get_time_to_subtract(function, history=None):
+    if history is None:
+        history = stack_history
 
-def get_time_to_subtract(function):
     result = 0
 
-    for (stack_last_two, delta) in stack_history.items():
+    for (stack_last_two, delta) in list(history.items()):
         #if function in entry["stack"] and entry["stack"][-2] == function:
         #    result += entry["delta"]
         if stack_last_two[0] == function:
@@ -73,23 +219,52 @@ def get_time_to_subtract(function):
     return result
 
 
+def get_profile_data():
+    """
+    Return a dict of function name to its number of calls, time in ms excluding
+    the time spent in other timed functions and cumulative time in ms
+    """
+    result = {}
+
+    # Other threads may still be timing functions, work from a copy taken
+    # under the lock they update the stats with
+    with stats_lock:
+        calls = dict(profile_stats_calls)
+        including_children = dict(profile_stats_time_including_children)
+        history = dict(stack_history)
+
+    excluding_children = {}
+
+    for (function, value) in including_children.items():
+        excluding_children[function] = value - get_time_to_subtract(function, history)
+
+    with stats_lock:
+        profile_stats_time_excluding_children.update(excluding_children)
+
+    for (function, function_calls) in calls.items():
+        result[function] = {
+            "calls": function_calls,
+            "time_ms": excluding_children[function] / TIME_PER_MS,
+            "cumulative_time_ms": including_children[function] / TIME_PER_MS,
+        }
+
+    return result
+
+
 def print_profile_data():
+    profile_data = get_profile_data()
+
+    if not profile_data:
+        return
+
     print("                cumulative")
     print("    time(ms)      time(ms)     calls  function")
     print("============  ============  ========  =======================")
     lines = []
 
-    for (function, value) in profile_stats_time_including_children.items():
-        profile_stats_time_excluding_children[function] = value
-
-    for function in profile_stats_time_excluding_children.keys():
-        profile_stats_time_excluding_children[function] -= get_time_to_subtract(function)
-
-    for function in profile_stats_calls.keys():
+    for (function, stats) in profile_data.items():
         lines.append("{:>12.2f}  {:>12.2f}  {:>8}  {}".format(
-            profile_stats_time_excluding_children.get(function) / 1000,
-            profile_stats_time_including_children[function] / 1000,
-            profile_stats_calls[function], function))
+            stats["time_ms"], stats["cumulative_time_ms"], stats["calls"], function))
 
     lines = sorted(lines)
     print("\n".join(lines))
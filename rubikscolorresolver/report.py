@@ -0,0 +1,57 @@
+"""
+Where RubiksColorSolverGeneric writes its HTML debug report.
+
+The solver checks report.enabled before building any of the report so a
+NullReport, the default, costs nothing. A MemoryReport keeps the report in
+memory and a FileReport also writes it to a file, once, when the solver
+calls flush() at the end of crunch_colors().
+"""
+
+
+class NullReport(object):
+    """
+    Discard the report
+    """
+
+    enabled = False
+
+    def write(self, html):
+        pass
+
+    def flush(self):
+        pass
+
+
+class MemoryReport(object):
+    """
+    Collect the report in memory, getvalue() returns it
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, html):
+        self.chunks.append(html)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+
+class FileReport(MemoryReport):
+    """
+    Collect the report in memory and write it to filename on flush(),
+    replacing the report of a previous cube
+    """
+
+    def __init__(self, filename):
+        MemoryReport.__init__(self)
+        self.filename = filename
+
+    def flush(self):
+        with open(self.filename, "w") as fh:
+            fh.write(self.getvalue())
@@ -0,0 +1,140 @@
+"""
+Decode scans into the form enter_scan_data() takes: the width of the cube and
+a buffer of red, green, blue bytes for each square in position order.
+
+A scan is either the RGB json the robot produces, a dictionary of square
+position to (red, green, blue):
+
+    {"1": [201, 96, 67], "2": [200, 95, 64], ...}
+
+or the binary format, one byte with the width of the cube followed by the
+red, green and blue bytes of each square in position order. A 7x7x7 scan is
+1 + 6 * 49 * 3 = 883 bytes.
+"""
+
+from math import sqrt
+
+try:
+    from json import loads as json_loads
+except ImportError:
+    from ujson import loads as json_loads
+
+
+class ScanDataError(ValueError):
+    pass
+
+
+def get_width(square_count):
+    """
+    Return the width of the cube that has square_count squares
+    """
+    width = int(round(sqrt(square_count / 6)))
+
+    if width < 2 or width * width * 6 != square_count:
+        raise ScanDataError("{} squares is not a cube".format(square_count))
+
+    return width
+
+
+def decode_scan_dict(scan_data):
+    """
+    Return the (width, rgb) of a dictionary of square position to (red,
+    green, blue). Every position from 1 to the number of squares must be
+    there once and every value must be an int between 0 and 255.
+    """
+    square_count = len(scan_data)
+    width = get_width(square_count)
+    rgb = bytearray(square_count * 3)
+    seen = bytearray(square_count + 1)
+
+    for (position, value) in scan_data.items():
+        try:
+            position = int(position)
+        except (TypeError, ValueError):
+            raise ScanDataError("square {} is not a position".format(position))
+
+        if position < 1 or position > square_count or seen[position]:
+            raise ScanDataError("square {} is out of range or listed twice".format(position))
+
+        seen[position] = 1
+        index = (position - 1) * 3
+
+        try:
+            if len(value) != 3:
+                raise ValueError
+
+            rgb[index:index + 3] = bytes(value)
+        except (TypeError, ValueError):
+            raise ScanDataError("square {} {} is not three ints between 0 and 255".format(position, value))
+
+    return (width, rgb)
+
+
+def decode_scan_json(text):
+    """
+    Return the (width, rgb) of the RGB json in text
+    """
+    try:
+        scan_data = json_loads(text)
+    except ValueError as e:
+        raise ScanDataError("invalid json: {}".format(e))
+
+    if not isinstance(scan_data, dict):
+        raise ScanDataError("json is not an object")
+
+    return decode_scan_dict(scan_data)
+
+
+def encode_scan_binary(width, rgb):
+    """
+    Return the binary format of a scan
+    """
+    if len(rgb) != width * width * 6 * 3:
+        raise ScanDataError("{} bytes is not a {}x{}x{} scan".format(len(rgb), width, width, width))
+
+    return bytes([width]) + bytes(rgb)
+
+
+def decode_scan_binary(data):
+    """
+    Return the (width, rgb) of a scan in the binary format
+    """
+    if not data:
+        raise ScanDataError("empty scan")
+
+    width = data[0]
+
+    if width < 2 or len(data) != 1 + width * width * 6 * 3:
+        raise ScanDataError("{} bytes is not a {}x{}x{} scan".format(len(data), width, width, width))
+
+    return (width, data[1:])
+
+
+def is_binary_scan(data):
+    """
+    Return True if data is the length of a scan in the binary format for the
+    width in its first byte. The width of a binary scan can be the byte of
+    whitespace or "{" so this, not the first byte, tells it from json.
+    """
+    if not data:
+        return False
+
+    width = data[0]
+    return width >= 2 and len(data) == 1 + width * width * 6 * 3
+
+
+def decode_scan(scan):
+    """
+    Return the (width, rgb) of a scan in any of the formats: a dictionary, the
+    json text as str or bytes, or the binary format
+    """
+    if isinstance(scan, dict):
+        return decode_scan_dict(scan)
+
+    if isinstance(scan, str):
+        return decode_scan_json(scan)
+
+    if is_binary_scan(scan) or bytes(scan).lstrip()[:1] != b"{":
+        return decode_scan_binary(scan)
+
+    return decode_scan_json(bytes(scan).decode("utf-8"))
@@ -0,0 +1,349 @@
+"""
+A long running resolver that keeps the cube layouts and the CIEDE2000 cache
+warm between scans. It listens on localhost HTTP, a Unix domain socket or
+both and handles each connection in its own thread. The scans themselves are
+resolved by a pool of worker processes, or by the connection threads if there
+is only one.
+
+HTTP
+    POST /resolve       body is a scan record, see rubikscolorresolver/batch.py, or
+                        with Content-Type application/octet-stream a scan in the
+                        binary format, see rubikscolorresolver/scan.py. Add ?json=1
+                        for the cube_for_json payload. A body over MAX_BODY_BYTES
+                        gets a 413
+    GET /health         request counts and latency histograms per cube width
+
+Unix domain socket
+    One scan record per line, the result is written back as one line of json.
+    A line that is just "health" gets the health report. A line over
+    MAX_BODY_BYTES gets an error and the connection is closed.
+"""
+
+from json import dumps as json_dumps
+from json import loads as json_loads
+from rubikscolorresolver.batch import parse_record, resolve_rgb
+from rubikscolorresolver.cie2000 import cie2000_cache
+from rubikscolorresolver.layout import get_layout
+from rubikscolorresolver.scan import decode_scan_binary
+import http.server
+import os
+import signal
+import socketserver
+import stat
+import sys
+import threading
+import time
+
+# Upper bounds in ms of the latency histogram buckets, the last bucket is everything slower
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# The widest cube a POST /resolve body may hold a scan of. A json scan record
+# is allowed 64 bytes per square, enough for '"1734": [255, 255, 255], ' with
+# room for whitespace and an id, the binary format needs 3.
+MAX_WIDTH = 17
+MAX_BODY_BYTES = 64 * 6 * MAX_WIDTH * MAX_WIDTH
+
+# Layouts built by each worker before it takes its first request
+WARM_WIDTHS = (2, 3, 4, 5, 6, 7)
+
+
+def warm_up():
+    for width in WARM_WIDTHS:
+        get_layout(width)
+
+
+def resolve_request(width, rgb, use_json):
+    """
+    Resolve one scan in a worker, return (pid, result, error, CIEDE2000 cache stats)
+    """
+    try:
+        result = resolve_rgb(width, rgb, use_json)
+        error = None
+    except Exception as e:
+        result = None
+        error = "{}: {}".format(e.__class__.__name__, e)
+
+    return (os.getpid(), result, error, cie2000_cache.stats())
+
+
+class WidthStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, latency_ms, error):
+        self.requests += 1
+        self.total_ms += latency_ms
+
+        if error:
+            self.errors += 1
+
+        for (index, bucket_ms) in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bucket_ms:
+                self.histogram[index] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def to_dict(self):
+        histogram = {}
+
+        for (bucket_ms, count) in zip(LATENCY_BUCKETS_MS, self.histogram):
+            histogram["le_%d" % bucket_ms] = count
+
+        histogram["inf"] = self.histogram[-1]
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "mean_ms": self.total_ms / self.requests if self.requests else 0.0,
+            "latency_ms": histogram,
+        }
+
+
+class ResolverService(object):
+    """
+    Resolves scan records and keeps the statistics for /health. processes is
+    the size of the worker pool, None is one per CPU and 1 resolves in the
+    calling thread.
+    """
+
+    def __init__(self, processes=None):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.widths = {}
+        self.bad_requests = 0
+        self.worker_cache_stats = {}
+
+        if processes == 1:
+            warm_up()
+            self.pool = None
+        else:
+            import multiprocessing
+            self.pool = multiprocessing.Pool(processes, initializer=warm_up)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+    def resolve(self, record, use_json=False):
+        """
+        Resolve a json decoded scan record or a scan in the binary format,
+        return the result dictionary
+        """
+        start = time.perf_counter()
+
+        try:
+            if isinstance(record, dict):
+                (record_id, width, rgb) = parse_record(record)
+            else:
+                record_id = None
+                (width, rgb) = decode_scan_binary(record)
+
+        except Exception as e:
+            return self.bad_request(e)
+
+        if self.pool is None:
+            (pid, result, error, cache_stats) = resolve_request(width, rgb, use_json)
+        else:
+            (pid, result, error, cache_stats) = self.pool.apply(resolve_request, (width, bytes(rgb), use_json))
+
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        with self.lock:
+            if width not in self.widths:
+                self.widths[width] = WidthStats()
+
+            self.widths[width].add(latency_ms, error)
+            self.worker_cache_stats[pid] = cache_stats
+
+        response = {}
+
+        if record_id is not None:
+            response["id"] = record_id
+
+        if error:
+            response["error"] = error
+        elif use_json:
+            response["cube"] = result
+        else:
+            response["kociemba"] = result
+
+        return response
+
+    def bad_request(self, e):
+        """
+        Count a request that is not a scan record, return its result dictionary
+        """
+        with self.lock:
+            self.bad_requests += 1
+
+        return {"error": "{}: {}".format(e.__class__.__name__, e)}
+
+    def health(self):
+        with self.lock:
+            return {
+                "status": "ok",
+                "uptime_s": time.time() - self.started,
+                "bad_requests": self.bad_requests,
+                "widths": {str(width): stats.to_dict() for (width, stats) in sorted(self.widths.items())},
+                "cie2000_cache": {str(pid): stats for (pid, stats) in self.worker_cache_stats.items()},
+            }
+
+
+class HTTPHandler(http.server.BaseHTTPRequestHandler):
+
+    def send_json(self, status, data):
+        body = json_dumps(data, sort_keys=True).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, self.server.service.health())
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        (path, _, query) = self.path.partition("?")
+
+        if path != "/resolve":
+            self.send_json(404, {"error": "not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+
+            if length < 0:
+                raise ValueError("negative Content-Length")
+        except ValueError as e:
+            self.send_json(400, self.server.service.bad_request(e))
+            return
+
+        if length > MAX_BODY_BYTES:
+            self.send_json(413, self.server.service.bad_request(
+                ValueError("{} bytes is over the {} byte limit".format(length, MAX_BODY_BYTES))))
+            return
+
+        try:
+            record = self.rfile.read(length)
+
+            if self.headers.get_content_type() != "application/octet-stream":
+                record = json_loads(record.decode("utf-8"))
+        except Exception as e:
+            self.send_json(400, self.server.service.bad_request(e))
+            return
+
+        response = self.server.service.resolve(record, use_json="json=1" in query.split("&"))
+        self.send_json(200 if "error" not in response else 422, response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service, port):
+        self.service = service
+        http.server.HTTPServer.__init__(self, ("127.0.0.1", port), HTTPHandler)
+
+
+class UnixHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_BODY_BYTES + 1)
+
+            if not line:
+                break
+
+            if len(line) > MAX_BODY_BYTES:
+                # the rest of the line cannot be told from the next request
+                response = self.server.service.bad_request(
+                    ValueError("line is over the {} byte limit".format(MAX_BODY_BYTES)))
+                self.wfile.write(json_dumps(response, sort_keys=True).encode("utf-8") + b"\n")
+                break
+
+            line = line.strip()
+
+            if not line:
+                continue
+
+            if line == b"health":
+                response = self.server.service.health()
+            else:
+                try:
+                    response = self.server.service.resolve(json_loads(line.decode("utf-8")))
+                except ValueError as e:
+                    response = self.server.service.bad_request(e)
+
+            self.wfile.write(json_dumps(response, sort_keys=True).encode("utf-8") + b"\n")
+
+
+def remove_socket(path):
+    """
+    Remove the Unix domain socket at path, if there is one. Raises ValueError
+    rather than remove anything at path that is not a socket.
+    """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return
+
+    if not stat.S_ISSOCK(st.st_mode):
+        raise ValueError("{} exists and is not a socket".format(path))
+
+    os.unlink(path)
+
+
+class UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, service, path):
+        self.service = service
+        remove_socket(path)
+        socketserver.ThreadingUnixStreamServer.__init__(self, path, UnixHandler)
+
+
+def serve(http_port=None, unix_path=None, processes=None):
+    """
+    Serve until interrupted or sent SIGTERM
+    """
+    if http_port is None and unix_path is None:
+        raise ValueError("http_port or unix_path is required")
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    service = ResolverService(processes)
+    servers = []
+
+    try:
+        if http_port is not None:
+            servers.append(HTTPServer(service, http_port))
+
+        if unix_path is not None:
+            servers.append(UnixServer(service, unix_path))
+
+        for server in servers[1:]:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        servers[0].serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        for server in servers:
+            server.server_close()
+
+            # only remove the socket this server bound
+            if isinstance(server, UnixServer):
+                remove_socket(unix_path)
+
+        service.close()
@@ -0,0 +1,169 @@
+"""
+An exact solver for the small traveling salesman problems, the Held-Karp
+dynamic program over subsets of nodes. It takes O(2^N * N^2) time and
+O(2^N * N) memory so solve_tsp only uses it up to EXACT_MAX_NODES nodes, see
+utils/benchmark-tsp.py for how long it takes.
+
+Like solve_tsp this finds the shortest open path, either between the given
+endpoints or between whichever two nodes make it shortest.
+"""
+
+from array import array as pyarray
+from rubikscolorresolver.matrix import TriangularMatrix, numpy
+from rubikscolorresolver.profile import timed_function
+
+# solve_tsp solves problems of up to this many nodes exactly
+EXACT_MAX_NODES = 10
+
+
+def best_path(parent, full, last, N):
+    """
+    Follow parent[mask * N + node] back from last to the start of the path
+    """
+    path = []
+    mask = full
+
+    while last != -1:
+        path.append(last)
+        previous = parent[mask * N + last]
+        mask ^= 1 << last
+        last = previous
+
+    path.reverse()
+    return path
+
+
+def solve_tsp_exact_numpy(distances, endpoints):
+    N = len(distances)
+    (x, y) = numpy.tril_indices(N, -1)
+    matrix = numpy.zeros((N, N))
+    matrix[x, y] = numpy.frombuffer(distances.values, dtype=numpy.float32)
+    matrix[y, x] = matrix[x, y]
+
+    size = 1 << N
+    full = size - 1
+    masks = numpy.arange(size)
+    bits = 1 << numpy.arange(N)
+    popcount = numpy.zeros(size, dtype=numpy.int8)
+
+    for node in range(N):
+        popcount += (masks >> node) & 1
+
+    # cost[mask][last] is the length of the shortest path through the nodes
+    # of mask that ends at last, cost[0] stays inf
+    cost = numpy.full((size, N), numpy.inf)
+    parent = numpy.full((size, N), -1, dtype=numpy.int8)
+
+    if endpoints is None:
+        cost[bits, numpy.arange(N)] = 0.0
+        end = None
+    else:
+        (start, end) = endpoints
+        cost[1 << start, start] = 0.0
+
+    # Every mask of a layer only depends on the masks of the previous layer
+    for count in range(2, N + 1):
+        layer = masks[popcount == count]
+        has_last = (layer[:, None] & bits[None, :]) != 0
+        previous = numpy.where(has_last, layer[:, None] ^ bits[None, :], 0)
+
+        # candidates[m][last][k] is the cost of reaching last from k
+        candidates = cost[previous] + matrix.T[None, :, :]
+        best = numpy.argmin(candidates, axis=2)
+        best_cost = numpy.take_along_axis(candidates, best[:, :, None], axis=2)[:, :, 0]
+
+        if end is not None and count != N:
+            best_cost[:, end] = numpy.inf
+
+        cost[layer] = best_cost
+        parent[layer] = numpy.where(numpy.isinf(best_cost), -1, best)
+
+    if end is None:
+        end = int(numpy.argmin(cost[full]))
+
+    return best_path(parent.ravel().tolist(), full, end, N)
+
+
+def solve_tsp_exact_python(distances, endpoints):
+    N = len(distances)
+    get = distances.get
+    matrix = [[get(i, j) for j in range(N)] for i in range(N)]
+
+    size = 1 << N
+    full = size - 1
+    inf = float("inf")
+    bits = [1 << node for node in range(N)]
+    cost = pyarray("d", [inf] * (size * N))
+    parent = pyarray("b", [-1] * (size * N))
+
+    if endpoints is None:
+        for node in range(N):
+            cost[bits[node] * N + node] = 0.0
+        end = None
+    else:
+        (start, end) = endpoints
+        cost[bits[start] * N + start] = 0.0
+
+    # Every mask is reached from smaller masks so one pass in order is enough
+    for mask in range(1, size):
+        for last in range(N):
+            path_cost = cost[mask * N + last]
+
+            if path_cost == inf:
+                continue
+
+            row = matrix[last]
+
+            for node in range(N):
+                if mask & bits[node]:
+                    continue
+
+                next_mask = mask | bits[node]
+
+                if node == end and next_mask != full:
+                    continue
+
+                next_cost = path_cost + row[node]
+                index = next_mask * N + node
+
+                if next_cost < cost[index]:
+                    cost[index] = next_cost
+                    parent[index] = last
+
+    if end is None:
+        end = 0
+
+        for node in range(1, N):
+            if cost[full * N + node] < cost[full * N + end]:
+                end = node
+
+    return best_path(parent, full, end, N)
+
+
+@timed_function
+def solve_tsp_exact(distances, endpoints=None):
+    """
+    Return the shortest open path through every node of distances, a
+    TriangularMatrix or a full matrix of rows. Guarantees that the first index
+    is lower than the last if endpoints is None.
+    """
+    N = len(distances)
+
+    if endpoints is not None and endpoints[0] == endpoints[1]:
+        raise ValueError("start=end is not supported")
+
+    if N < 2:
+        return list(range(N))
+
+    if not isinstance(distances, TriangularMatrix):
+        distances = TriangularMatrix.from_rows(distances)
+
+    if numpy is not None:
+        path = solve_tsp_exact_numpy(distances, endpoints)
+    else:
+        path = solve_tsp_exact_python(distances, endpoints)
+
+    if endpoints is None and path[0] > path[-1]:
+        path.reverse()
+
+    return path
@@ -4,54 +4,210 @@ https://github.com/dmishin/tsp-solver/blob/master/tsp_solver/greedy.py
 """
 
 from array import array as pyarray
-# from rubikscolorresolver.profile import timed_function
 
+try:
+    from time import perf_counter
+except ImportError:
+    from time import ticks_ms
 
-# @timed_function
-def optimize_solution(distances, connections, endpoints):
+    def perf_counter():
+        return ticks_ms() / 1000.0
+
+try:
+    from heapq import heappop, heappush
+except ImportError:
+    from uheapq import heappop, heappush
+
+from rubikscolorresolver.matrix import TriangularMatrix
+from rubikscolorresolver.profile import timed_function
+from rubikscolorresolver import tsp_solver_exact
+
+# How many of the nearest candidates of each node candidate_pairs sorts up front
+CANDIDATES = 8
+
+# Below this many nodes sorting every pair at once is faster than candidate_pairs
+CANDIDATES_MIN_NODES = 256
+
+# How many of the nearest nodes of each node optimize_solution tries to connect it to
+NEIGHBORS = 8
+
+# The smallest improvement optimize_solution makes a move for, the distances are float32
+MIN_GAIN = 0.0001
+
+
+def distance_function(distances):
     """
-    Tries to optimize solution, found by the greedy algorithm
+    Return a function of (i, j) that returns the distance between i and j,
+    distances is a TriangularMatrix or a full matrix of rows
     """
-    N = len(connections)
-    path = restore_path(connections, endpoints)
+    if isinstance(distances, TriangularMatrix):
+        return distances.get
 
-    def ds(i, j):  # distance between ith and jth points of path
-        pi = path[i]
-        pj = path[j]
+    return lambda i, j: distances[i][j]
 
-        if pi < pj:
-            return distances[pj][pi]
-        else:
-            return distances[pi][pj]
 
-    d_total = 0.0
+@timed_function
+def optimize_solution(distances, path, endpoints, optim_steps=None, time_budget_ms=None):
+    """
+    Improve a path found by the greedy algorithm, in place, with 2-opt and
+    Or-opt moves that connect a node to one of its NEIGHBORS nearest nodes.
+
+    Every node starts out active. An active node is checked for an improving
+    move; if there is none it goes inactive (its don't-look bit is set) until
+    a move changes one of its edges. Stops when no node is active, after
+    optim_steps moves or once time_budget_ms has passed. If endpoints is given
+    the path starts and ends with them and they stay put, otherwise the ends
+    of the path may change too.
+
+    Returns (number of moves, total improvement)
+    """
+    N = len(path)
+
+    if N < 4:
+        return (0, 0.0)
+
+    if not isinstance(distances, TriangularMatrix):
+        distances = TriangularMatrix.from_rows(distances)
+
+    get = distances.get
+    neighbors = distances.nearest(NEIGHBORS)
+    fixed_ends = endpoints is not None
+
+    if time_budget_ms is None:
+        deadline = None
+    else:
+        deadline = perf_counter() + time_budget_ms / 1000.0
+
+    position = pyarray("i", [0] * N)
+
+    for (index, node) in enumerate(path):
+        position[node] = index
+
+    def node_at(index):
+        if 0 <= index < N:
+            return path[index]
+        return None
+
+    def distance(node1, node2):
+        # the open ends of the path are free
+        if node1 is None or node2 is None:
+            return 0.0
+        return get(node1, node2)
+
+    def two_opt_gain(i, j):
+        # remove edges (i, i+1) and (j, j+1), reverse path[i+1:j+1]
+        if j - i < 2 or (i == -1 and j == N - 1):
+            return 0.0
+
+        if fixed_ends and (i == -1 or j == N - 1):
+            return 0.0
+
+        (a, b, c, d) = (node_at(i), node_at(i + 1), node_at(j), node_at(j + 1))
+        return distance(a, b) + distance(c, d) - distance(a, c) - distance(b, d)
+
+    def or_opt_gain(first, last, u):
+        # move path[first:last+1] between path[u] and path[u+1], returns
+        # (gain, reversed)
+        if first <= u + 1 <= last + 1 or u + 1 > N or u < -1:
+            return (0.0, False)
+
+        if fixed_ends and (first == 0 or last == N - 1 or u == -1 or u == N - 1):
+            return (0.0, False)
+
+        (p, f, l, n) = (node_at(first - 1), node_at(first), node_at(last), node_at(last + 1))
+        (x, y) = (node_at(u), node_at(u + 1))
+        removed = distance(p, f) + distance(l, n) - distance(p, n) + distance(x, y)
+        forward = distance(x, f) + distance(l, y)
+        backward = distance(x, l) + distance(f, y)
+
+        if backward < forward:
+            return (removed - backward, True)
+
+        return (removed - forward, False)
+
+    def find_move(a):
+        p = position[a]
+
+        for c in neighbors[a]:
+            q = position[c]
+            (lo, hi) = (p, q) if p < q else (q, p)
+
+            for (i, j) in ((lo, hi), (lo - 1, hi - 1)):
+                gain = two_opt_gain(i, j)
+
+                if gain > MIN_GAIN:
+                    return (gain, "2-opt", (i, j))
+
+            for length in (1, 2, 3):
+                for (first, last) in ((p, p + length - 1), (p - length + 1, p)):
+                    if first < 0 or last >= N or first <= q <= last:
+                        continue
+
+                    for u in (q, q - 1):
+                        (gain, flip) = or_opt_gain(first, last, u)
+
+                        if gain > MIN_GAIN:
+                            return (gain, "or-opt", (first, last, u, flip))
+
+        return None
+
+    queue = list(path)
+    queue.reverse()
+    active = bytearray([1] * N)
     optimizations = 0
+    d_total = 0.0
+
+    while queue:
+        if optim_steps is not None and optimizations >= optim_steps:
+            break
+
+        if deadline is not None and perf_counter() > deadline:
+            break
+
+        a = queue.pop()
+        active[a] = 0
+        move = find_move(a)
+
+        if move is None:
+            continue
+
+        (gain, kind, args) = move
+
+        if kind == "2-opt":
+            (i, j) = args
+            touched = [node_at(i), node_at(i + 1), node_at(j), node_at(j + 1)]
+            path[i + 1:j + 1] = path[i + 1:j + 1][::-1]
+
+            for index in range(i + 1, j + 1):
+                position[path[index]] = index
+
+        else:
+            (first, last, u, flip) = args
+            touched = [node_at(first - 1), node_at(first), node_at(last), node_at(last + 1), node_at(u), node_at(u + 1)]
+            segment = path[first:last + 1]
+
+            if flip:
+                segment.reverse()
 
-    for a in range(N - 1):
-        b = a + 1
+            rest = path[:first] + path[last + 1:]
+            insert = u + 1 if u < first else u + 1 - len(segment)
+            path[:] = rest[:insert] + segment + rest[insert:]
 
-        for c in range(b + 2, N - 1):
-            d = c + 1
-            delta_d = ds(a, b) + ds(c, d) - (ds(a, c) + ds(b, d))
+            for (index, node) in enumerate(path):
+                position[node] = index
 
-            if delta_d > 0:
-                d_total += delta_d
-                optimizations += 1
-                connections[path[a]].remove(path[b])
-                connections[path[a]].append(path[c])
-                connections[path[b]].remove(path[a])
-                connections[path[b]].append(path[d])
+        optimizations += 1
+        d_total += gain
 
-                connections[path[c]].remove(path[d])
-                connections[path[c]].append(path[a])
-                connections[path[d]].remove(path[c])
-                connections[path[d]].append(path[b])
-                path[:] = restore_path(connections, endpoints)
+        for node in touched:
+            if node is not None and not active[node]:
+                active[node] = 1
+                queue.append(node)
 
     return (optimizations, d_total)
 
 
-# @timed_function
+@timed_function
 def restore_path(connections, endpoints):
     """
     Takes array of connections and returns a path.
@@ -82,11 +238,13 @@ def restore_path(connections, endpoints):
     return path
 
 
-# @timed_function
+@timed_function
 def pairs_by_dist(N, distances):
     """
-    returns list of coordinate pairs (i,j), sorted by distances; such that i < j
+    returns list of coordinate pairs (i,j), sorted by distances; such that i > j
     """
+    if isinstance(distances, TriangularMatrix):
+        return distances.sorted_pairs()
 
     # sort coordinate pairs by distance
     indices = []
@@ -99,47 +257,246 @@ def pairs_by_dist(N, distances):
     return ((ij // N, ij % N) for ij in indices)
 
 
-def calc_path_cost(distances, path):
+def candidate_pairs(distances, node_valency):
+    """
+    Yield the (i, j) pairs of a TriangularMatrix in the same order as
+    pairs_by_dist, without sorting all of them first.
+
+    Each pair is in the candidate list of i, its higher numbered node. A list
+    starts as the CANDIDATES nearest and is only sorted in full if the greedy
+    join gets past those. A heap merges the heads of the lists. Once a node has
+    no valency left its own list is dropped.
+    """
+    N = len(distances)
+    values = distances.values
+    rows = [None] * N
+    limits = [None] * N
+    heap = []
+
+    for i in range(1, N):
+        (rows[i], limits[i]) = distances.sorted_row(i, CANDIDATES)
+        start = (i * (i - 1)) >> 1
+        j = rows[i][0]
+        heappush(heap, (values[start + j], start + j, i, 0))
+
+    while heap:
+        (distance, k, i, position) = heappop(heap)
+
+        if not node_valency[i]:
+            continue
+
+        row = rows[i]
+        j = row[position]
+        position += 1
+
+        if position == len(row) and limits[i] is not None and len(row) < i:
+            # The candidates of i ran out, sort the rest of its row
+            row.extend(distances.sorted_row_after(i, limits[i]))
+            limits[i] = None
+
+        if position < len(row):
+            start = (i * (i - 1)) >> 1
+            heappush(heap, (values[start + row[position]], start + row[position], i, position))
+
+        yield (i, j)
+
+
+def calc_path_cost(distances, path, rows=6):
     """
     Calculate the total for each row (if there are 24 squares, 6 sides of a cube then
     there are 4 squares per row) and total all of those together. We do this because
     we do not care about the cost from square at the end of one row to the square at
     the start of the next row.
+
+    path[index] is in row (index * rows) // len(path), so if the path does not
+    divide evenly the rows differ in length by at most one.
     """
+    get = distance_function(distances)
+    N = len(path)
     cost = 0
-    row_cost = 0
-    prev_x = None
-    ROW_SIZE = len(path) / 6
 
-    for (index, x) in enumerate(path):
-        if prev_x is not None:
+    for index in range(1, N):
+        # unless path[index] starts a new row
+        if (index * rows) // N == ((index - 1) * rows) // N:
+            cost += get(path[index - 1], path[index])
 
-            if (index + 1) % ROW_SIZE  == 0:
-                row_cost += distances[prev_x][x]
-                cost += row_cost
-                row_cost = 0
+    return cost
 
-            elif (index + 1) % (ROW_SIZE + 1) == 0:
-                pass
 
-            else:
-                row_cost += distances[prev_x][x]
+@timed_function
+def optimize_rows(distances, path, endpoints, rows, optim_steps=None, time_budget_ms=None):
+    """
+    Improve path, in place, for calc_path_cost: the path is cut into rows
+    rows the way calc_path_cost cuts it and only the distances within a row
+    count. The moves swap two
+    nodes so that one of them lands next to one of its NEIGHBORS nearest
+    nodes, only the at most 4 edges around the two swapped nodes change so each
+    move is scored in constant time. Uses the same don't-look bits, limits and
+    endpoints as optimize_solution.
+
+    Returns (number of moves, total improvement)
+    """
+    N = len(path)
 
-        prev_x = x
+    def row(index):
+        return (index * rows) // N
 
-    return cost
+    # with a row per node there is nothing to improve
+    if N < 3 or N <= rows:
+        return (0, 0.0)
+
+    if not isinstance(distances, TriangularMatrix):
+        distances = TriangularMatrix.from_rows(distances)
+
+    get = distances.get
+    neighbors = distances.nearest(NEIGHBORS)
+
+    # endpoints stay put, so do not swap the first or last node
+    if endpoints is None:
+        (lowest, highest) = (0, N - 1)
+    else:
+        (lowest, highest) = (1, N - 2)
+
+    if time_budget_ms is None:
+        deadline = None
+    else:
+        deadline = perf_counter() + time_budget_ms / 1000.0
+
+    position = pyarray("i", [0] * N)
+
+    for (index, node) in enumerate(path):
+        position[node] = index
+
+    # counted[k] is 1 if the edge from path[k - 1] to path[k] is within a row
+    counted = bytearray(N + 1)
+
+    for k in range(1, N):
+        if row(k) == row(k - 1):
+            counted[k] = 1
+
+    def swap_gain(p, q):
+        # p < q, only the edges that end at p, p+1, q and q+1 change
+        (node_p, node_q) = (path[p], path[q])
+        gain = 0.0
+
+        if counted[p]:
+            gain += get(path[p - 1], node_p) - get(path[p - 1], node_q)
+
+        if counted[q + 1]:
+            gain += get(node_q, path[q + 1]) - get(node_p, path[q + 1])
+
+        if q != p + 1:
+            if counted[p + 1]:
+                gain += get(node_p, path[p + 1]) - get(node_q, path[p + 1])
+
+            if counted[q]:
+                gain += get(path[q - 1], node_q) - get(path[q - 1], node_p)
+
+        return gain
 
-# @timed_function
-def solve_tsp(distances, optim_steps=0, endpoints=None, desc=None):
+    def incident_cost(p):
+        # what the node at p contributes to calc_path_cost
+        cost = 0.0
+
+        if counted[p]:
+            cost += get(path[p - 1], path[p])
+
+        if counted[p + 1]:
+            cost += get(path[p], path[p + 1])
+
+        return cost
+
+    def find_move(a):
+        p = position[a]
+        cost_a = incident_cost(p)
+
+        for c in neighbors[a]:
+            q = position[c]
+            distance = get(a, c)
+
+            # a swap that moves a node next to the other can only pay off if
+            # their distance is below what that node costs now
+            moves = []
+
+            if distance < cost_a:
+                moves.append((p, q - 1, q))
+                moves.append((p, q + 1, q))
+
+            if distance < incident_cost(q):
+                moves.append((q, p - 1, p))
+                moves.append((q, p + 1, p))
+
+            for (node, target, anchor) in moves:
+                if target < lowest or target > highest or target == node:
+                    continue
+
+                # the target must be in the row of the node it is moved next to
+                if row(target) != row(anchor):
+                    continue
+
+                (i, j) = (node, target) if node < target else (target, node)
+
+                if i < lowest or j > highest:
+                    continue
+
+                gain = swap_gain(i, j)
+
+                if gain > MIN_GAIN:
+                    return (gain, i, j)
+
+        return None
+
+    queue = list(path)
+    queue.reverse()
+    active = bytearray([1] * N)
+    optimizations = 0
+    d_total = 0.0
+
+    while queue:
+        if optim_steps is not None and optimizations >= optim_steps:
+            break
+
+        if deadline is not None and perf_counter() > deadline:
+            break
+
+        a = queue.pop()
+        active[a] = 0
+        move = find_move(a)
+
+        if move is None:
+            continue
+
+        (gain, i, j) = move
+        (path[i], path[j]) = (path[j], path[i])
+        position[path[i]] = i
+        position[path[j]] = j
+        optimizations += 1
+        d_total += gain
+
+        for index in (i - 1, i, i + 1, j - 1, j, j + 1):
+            if 0 <= index < N and not active[path[index]]:
+                active[path[index]] = 1
+                queue.append(path[index])
+
+    return (optimizations, d_total)
+
+
+@timed_function
+def solve_tsp(distances, optim_steps=0, endpoints=None, desc=None, time_budget_ms=None, exact_max_nodes=None, rows=None):
     """
     Given a distance matrix, finds a solution for the TSP problem.
     Returns list of vertex indices.
     Guarantees that the first index is lower than the last
 
-    :arg: distances : left-triangular matrix of distances. array of arrays
-    :arg: optim_steps (int) number of additional optimization steps, allows to improve solution but costly.
-    :arg: pairs_by_dist (function) an implementtion of the pairs_by_dist function. for optimization purposes.
+    :arg: distances : left-triangular matrix of distances. array of arrays or a TriangularMatrix
+    :arg: optim_steps (int) maximum number of optimize_solution moves, 0 is no limit if time_budget_ms is set
     :arg: endpoinds : None or pair (int,int)
+    :arg: time_budget_ms : how long optimize_solution may take to improve the greedy path, None is no limit if optim_steps is set
+    :arg: exact_max_nodes : solve problems of up to this many nodes exactly, None is tsp_solver_exact.EXACT_MAX_NODES
+    :arg: rows : None or the number of rows the path is cut into, optimize_rows then improves the path for calc_path_cost
+
+    With neither optim_steps nor time_budget_ms a problem that is too big to
+    solve exactly gets just the greedy path.
     """
     N = len(distances)
 
@@ -152,15 +509,28 @@ def solve_tsp(distances, optim_steps=0, endpoints=None, desc=None):
     if N == 2:
         return [0,1]
 
+    if endpoints is not None and endpoints[0] == endpoints[1]:
+        raise ValueError("start=end is not supported")
+
+    if exact_max_nodes is None:
+        exact_max_nodes = tsp_solver_exact.EXACT_MAX_NODES
+
+    if N <= exact_max_nodes:
+        path = tsp_solver_exact.solve_tsp_exact(distances, endpoints)
+
+        if rows:
+            optimize_rows(distances, path, endpoints, rows, optim_steps or None, time_budget_ms)
+
+            if endpoints is None and path[0] > path[-1]:
+                path.reverse()
+
+        return path
+
     # State of the TSP solver algorithm.
     node_valency = pyarray("i", [2] * N)  # Initially, each node has 2 sticky ends
 
     if endpoints is not None:
         start, end = endpoints
-
-        if start == end:
-            raise ValueError("start=end is not supported")
-
         node_valency[start] = 1
         node_valency[end] = 1
 
@@ -168,69 +538,79 @@ def solve_tsp(distances, optim_steps=0, endpoints=None, desc=None):
     connections = [[] for i in range(N)]
 
     def join_segments(sorted_pairs):
-        # segments of nodes. Initially, each segment contains only 1 node
-        segments = [[i] for i in range(N)]
-
-        def possible_edges():
-            # Generate sequence of graph edges, that are possible and connect different segments.
-            for ij in sorted_pairs:
-                (i, j) = ij
-
-                # if both start and end could have connections and both nodes connect to a different segments
-                if (
-                    node_valency[i]
-                    and node_valency[j]
-                    and (segments[i] is not segments[j])
-                ):
-                    yield ij
-
-        def connect_vertices(i, j):
+        # segments of nodes as a union-find forest. Initially, each segment
+        # contains only 1 node
+        parent = pyarray("i", list(range(N)))
+        rank = pyarray("i", [0] * N)
+
+        def find(i):
+            # path halving
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+
+            return i
+
+        def connect_vertices(i, j, root_i, root_j):
             node_valency[i] -= 1
             node_valency[j] -= 1
             connections[i].append(j)
             connections[j].append(i)
 
-            # Merge segment J into segment I.
-            seg_i = segments[i]
-            seg_j = segments[j]
-
-            if len(seg_j) > len(seg_i):
-                (seg_i, seg_j) = (seg_j, seg_i)
-                (i, j) = (j, i)
+            # Merge the lower ranked segment into the other one
+            if rank[root_i] < rank[root_j]:
+                (root_i, root_j) = (root_j, root_i)
 
-            for node_idx in seg_j:
-                segments[node_idx] = seg_i
+            parent[root_j] = root_i
 
-            seg_i.extend(seg_j)
+            if rank[root_i] == rank[root_j]:
+                rank[root_i] += 1
 
-        def edge_connects_endpoint_segments(i, j):
+        def edge_connects_endpoint_segments(root_i, root_j):
             # return True, if given ede merges 2 segments that have endpoints in them
-            (si, sj) = (segments[i], segments[j])
-            (ss, se) = (segments[start], segments[end])
-            return (si is ss) and (sj is se) or (sj is ss) and (si is se)
+            (root_start, root_end) = (find(start), find(end))
+            return (root_i == root_start and root_j == root_end) or (root_j == root_start and root_i == root_end)
 
         # Take first N-1 possible edge. they are already sorted by distance
         edges_left = N - 1
 
-        for (i, j) in possible_edges():
-            if endpoints and edges_left != 1 and edge_connects_endpoint_segments(i, j):
+        for (i, j) in sorted_pairs:
+            # if both start and end could have connections and both nodes connect to a different segments
+            if not node_valency[i] or not node_valency[j]:
+                continue
+
+            root_i = find(i)
+            root_j = find(j)
+
+            if root_i == root_j:
+                continue
+
+            if endpoints and edges_left != 1 and edge_connects_endpoint_segments(root_i, root_j):
                 continue  # don't allow premature path termination
 
-            connect_vertices(i, j)
+            connect_vertices(i, j, root_i, root_j)
             edges_left -= 1
 
             if edges_left == 0:
                 break
 
     # invoke main greedy algorithm
-    join_segments(pairs_by_dist(N, distances))
+    if isinstance(distances, TriangularMatrix) and N >= CANDIDATES_MIN_NODES:
+        join_segments(candidate_pairs(distances, node_valency))
+    else:
+        join_segments(pairs_by_dist(N, distances))
+
+    # restore path from the connections map (graph)
+    path = restore_path(connections, endpoints=endpoints)
 
     # now call additional optiomization procedure.
-    for passn in range(optim_steps):
-        (nopt, dtotal) = optimize_solution(distances, connections, endpoints)
+    if optim_steps or time_budget_ms is not None:
+        optimize_solution(distances, path, endpoints, optim_steps or None, time_budget_ms)
 
-        if nopt == 0:
-            break
+    if rows:
+        optimize_rows(distances, path, endpoints, rows, optim_steps or None, time_budget_ms)
 
-    # restore path from the connections map (graph) and return it
-    return restore_path(connections, endpoints=endpoints)
+    if endpoints is None and path[0] > path[-1]:
+        path.reverse()
+
+    return path
@@ -0,0 +1,131 @@
+"""
+Multi-start greedy traveling salesman. The greedy join in solve_tsp is
+deterministic so one bad early edge on a noisy scan stays in the path. This
+runs it again on copies of the distances with a little seeded random noise
+added, which makes it pick different early edges, scores every path on the
+real distances with calc_path_cost and keeps the best one.
+
+The first start is always the plain solve_tsp so the result is never worse
+than it. The other starts can run on a concurrent.futures thread or process
+pool, any that have not finished by the deadline are dropped.
+
+The deadline decides which results are used, it cannot stop a start that is
+already running on the pool. A start that has not begun by the deadline
+returns at once, so at worst the pool is busy for one more greedy solve per
+worker after the deadline, and shutting the pool down waits for those.
+"""
+
+from array import array as pyarray
+from rubikscolorresolver.matrix import TriangularMatrix, numpy
+from rubikscolorresolver.profile import timed_function
+from rubikscolorresolver.tsp_solver_greedy import calc_path_cost, perf_counter, solve_tsp
+import time
+
+try:
+    from random import Random
+except ImportError:
+    # micropython only has the module level functions
+    Random = None
+
+# Each distance of a perturbed start is scaled by a random factor in 1 +/- NOISE
+NOISE = 0.05
+
+
+def perturbed_matrix(distances, seed, noise=NOISE):
+    """
+    Return a TriangularMatrix of distances with every distance scaled by a
+    random factor in 1 +/- noise, the same factors for the same seed
+    """
+    if numpy is not None:
+        values = numpy.frombuffer(distances.values, dtype=numpy.float32)
+        factors = numpy.random.default_rng(seed).uniform(1.0 - noise, 1.0 + noise, len(values))
+        return TriangularMatrix(len(distances), values * factors)
+
+    if Random is not None:
+        uniform = Random(seed).uniform
+    else:
+        import random
+        random.seed(seed)
+        uniform = random.uniform
+
+    return TriangularMatrix(len(distances), pyarray("f", [value * uniform(1.0 - noise, 1.0 + noise) for value in distances.values]))
+
+
+def solve_tsp_perturbed(distances, seed, noise=NOISE, optim_steps=0, endpoints=None, time_budget_ms=None, solve_rows=None,
+                        deadline_time=None):
+    """
+    solve_tsp on the distances perturbed by seed, a function of plain
+    arguments so it can run on a process pool. Returns None without solving
+    if it starts after deadline_time, a time.time() that every process shares.
+    """
+    if deadline_time is not None and time.time() > deadline_time:
+        return None
+
+    return solve_tsp(
+        perturbed_matrix(distances, seed, noise), optim_steps, endpoints=endpoints, time_budget_ms=time_budget_ms, rows=solve_rows)
+
+
+@timed_function
+def solve_tsp_multi_start(distances, starts, executor=None, deadline_ms=None, rows=6,
+                          optim_steps=0, endpoints=None, time_budget_ms=None, solve_rows=None, noise=NOISE):
+    """
+    Return the path with the lowest calc_path_cost(distances, path, rows) of
+    starts greedy solves, the first on distances and the rest on perturbed
+    copies. Ties go to the earlier start.
+
+    :arg: starts (int) how many solves, 1 is just solve_tsp
+    :arg: executor : None or a concurrent.futures pool to run the perturbed starts on
+    :arg: deadline_ms : None or how long to wait for the perturbed starts, in ms from the call, see the module docstring
+    :arg: optim_steps, endpoints, time_budget_ms : passed to every solve_tsp
+    :arg: solve_rows : passed to every solve_tsp as its rows
+    """
+    if not isinstance(distances, TriangularMatrix):
+        distances = TriangularMatrix.from_rows(distances)
+
+    if deadline_ms is None:
+        deadline = None
+        deadline_time = None
+    else:
+        deadline = perf_counter() + deadline_ms / 1000.0
+        deadline_time = time.time() + deadline_ms / 1000.0
+
+    futures = []
+
+    if executor is not None:
+        for seed in range(1, starts):
+            futures.append(executor.submit(
+                solve_tsp_perturbed, distances, seed, noise, optim_steps, endpoints, time_budget_ms, solve_rows, deadline_time))
+
+    best_path = solve_tsp(distances, optim_steps, endpoints=endpoints, time_budget_ms=time_budget_ms, rows=solve_rows)
+    best_cost = calc_path_cost(distances, best_path, rows)
+
+    def keep_best(path):
+        nonlocal best_path, best_cost
+
+        if path is None:
+            return
+
+        cost = calc_path_cost(distances, path, rows)
+
+        if cost < best_cost:
+            (best_path, best_cost) = (path, cost)
+
+    if executor is not None:
+        from concurrent.futures import wait
+
+        wait(futures, None if deadline is None else max(0.0, deadline - perf_counter()))
+
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                keep_best(future.result())
+            else:
+                future.cancel()
+
+    else:
+        for seed in range(1, starts):
+            if deadline is not None and perf_counter() > deadline:
+                break
+
+            keep_best(solve_tsp_perturbed(distances, seed, noise, optim_steps, endpoints, time_budget_ms, solve_rows))
+
+    return best_path
@@ -1,16 +1,48 @@
 
 from rubikscolorresolver.base import (
+    COLOR_NAMES,
+    CubeStore,
+    Square,
     get_swap_count,
     rgb2lab,
+    rgb2lab_many,
 )
 from rubikscolorresolver import (
     hex_to_rgb,
+    match_edge_pairs,
     median,
 )
+from rubikscolorresolver.assignment_solver import solve_assignment
+from rubikscolorresolver.matrix import TriangularMatrix
+from rubikscolorresolver.permutations import permutations
+from rubikscolorresolver.tsp_solver_exact import EXACT_MAX_NODES, solve_tsp_exact
+from rubikscolorresolver.tsp_solver_greedy import (
+    calc_path_cost,
+    candidate_pairs,
+    optimize_rows,
+    optimize_solution,
+    pairs_by_dist,
+    solve_tsp,
+)
+from rubikscolorresolver.tsp_solver_multistart import perturbed_matrix, solve_tsp_multi_start, solve_tsp_perturbed
+from rubikscolorresolver.scan import (
+    ScanDataError,
+    decode_scan,
+    decode_scan_binary,
+    decode_scan_dict,
+    decode_scan_json,
+    encode_scan_binary,
+)
+from array import array
 import logging
 import unittest
 import sys
 
+try:
+    from json import dumps as json_dumps
+except ImportError:
+    from ujson import dumps as json_dumps
+
 
 def is_micropython():
     return sys.implementation.name == "micropython"
@@ -18,6 +50,40 @@ def is_micropython():
 
 log = logging.getLogger(__name__)
 
+
+def circle_points(count):
+    """
+    count points on a circle, numbered out of order
+    """
+    from math import cos, pi, sin
+
+    return [(cos(2 * pi * ((x * 7) % count) / count), sin(2 * pi * ((x * 7) % count) / count)) for x in range(count)]
+
+
+def scattered_points(count):
+    """
+    count points scattered on a plane
+    """
+    return [(((x * 37) % 101) / 10.0, ((x * 53) % 97) / 10.0) for x in range(count)]
+
+
+def distance_matrix(points):
+    """
+    The TriangularMatrix of the distances between points
+    """
+    matrix = TriangularMatrix(len(points))
+
+    for i in range(len(points)):
+        for j in range(i):
+            matrix.set(i, j, ((points[i][0] - points[j][0]) ** 2 + (points[i][1] - points[j][1]) ** 2) ** 0.5)
+
+    return matrix
+
+
+def path_cost(matrix, path):
+    return sum(matrix.get(path[x], path[x + 1]) for x in range(len(path) - 1))
+
+
 # For color names to RGB values see:
 # https://www.w3schools.com/colors/colors_names.asp
 
@@ -79,6 +145,22 @@ class TestRGB2Lab(unittest.TestCase):
         self.assertAlmostEqual(lab.a, -2.1385958505868996, places=15)
         self.assertEqual(lab.b, -10.57740141476744)
 
+    def test_many(self):
+        rgbs = ((255, 0, 0), (0, 255, 0), (0, 0, 255), (112, 128, 144))
+        labs = rgb2lab_many(bytes([value for rgb in rgbs for value in rgb]))
+        self.assertEqual(len(labs), 4)
+
+        for (rgb, lab) in zip(rgbs, labs):
+            expected = rgb2lab(rgb)
+            self.assertEqual((lab.L, lab.a, lab.b), (expected.L, expected.a, expected.b))
+            self.assertEqual((lab.red, lab.green, lab.blue), rgb)
+
+    def test_out_of_range(self):
+        # outside 0 - 255 the table is skipped, -1 is not read as 255
+        lab = rgb2lab((-1, 0, 0))
+        self.assertLess(lab.L, 0.01)
+        self.assertAlmostEqual(rgb2lab((0.0, 0.0, 255.0)).L, rgb2lab((0, 0, 255)).L, places=12)
+
 
 '''
 if not is_micropython():
@@ -141,6 +223,492 @@ if not is_micropython():
 '''
 
 
+if not is_micropython():
+    from rubikscolorresolver import RubiksColorSolverGeneric, tsp_matrix, tsp_matrix_numpy
+    from rubikscolorresolver.cie2000 import LabDistanceCache, cie2000_cache, lab_distance_cie2000, numpy
+    from rubikscolorresolver.layout import get_layout
+
+    class TestLabDistanceCache(unittest.TestCase):
+        def test_pair_stored_once(self):
+            lab1 = rgb2lab((246, 251, 252))
+            lab2 = rgb2lab((216, 28, 58))
+            cie2000_cache.clear()
+            delta_e = lab_distance_cie2000(lab1, lab2)
+            self.assertEqual(lab_distance_cie2000(lab2, lab1), delta_e)
+            self.assertEqual(len(cie2000_cache), 1)
+            self.assertEqual(cie2000_cache.hits, 1)
+            self.assertEqual(cie2000_cache.misses, 1)
+
+        def test_eviction(self):
+            cache = LabDistanceCache(maxsize=2)
+            cache.set("a", 1.0)
+            cache.set("b", 2.0)
+            cache.get("a")
+            cache.set("c", 3.0)
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(cache.get("a"), 1.0)
+            self.assertEqual(cache.evictions, 1)
+
+            cache.resize(1)
+            self.assertEqual(len(cache), 1)
+            self.assertEqual(cache.evictions, 2)
+
+            cache.clear()
+            self.assertEqual(cache.stats()["size"], 0)
+            self.assertEqual(cache.stats()["evictions"], 0)
+
+    class TestLabDistanceMatrix(unittest.TestCase):
+        @unittest.skipIf(numpy is None, "numpy is not installed")
+        def test_tsp_matrix_numpy(self):
+            rgbs = ((246, 251, 252), (246, 252, 244), (252, 239, 233), (44, 253, 226), (19, 139, 252), (216, 28, 58))
+            squares = [Square(None, index, red, green, blue) for (index, (red, green, blue)) in enumerate(rgbs)]
+            matrix = tsp_matrix_numpy(squares)
+
+            for (x, square_x) in enumerate(squares):
+                for (y, square_y) in enumerate(squares):
+                    if x == y:
+                        self.assertEqual(matrix.get(x, y), 0)
+                    else:
+                        # the matrix holds float32s
+                        self.assertAlmostEqual(matrix.get(x, y), lab_distance_cie2000(square_x.lab, square_y.lab), places=4)
+
+        def test_square_distances(self):
+            """
+            Slices of the cube's distance matrix are the tsp_matrix of those
+            squares, and the reference table matches lab_distance
+            """
+            cube = RubiksColorSolverGeneric(2)
+            cube.enter_scan_data(bytes(range(72)))
+            squares = [cube.pos2square[position] for position in (1, 7, 12, 24)]
+            matrix = tsp_matrix(squares, cube.get_square_distances())
+            self.assertEqual(matrix.values, tsp_matrix(squares).values)
+
+            color_box = {"Bu": rgb2lab((0, 0, 255)), "Gr": rgb2lab((0, 255, 0)), "OR": rgb2lab((255, 128, 0)),
+                         "Rd": rgb2lab((255, 0, 0)), "Wh": rgb2lab((255, 255, 255)), "Ye": rgb2lab((255, 255, 0))}
+            table = cube.get_reference_distances(color_box)
+            self.assertIs(cube.get_reference_distances(color_box), table)
+            self.assertAlmostEqual(table[7][3], lab_distance_cie2000(cube.pos2square[7].lab, color_box["Rd"]), places=12)
+
+    class TestLayout(unittest.TestCase):
+        """
+        tests/fixtures/ are the hand written tables that get_layout() replaced
+        """
+
+        def get_fixture(self, name):
+            import importlib
+            import os
+
+            fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+            if fixtures_dir not in sys.path:
+                sys.path.insert(0, fixtures_dir)
+
+            if isinstance(name, int):
+                name = "cube_%d%d%d" % (name, name, name)
+
+            return importlib.import_module(name)
+
+        def test_corner_tuples(self):
+            for width in range(2, 8):
+                self.assertEqual(get_layout(width).corner_tuples, self.get_fixture(width).corner_tuples)
+
+        def test_edge_orbit_id(self):
+            for width in range(3, 8):
+                layout = get_layout(width)
+                edge_orbit_id = self.get_fixture(width).edge_orbit_id
+                positions = [position for (position, orbit_id) in enumerate(layout.edge_orbit_id) if orbit_id is not None]
+                self.assertEqual(sorted(positions), sorted(edge_orbit_id.keys()))
+
+                for position in positions:
+                    self.assertEqual(layout.edge_orbit_id[position], edge_orbit_id[position])
+
+        def test_edge_orbit_wing_pairs(self):
+            for width in range(2, 8):
+                layout = get_layout(width)
+                fixture = self.get_fixture(width)
+
+                # The fixtures do not list the pairs in a consistent order
+                self.assertEqual(len(layout.edge_orbit_wing_pairs), len(fixture.edge_orbit_wing_pairs))
+
+                for (wing_pairs, fixture_wing_pairs) in zip(layout.edge_orbit_wing_pairs, fixture.edge_orbit_wing_pairs):
+                    self.assertEqual(
+                        sorted([sorted(wing_pair) for wing_pair in wing_pairs]),
+                        sorted([sorted(wing_pair) for wing_pair in fixture_wing_pairs]),
+                    )
+
+        def test_center_groups(self):
+            for width in range(2, 8):
+                center_groups = [sorted(positions) for (desc, positions) in get_layout(width).center_groups]
+                middles = []
+
+                for (desc, positions) in self.get_fixture(width).center_groups:
+                    if desc == "centers":
+                        middles = positions
+
+                # the 5x5x5 fixture also puts the middle squares in its x-centers and t-centers
+                for (desc, positions) in self.get_fixture(width).center_groups:
+                    if desc != "centers":
+                        positions = [position for position in positions if position not in middles]
+
+                    self.assertIn(sorted(positions), center_groups)
+
+        def test_highlow(self):
+            for width in (4, 5, 6):
+                layout = get_layout(width)
+
+                for ((position, partner, side_name, partner_side_name), highlow) in self.get_fixture(width).highlow_edge_values.items():
+
+                    # the 5x5x5 fixture has entries for the midges but they are never used
+                    if layout.wing_chirality[position]:
+                        self.assertEqual(layout.highlow(position, partner, side_name, partner_side_name), highlow)
+
+        def test_orbit_index(self):
+            orbit_index = self.get_fixture("orbit_index")
+
+            for width in (4, 5, 6, 7):
+                layout = get_layout(width)
+
+                for (key, value) in getattr(orbit_index, "orbit_index_%d%d%d" % (width, width, width)).items():
+                    self.assertEqual(layout.orbit_index(*key), value)
+
+        def test_memoized(self):
+            self.assertIs(get_layout(9), get_layout(9))
+            self.assertEqual(len(get_layout(9).corner_tuples), 8)
+            self.assertEqual(len(get_layout(9).edge_orbit_wing_pairs), 4)
+            self.assertEqual(sum([len(positions) for (desc, positions) in get_layout(9).center_groups]), 49 * 6)
+
+    class TestProfile(unittest.TestCase):
+        def test_enable_disable(self):
+            import rubikscolorresolver
+            from rubikscolorresolver import base, profile
+
+            lab_distance = base.lab_distance
+            solve_tsp = rubikscolorresolver.solve_tsp
+            profile.reset()
+            profile.enable()
+
+            try:
+                self.assertIsNot(base.lab_distance, lab_distance)
+                self.assertIs(rubikscolorresolver.lab_distance, base.lab_distance)
+                rubikscolorresolver.traveling_salesman(
+                    [Square(None, index, red, green, blue) for (index, (red, green, blue)) in enumerate(
+                        ((246, 251, 252), (44, 253, 226), (19, 139, 252), (216, 28, 58)))],
+                    "test",
+                )
+            finally:
+                profile.disable()
+
+            self.assertIs(base.lab_distance, lab_distance)
+            self.assertIs(rubikscolorresolver.solve_tsp, solve_tsp)
+
+            profile_data = profile.get_profile_data()
+            self.assertEqual(profile_data["solve_tsp"]["calls"], 1)
+            self.assertEqual(profile_data["traveling_salesman"]["calls"], 1)
+            self.assertLessEqual(
+                profile_data["traveling_salesman"]["time_ms"], profile_data["traveling_salesman"]["cumulative_time_ms"])
+            profile.reset()
+            self.assertEqual(profile.get_profile_data(), {})
+
+    class TestBatch(unittest.TestCase):
+        def get_lines(self):
+            import json
+            import os
+
+            test_data = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test-data")
+            lines = []
+
+            for filename in ("2x2x2-random-01.txt", "3x3x3-tetris.txt", "4x4x4-random-01.txt"):
+                with open(os.path.join(test_data, filename), "r") as fh:
+                    lines.append(json.dumps({"id": filename, "scan": json.load(fh)}))
+
+            lines.insert(1, json.dumps({"1": [0, 0, 0]}))
+            return "\n".join(lines) + "\n"
+
+        def test_resolve_batch(self):
+            import io
+            import json
+            from rubikscolorresolver.batch import resolve_batch
+
+            for processes in (1, 2):
+                output = io.StringIO()
+                self.assertEqual(resolve_batch(io.StringIO(self.get_lines()), output, processes=processes, max_pending=2), 4)
+                results = [json.loads(line) for line in output.getvalue().splitlines()]
+                self.assertEqual([result["id"] for result in results], ["2x2x2-random-01.txt", 2, "3x3x3-tetris.txt", "4x4x4-random-01.txt"])
+                self.assertEqual(results[0]["kociemba"], "LRLURFDFDFBBRRBLUBLUDFDU")
+                self.assertEqual(results[1]["error"], "ScanDataError: 1 squares is not a cube")
+                self.assertEqual(results[2]["kociemba"], "FFBFUBFBBUDDURDUUDRLLRFLRRLBBFBDFBFFUDDULDUUDLRRLBRLLR")
+
+    class TestReport(unittest.TestCase):
+        def test_report(self):
+            import json
+            import os
+            from rubikscolorresolver import RubiksColorSolverGeneric
+            from rubikscolorresolver.report import MemoryReport, NullReport
+
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test-data", "3x3x3-tetris.txt"), "r") as fh:
+                scan_data = json.load(fh)
+
+            cube = RubiksColorSolverGeneric(3)
+            self.assertIsInstance(cube.report, NullReport)
+            self.assertFalse(cube.write_debug_file)
+
+            cube.report = MemoryReport()
+            cube.enter_scan_data(scan_data)
+            cube.crunch_colors()
+            html = cube.report.getvalue()
+            self.assertTrue(html.startswith("<!DOCTYPE html>"))
+            self.assertIn("<h2>corners</h2>", html)
+            self.assertTrue(html.endswith("</html>\n"))
+
+            # the RGB input is readable for json and binary scans alike
+            (width, rgb) = decode_scan(encode_scan_binary(3, decode_scan_dict(scan_data)[1]))
+            cube = RubiksColorSolverGeneric(3)
+            cube.report = MemoryReport()
+            cube.enter_scan_data(rgb)
+            html = cube.report.getvalue()
+            self.assertIn("<h1>RGB Input</h1>\n<pre>1: ({}, {}, {})\n2: ".format(*scan_data["1"]), html)
+            self.assertIn("\n54: ({}, {}, {})</pre>".format(*scan_data["54"]), html)
+            self.assertNotIn("bytearray", html)
+
+    class TestThreads(unittest.TestCase):
+        def test_concurrent_resolve(self):
+            """
+            Resolve every cube in test-data from many threads at once, the
+            results must match resolving them one at a time
+            """
+            import os
+            from concurrent.futures import ThreadPoolExecutor
+            from rubikscolorresolver.batch import resolve_scan
+
+            test_data = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test-data")
+            scans = []
+
+            for filename in sorted(os.listdir(test_data)):
+                with open(os.path.join(test_data, filename), "r") as fh:
+                    scans.append(fh.read())
+
+            def resolve(scan):
+                try:
+                    return resolve_scan(scan)
+                except Exception as e:
+                    return repr(e)
+
+            expected = [resolve(scan) for scan in scans]
+
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                self.assertEqual(list(executor.map(resolve, scans)), expected)
+
+    class TestPipeline(unittest.TestCase):
+        def resolve(self, filename, executor=None):
+            import os
+            from rubikscolorresolver import RubiksColorSolverGeneric
+            from rubikscolorresolver.scan import decode_scan
+
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test-data", filename), "r") as fh:
+                (width, rgb) = decode_scan(fh.read())
+
+            cube = RubiksColorSolverGeneric(width)
+            cube.enter_scan_data(rgb)
+            cube.crunch_colors(executor)
+            return "".join(cube.cube_for_kociemba_strict())
+
+        def test_micropython_fallbacks(self):
+            """
+            Without the distance tables of CPython the results are the same
+            """
+            from unittest import mock
+            import rubikscolorresolver
+
+            filenames = ("3x3x3-tetris.txt", "4x4x4-random-01.txt", "5x5x5-random-01.txt")
+            expected = [self.resolve(filename) for filename in filenames]
+
+            with mock.patch.object(rubikscolorresolver, "is_micropython", return_value=True):
+                self.assertEqual([self.resolve(filename) for filename in filenames], expected)
+
+        def test_executor(self):
+            """
+            Resolving the center groups and edge orbits on a thread or process
+            pool gives the same results as resolving them one after another
+            """
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+            filenames = ("2x2x2-random-01.txt", "3x3x3-random-01.txt", "4x4x4-random-01.txt", "7x7x7-random-01.txt")
+            expected = [self.resolve(filename) for filename in filenames]
+
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                self.assertEqual([self.resolve(filename, executor) for filename in filenames], expected)
+
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                self.assertEqual([self.resolve(filename, executor) for filename in filenames], expected)
+
+    class TestCommandLine(unittest.TestCase):
+        def test_processes(self):
+            import io
+            from unittest import mock
+            from rubikscolorresolver import resolve_colors
+
+            for value in ("0", "-1", "many"):
+                with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+                    with self.assertRaises(SystemExit) as context:
+                        resolve_colors(["rubiks-color-resolver.py", "--batch", "-", "--processes", value])
+
+                self.assertEqual(context.exception.code, 1)
+                self.assertTrue(stdout.getvalue().startswith("ERROR: --processes must be a positive integer"))
+
+    class TestService(unittest.TestCase):
+        def test_resolve_and_health(self):
+            import json
+            from rubikscolorresolver.service import ResolverService
+
+            import os
+
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test-data", "2x2x2-random-01.txt"), "r") as fh:
+                record = {"id": "2x2x2-random-01.txt", "scan": json.load(fh)}
+
+            service = ResolverService(processes=1)
+            self.assertEqual(service.resolve(record), {"id": "2x2x2-random-01.txt", "kociemba": "LRLURFDFDFBBRRBLUBLUDFDU"})
+            self.assertEqual(service.resolve({"1": [0, 0, 0]}), {"error": "ScanDataError: 1 squares is not a cube"})
+
+            health = service.health()
+            self.assertEqual(health["bad_requests"], 1)
+            self.assertEqual(list(health["widths"].keys()), ["2"])
+            self.assertEqual(health["widths"]["2"]["requests"], 1)
+            self.assertEqual(sum(health["widths"]["2"]["latency_ms"].values()), 1)
+
+        def test_http_limits(self):
+            import http.client
+            import threading
+            from rubikscolorresolver.service import HTTPServer, MAX_BODY_BYTES, ResolverService
+            from rubikscolorresolver.scan import encode_scan_binary
+
+            server = HTTPServer(ResolverService(processes=1), 0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+            def post(body, headers):
+                connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+                connection.putrequest("POST", "/resolve")
+
+                for (name, value) in headers.items():
+                    connection.putheader(name, value)
+
+                connection.endheaders(body)
+                response = connection.getresponse()
+                status = response.status
+                response.read()
+                connection.close()
+                return status
+
+            try:
+                scan = encode_scan_binary(2, bytes(72))
+                content_type = "application/octet-stream; charset=binary"
+                self.assertEqual(post(scan, {"Content-Type": content_type, "Content-Length": str(len(scan))}), 200)
+                self.assertEqual(post(b"", {"Content-Length": str(MAX_BODY_BYTES + 1)}), 413)
+                self.assertEqual(post(b"", {"Content-Length": "-1"}), 400)
+                self.assertEqual(post(b"", {"Content-Length": "many"}), 400)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+        def test_unix_socket_path(self):
+            import json
+            import os
+            import socket
+            import tempfile
+            import threading
+            from rubikscolorresolver.service import MAX_BODY_BYTES, ResolverService, UnixServer, remove_socket
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "resolver.sock")
+
+                with open(path, "w") as fh:
+                    fh.write("not a socket")
+
+                self.assertRaises(ValueError, UnixServer, ResolverService(processes=1), path)
+                self.assertTrue(os.path.exists(path))
+                os.unlink(path)
+
+                server = UnixServer(ResolverService(processes=1), path)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+
+                try:
+                    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                        client.connect(path)
+                        client.sendall(b"health\n" + b"x" * (MAX_BODY_BYTES + 10) + b"\n")
+                        lines = client.makefile("rb").read().splitlines()
+
+                    self.assertEqual(json.loads(lines[0].decode("utf-8"))["status"], "ok")
+                    self.assertIn("byte limit", json.loads(lines[1].decode("utf-8"))["error"])
+                    self.assertEqual(len(lines), 2)
+                finally:
+                    server.shutdown()
+                    server.server_close()
+
+                remove_socket(path)
+                self.assertFalse(os.path.exists(path))
+                remove_socket(path)
+
+
+class TestScan(unittest.TestCase):
+    def get_scan(self):
+        return {str(position): [position, 255 - position, 7] for position in range(1, 25)}
+
+    def test_json(self):
+        (width, rgb) = decode_scan_json(json_dumps(self.get_scan()))
+        self.assertEqual(width, 2)
+        self.assertEqual(list(rgb[0:6]), [1, 254, 7, 2, 253, 7])
+        self.assertEqual(decode_scan_binary(encode_scan_binary(width, rgb)), (2, rgb))
+        self.assertEqual(decode_scan(encode_scan_binary(width, rgb)), (2, rgb))
+        self.assertEqual(len(encode_scan_binary(7, bytearray(882))), 883)
+
+    def test_round_trip(self):
+        for width in range(2, 18):
+            square_count = width * width * 6
+            rgb = bytearray((x * 7) % 256 for x in range(square_count * 3))
+            scan = {str(position): list(rgb[(position - 1) * 3:position * 3]) for position in range(1, square_count + 1)}
+
+            # the width byte of 9, 10, 13 and 32 is whitespace
+            self.assertEqual(decode_scan(encode_scan_binary(width, rgb)), (width, rgb))
+            self.assertEqual(decode_scan(json_dumps(scan)), (width, rgb))
+            self.assertEqual(decode_scan((" \n" + json_dumps(scan)).encode("utf-8")), (width, rgb))
+
+    def test_invalid(self):
+        scan = self.get_scan()
+        scan["24"] = [1, 2, 256]
+        self.assertRaises(ScanDataError, decode_scan_dict, scan)
+
+        scan["24"] = [1, 2]
+        self.assertRaises(ScanDataError, decode_scan_dict, scan)
+
+        del scan["24"]
+        self.assertRaises(ScanDataError, decode_scan_dict, scan)
+
+        scan["25"] = [1, 2, 3]
+        self.assertRaises(ScanDataError, decode_scan_dict, scan)
+
+        self.assertRaises(ScanDataError, decode_scan_json, "[1, 2, 3]")
+        self.assertRaises(ScanDataError, decode_scan_binary, bytes([2]) + bytes(71))
+
+
+class TestSquare(unittest.TestCase):
+    def test_view_of_store(self):
+        store = CubeStore(3)
+        square = Square(None, 2, 112, 128, 144, store=store)
+        square.color_name = "Gr"
+        square.side_name = "F"
+        self.assertEqual(COLOR_NAMES[store.color[2]], "Gr")
+        self.assertEqual(square.side_name, "F")
+        self.assertEqual((store.red[2], store.green[2], store.blue[2]), (112, 128, 144))
+        self.assertEqual(square.lab.L, 52.83625796271889)
+
+        square.color_name = None
+        self.assertEqual(store.color[2], 0)
+
+    def test_standalone(self):
+        square = Square(None, "Wh", 255, 255, 255)
+        self.assertEqual(square.lab.L, 100.0)
+        self.assertIsNone(square.color_name)
+
+
 class TestMedian(unittest.TestCase):
     def test_empty_list(self):
         m = median([])
@@ -163,6 +731,292 @@ class TestMedian(unittest.TestCase):
         self.assertEqual(m, 8.5)
 
 
+class TestAssignment(unittest.TestCase):
+    def test_vs_permutations(self):
+        costs = [
+            [41, 12, 93, 7, 58, 30],
+            [22, 75, 18, 64, 9, 51],
+            [88, 33, 47, 15, 70, 26],
+            [5, 61, 29, 83, 44, 97],
+            [56, 20, 72, 38, 11, 63],
+            [19, 94, 36, 52, 80, 14],
+        ]
+        min_cost = min(sum(costs[row][col] for (row, col) in enumerate(permutation)) for permutation in permutations(range(6)))
+        assignment = solve_assignment(costs)
+        self.assertEqual(sorted(assignment), list(range(6)))
+        self.assertEqual(sum(costs[row][col] for (row, col) in enumerate(assignment)), min_cost)
+
+    def test_more_columns_than_rows(self):
+        self.assertEqual(solve_assignment([[5, 1, 9], [1, 5, 9]]), [1, 0])
+
+    def test_match_edge_pairs(self):
+        # three references, wings 0-3 form edge pairs (0, 1) and (2, 3)
+        distances = [
+            [0, 9, 9],
+            [9, 0, 9],
+            [9, 9, 0],
+            [0, 9, 9],
+        ]
+        result = match_edge_pairs([(0, 1), (0, 2)], [(0, 1), (2, 3)], distances)
+        self.assertEqual(result, [(0, 0, False), (1, 1, True)])
+
+    def test_match_corners(self):
+        from rubikscolorresolver import corner_rotations, lab_distance, match_corners
+
+        colors = {
+            "Wh": (235, 235, 235),
+            "Ye": (210, 220, 40),
+            "OR": (230, 120, 30),
+            "Rd": (170, 20, 30),
+            "Gr": (20, 150, 60),
+            "Bu": (20, 60, 170),
+        }
+        references = {name: Square(None, name, *rgb) for (name, rgb) in colors.items()}
+        target_corners = [
+            (references["Wh"], references["Rd"], references["Gr"]),
+            (references["Wh"], references["Gr"], references["OR"]),
+            (references["Ye"], references["Bu"], references["Rd"]),
+            (references["Ye"], references["OR"], references["Bu"]),
+        ]
+
+        # noisy scans of the targets, shuffled and rotated, numbered 1 to 12
+        scanned = [
+            ((225, 125, 45), (40, 70, 160), (200, 205, 60)),
+            ((160, 35, 40), (30, 140, 70), (228, 228, 220)),
+            ((190, 200, 60), (35, 75, 150), (150, 30, 35)),
+            ((35, 160, 50), (240, 110, 40), (220, 230, 225)),
+        ]
+        corners = [
+            tuple(Square(None, (index * 3) + offset + 1, *rgb) for (offset, rgb) in enumerate(corner))
+            for (index, corner) in enumerate(scanned)
+        ]
+
+        def cost(target, corner):
+            return sum(lab_distance(target[x].lab, corner[x].lab) for x in range(3))
+
+        def best_cost(target, corner):
+            return min(cost(target, rotation) for rotation in corner_rotations(corner))
+
+        min_cost = min(
+            sum(best_cost(target_corners[row], corners[col]) for (row, col) in enumerate(permutation))
+            for permutation in permutations(range(4)))
+
+        result = match_corners(target_corners, corners)
+        self.assertEqual(result[0::2], target_corners)
+        self.assertEqual(sorted(square.position for corner in result[1::2] for square in corner), list(range(1, 13)))
+        self.assertAlmostEqual(sum(cost(result[x], result[x + 1]) for x in range(0, 8, 2)), min_cost)
+
+        # each scanned corner went to the target it is a noisy scan of
+        self.assertEqual([corner[0].position for corner in result[1::2]], [6, 12, 7, 3])
+
+
+class TestTriangularMatrix(unittest.TestCase):
+    rows = (
+        (0, 5, 1, 9),
+        (5, 0, 2, 4),
+        (1, 2, 0, 2),
+        (9, 4, 2, 0),
+    )
+
+    def test_get(self):
+        matrix = TriangularMatrix.from_rows(self.rows)
+        self.assertEqual(len(matrix), 4)
+        self.assertEqual(len(matrix.values), 6)
+        self.assertEqual(matrix.to_rows(), self.rows)
+
+        matrix.set(3, 1, 7)
+        self.assertEqual(matrix.get(1, 3), 7)
+
+    def test_sub_matrix(self):
+        matrix = TriangularMatrix.from_rows(self.rows).sub_matrix([3, 0, 2])
+        self.assertEqual(matrix.to_rows(), ((0, 9, 2), (9, 0, 1), (2, 1, 0)))
+
+    def test_solve_tsp(self):
+        """
+        solve_tsp finds the same path in a TriangularMatrix as in the full matrix
+        """
+        matrix = TriangularMatrix.from_rows(self.rows)
+        self.assertEqual(list(pairs_by_dist(4, matrix)), list(pairs_by_dist(4, self.rows)))
+        self.assertEqual(solve_tsp(matrix), solve_tsp(self.rows))
+        self.assertEqual(solve_tsp(matrix, endpoints=(0, 3)), solve_tsp(self.rows, endpoints=(0, 3)))
+
+    def test_candidate_pairs(self):
+        """
+        candidate_pairs yields the pairs in the same order as sorting them
+        all, including the ties, and solve_tsp finds the same path with it
+        """
+        import rubikscolorresolver.tsp_solver_greedy as tsp_solver_greedy
+
+        size = 40
+        rows = [[((min(i, j) * 7919 + max(i, j) * 104729) % 97) / 4.0 if i != j else 0 for j in range(size)] for i in range(size)]
+        matrix = TriangularMatrix.from_rows(rows)
+        node_valency = array("i", [2] * size)
+        self.assertEqual(list(candidate_pairs(matrix, node_valency)), list(pairs_by_dist(size, rows)))
+
+        candidates_min_nodes = tsp_solver_greedy.CANDIDATES_MIN_NODES
+        tsp_solver_greedy.CANDIDATES_MIN_NODES = 0
+
+        try:
+            self.assertEqual(solve_tsp(matrix), solve_tsp(rows))
+            self.assertEqual(solve_tsp(matrix, endpoints=(3, 17)), solve_tsp(rows, endpoints=(3, 17)))
+        finally:
+            tsp_solver_greedy.CANDIDATES_MIN_NODES = candidates_min_nodes
+
+
+class TestLocalSearch(unittest.TestCase):
+    def get_matrix(self):
+        return distance_matrix(circle_points(30))
+
+    def test_optimize_solution(self):
+        matrix = self.get_matrix()
+        path = [(x * 11) % 30 for x in range(30)]
+        cost = path_cost(matrix, path)
+        (moves, gain) = optimize_solution(matrix, path, None)
+
+        self.assertEqual(sorted(path), list(range(30)))
+        self.assertGreater(moves, 0)
+        self.assertAlmostEqual(path_cost(matrix, path), cost - gain, places=3)
+
+        # the 29 sides of the 30-gon
+        self.assertAlmostEqual(path_cost(matrix, path), 29 * matrix.get(0, 13), places=3)
+
+    def test_endpoints_and_budget(self):
+        matrix = self.get_matrix()
+        path = [(x * 11) % 30 for x in range(30)]
+        (moves, gain) = optimize_solution(matrix, path, (path[0], path[-1]))
+        self.assertEqual((path[0], path[-1]), (0, 19))
+
+        path = [(x * 11) % 30 for x in range(30)]
+        self.assertEqual(optimize_solution(matrix, path, None, optim_steps=2)[0], 2)
+
+        path = solve_tsp(matrix, time_budget_ms=1000)
+        self.assertLess(path[0], path[-1])
+        self.assertLessEqual(path_cost(matrix, path), path_cost(matrix, solve_tsp(matrix)))
+
+    def test_calc_path_cost(self):
+        matrix = self.get_matrix()
+        path = list(range(30))
+
+        # the edges between the 6 rows of 5 do not count
+        self.assertAlmostEqual(
+            calc_path_cost(matrix, path),
+            sum(matrix.get(x, x + 1) for x in range(29) if (x + 1) % 5),
+            places=3)
+        self.assertAlmostEqual(calc_path_cost(matrix, path, rows=1), path_cost(matrix, path), places=3)
+        self.assertAlmostEqual(calc_path_cost(matrix.to_rows(), path), calc_path_cost(matrix, path), places=3)
+
+        # 10 squares in 6 rows of 1 or 2
+        self.assertAlmostEqual(
+            calc_path_cost(matrix, list(range(10))),
+            sum(matrix.get(x, x + 1) for x in (0, 2, 5, 7)),
+            places=3)
+
+    def test_optimize_rows(self):
+        matrix = self.get_matrix()
+        path = [(x * 11) % 30 for x in range(30)]
+        cost = calc_path_cost(matrix, path)
+        (moves, gain) = optimize_rows(matrix, path, (path[0], path[-1]), 6)
+
+        self.assertEqual(sorted(path), list(range(30)))
+        self.assertEqual((path[0], path[-1]), (0, 19))
+        self.assertGreater(moves, 0)
+        self.assertAlmostEqual(calc_path_cost(matrix, path), cost - gain, places=3)
+
+        # 20 squares do not divide into 6 rows
+        small = matrix.sub_matrix(list(range(20)))
+        path = [(x * 7) % 20 for x in range(20)]
+        cost = calc_path_cost(small, path)
+        (moves, gain) = optimize_rows(small, path, None, 6)
+        self.assertGreater(moves, 0)
+        self.assertAlmostEqual(calc_path_cost(small, path), cost - gain, places=3)
+
+        path = solve_tsp(matrix, rows=6)
+        self.assertLess(path[0], path[-1])
+        self.assertLessEqual(calc_path_cost(matrix, path), calc_path_cost(matrix, solve_tsp(matrix)))
+
+
+class TestExactSolver(unittest.TestCase):
+    def get_matrix(self, size):
+        return distance_matrix(scattered_points(size))
+
+    def shortest_cost(self, matrix, endpoints):
+        best = None
+
+        for path in permutations(list(range(len(matrix)))):
+            if endpoints is not None and (path[0], path[-1]) != endpoints:
+                continue
+
+            cost = path_cost(matrix, path)
+
+            if best is None or cost < best:
+                best = cost
+
+        return best
+
+    def test_solve_tsp_exact(self):
+        for size in range(3, 8):
+            matrix = self.get_matrix(size)
+
+            path = solve_tsp_exact(matrix)
+            self.assertEqual(sorted(path), list(range(size)))
+            self.assertLess(path[0], path[-1])
+            self.assertAlmostEqual(path_cost(matrix, path), self.shortest_cost(matrix, None), places=3)
+
+            endpoints = (size - 1, 1)
+            path = solve_tsp_exact(matrix.to_rows(), endpoints)
+            self.assertEqual((path[0], path[-1]), endpoints)
+            self.assertAlmostEqual(path_cost(matrix, path), self.shortest_cost(matrix, endpoints), places=3)
+
+    def test_solve_tsp(self):
+        matrix = self.get_matrix(EXACT_MAX_NODES)
+        self.assertEqual(solve_tsp(matrix), solve_tsp_exact(matrix))
+        self.assertGreaterEqual(
+            path_cost(matrix, solve_tsp(matrix, exact_max_nodes=0)),
+            path_cost(matrix, solve_tsp(matrix)))
+
+        self.assertRaises(ValueError, solve_tsp, self.get_matrix(6), endpoints=(2, 2))
+        self.assertRaises(ValueError, solve_tsp, self.get_matrix(12), endpoints=(2, 2))
+        self.assertRaises(ValueError, solve_tsp_exact, self.get_matrix(6), (2, 2))
+
+
+class TestMultiStart(unittest.TestCase):
+    def get_matrix(self):
+        return distance_matrix(scattered_points(60))
+
+    def test_perturbed_matrix(self):
+        matrix = self.get_matrix()
+        perturbed = perturbed_matrix(matrix, 1)
+
+        self.assertEqual(list(perturbed.values), list(perturbed_matrix(matrix, 1).values))
+        self.assertNotEqual(list(perturbed.values), list(perturbed_matrix(matrix, 2).values))
+
+        for (value, perturbed_value) in zip(matrix.values, perturbed.values):
+            self.assertLessEqual(abs(perturbed_value - value), value * 0.051)
+
+    def test_solve_tsp_multi_start(self):
+        matrix = self.get_matrix()
+        cost = calc_path_cost(matrix, solve_tsp(matrix))
+
+        self.assertEqual(solve_tsp_multi_start(matrix, 1), solve_tsp(matrix))
+
+        path = solve_tsp_multi_start(matrix, 8)
+        self.assertEqual(sorted(path), list(range(60)))
+        self.assertLessEqual(calc_path_cost(matrix, path), cost)
+
+        path = solve_tsp_multi_start(matrix, 8, endpoints=(5, 7))
+        self.assertEqual((path[0], path[-1]), (5, 7))
+
+        # past the deadline only the plain solve_tsp is left
+        self.assertEqual(solve_tsp_multi_start(matrix, 8, deadline_ms=0), solve_tsp(matrix))
+        self.assertIsNone(solve_tsp_perturbed(matrix, 1, deadline_time=0))
+
+        if not is_micropython():
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                self.assertEqual(solve_tsp_multi_start(matrix, 8, executor), solve_tsp_multi_start(matrix, 8))
+
+
 class TestSwapCount(unittest.TestCase):
     def test_zero(self):
         swaps = get_swap_count([1, 2, 3, 0, 4], [1, 2, 3, 0, 4])
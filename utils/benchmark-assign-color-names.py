@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Resolve every scan in tests/test-data with each assign_color_names engine,
+report the time spent in assign_color_names and whether the engines agree.
+
+    ./utils/benchmark-assign-color-names.py [iterations]
+"""
+
+from math import sqrt
+from rubikscolorresolver import RubiksColorSolverGeneric
+import json
+import os
+import sys
+import time
+
+ENGINES = ("permutations", "hungarian")
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests", "test-data")
+
+
+def resolve(scan_data, engine):
+    width = int(sqrt(len(scan_data) / 6))
+    cube = RubiksColorSolverGeneric(width)
+    cube.assignment_engine = engine
+    elapsed = [0.0]
+    assign_color_names = cube.assign_color_names
+
+    def timed_assign_color_names(*args):
+        start = time.perf_counter()
+        assign_color_names(*args)
+        elapsed[0] += time.perf_counter() - start
+
+    cube.assign_color_names = timed_assign_color_names
+    cube.enter_scan_data(scan_data)
+    cube.crunch_colors()
+    return ("".join(cube.cube_for_kociemba_strict()), elapsed[0])
+
+
+def main(iterations):
+    totals = {engine: 0.0 for engine in ENGINES}
+    print("%-24s  %14s  %14s  %s" % ("scan", "permutations", "hungarian", "same"))
+
+    for filename in sorted(os.listdir(TEST_DATA)):
+        with open(os.path.join(TEST_DATA, filename), "r") as fh:
+            scan_data = {int(key): value for (key, value) in json.load(fh).items()}
+
+        results = {}
+        times = {}
+
+        for engine in ENGINES:
+            times[engine] = 0.0
+
+            for _ in range(iterations):
+                (results[engine], elapsed) = resolve(scan_data, engine)
+                times[engine] += elapsed
+
+            totals[engine] += times[engine]
+
+        print("%-24s  %12.2fms  %12.2fms  %s" % (
+            filename,
+            times["permutations"] * 1000 / iterations,
+            times["hungarian"] * 1000 / iterations,
+            results["permutations"] == results["hungarian"],
+        ))
+
+    print("%-24s  %12.2fms  %12.2fms" % (
+        "total", totals["permutations"] * 1000 / iterations, totals["hungarian"] * 1000 / iterations))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+
+"""
+Resolve every scan in tests/test-data and report, per cube width, latency
+percentiles for each stage of crunch_colors, peak memory and the number of
+CIEDE2000 distances computed. The report is JSON so it can be saved and used
+as the baseline for a later run, a run that is slower than its baseline
+exits with status 1.
+
+    ./utils/benchmark-resolve.py --iterations 10 --output baseline.json
+    ./utils/benchmark-resolve.py --iterations 10 --baseline baseline.json
+"""
+
+from math import sqrt
+from rubikscolorresolver import RubiksColorSolverGeneric
+from rubikscolorresolver.cie2000 import cie2000_cache
+import argparse
+import json
+import os
+import platform
+import rubikscolorresolver
+import sys
+import time
+import tracemalloc
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests", "test-data")
+
+# The stages of crunch_colors, "validation" is the three checks that follow set_state.
+# Time spent outside of these, mostly gc.collect(), is reported as "other".
+STAGES = (
+    ("enter_scan_data", ("enter_scan_data",)),
+    ("resolve_color_box", ("resolve_color_box",)),
+    ("resolve_corner_squares", ("resolve_corner_squares",)),
+    ("resolve_center_squares", ("resolve_center_squares",)),
+    ("resolve_edge_squares", ("resolve_edge_squares",)),
+    ("set_state", ("set_state",)),
+    ("validation", ("sanity_check_edge_squares", "validate_all_corners_found", "validate_odd_cube_midge_vs_corner_parity")),
+)
+PERCENTILES = (50, 90, 99)
+
+
+def load_scans(directory):
+    scans = []
+
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".txt"):
+            continue
+
+        with open(os.path.join(directory, filename), "r") as fh:
+            scan_data = {int(key): value for (key, value) in json.load(fh).items()}
+
+        scans.append((filename, int(sqrt(len(scan_data) / 6)), scan_data))
+
+    return scans
+
+
+def percentile(values, pct):
+    """
+    Nearest rank percentile of values
+    """
+    values = sorted(values)
+    rank = int(round(pct / 100.0 * len(values) + 0.5))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def summarize(values_ms):
+    result = {"mean": sum(values_ms) / len(values_ms), "max": max(values_ms)}
+
+    for pct in PERCENTILES:
+        result["p%d" % pct] = percentile(values_ms, pct)
+
+    return result
+
+
+class PairsCounter(object):
+    """
+    Counts the distances computed by the numpy engine
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.pairs = 0
+
+    def __call__(self, l1, a1, b1, l2, a2, b2):
+        self.pairs += len(l1)
+        return self.function(l1, a1, b1, l2, a2, b2)
+
+
+def resolve(width, scan_data, pairs_counter):
+    """
+    Resolve one scan, return the result, the time spent in each stage and
+    the total time in ms, and the CIEDE2000 counts
+    """
+    cube = RubiksColorSolverGeneric(width)
+    stage_ms = {}
+
+    for (stage, methods) in STAGES:
+        stage_ms[stage] = 0.0
+
+        for method_name in methods:
+            method = getattr(cube, method_name)
+
+            def timed_method(*args, _method=method, _stage=stage, **kwargs):
+                start = time.perf_counter()
+
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    stage_ms[_stage] += (time.perf_counter() - start) * 1000
+
+            setattr(cube, method_name, timed_method)
+
+    # Every resolve starts with an empty cache, as it would in a fresh process
+    cie2000_cache.clear()
+
+    if pairs_counter is not None:
+        pairs_counter.pairs = 0
+
+    start = time.perf_counter()
+
+    try:
+        cube.enter_scan_data(scan_data)
+        cube.crunch_colors()
+        result = "".join(cube.cube_for_kociemba_strict())
+    except Exception as e:
+        result = "error: %s" % e
+
+    total_ms = (time.perf_counter() - start) * 1000
+    stage_ms["other"] = total_ms - sum(stage_ms.values())
+    cie2000 = {
+        "calls": cie2000_cache.hits + cie2000_cache.misses,
+        "computed": cie2000_cache.misses,
+        "vectorized": pairs_counter.pairs if pairs_counter is not None else 0,
+    }
+    return (result, stage_ms, total_ms, cie2000)
+
+
+def run(scans, iterations):
+    pairs_counter = None
+
+    if rubikscolorresolver.lab_distance_cie2000_pairs is not None:
+        pairs_counter = PairsCounter(rubikscolorresolver.lab_distance_cie2000_pairs)
+        rubikscolorresolver.lab_distance_cie2000_pairs = pairs_counter
+
+    per_width = {}
+    per_scan = {}
+
+    for (filename, width, scan_data) in scans:
+        samples = per_width.setdefault(width, {
+            "scans": 0,
+            "errors": 0,
+            "stages": {stage: [] for stage in [stage for (stage, methods) in STAGES] + ["other"]},
+            "total": [],
+            "peak_memory_kb": 0,
+            "cie2000": {"calls": 0, "computed": 0, "vectorized": 0},
+        })
+        samples["scans"] += 1
+
+        for x in range(iterations):
+            (result, stage_ms, total_ms, cie2000) = resolve(width, scan_data, pairs_counter)
+
+            for (stage, value) in stage_ms.items():
+                samples["stages"][stage].append(value)
+
+            samples["total"].append(total_ms)
+
+        if result.startswith("error"):
+            samples["errors"] += 1
+
+        # The counts do not change from one iteration to the next
+        for (key, value) in cie2000.items():
+            samples["cie2000"][key] += value
+
+        # tracemalloc slows everything down so measure memory on a run of its own
+        tracemalloc.start()
+        resolve(width, scan_data, pairs_counter)
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        samples["peak_memory_kb"] = max(samples["peak_memory_kb"], peak_kb)
+
+        per_scan[filename] = {
+            "width": width,
+            "result": result,
+            "total_ms": summarize(samples["total"][-iterations:]),
+            "peak_memory_kb": peak_kb,
+            "cie2000": cie2000,
+        }
+
+    widths = {}
+
+    for (width, samples) in sorted(per_width.items()):
+        widths[str(width)] = {
+            "scans": samples["scans"],
+            "errors": samples["errors"],
+            "stages_ms": {stage: summarize(values) for (stage, values) in samples["stages"].items()},
+            "total_ms": summarize(samples["total"]),
+            "peak_memory_kb": samples["peak_memory_kb"],
+            "cie2000_per_scan": {key: value / samples["scans"] for (key, value) in samples["cie2000"].items()},
+        }
+
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "implementation": sys.implementation.name,
+            "machine": platform.machine(),
+            "numpy": pairs_counter is not None,
+            "iterations": iterations,
+        },
+        "widths": widths,
+        "scans": per_scan,
+    }
+
+
+def compare(report, baseline, threshold, min_delta_ms):
+    """
+    Return a list of strings, one per measurement that regressed vs the baseline
+    """
+    regressions = []
+
+    def check(desc, value, baseline_value, min_delta):
+        if value > baseline_value * (1 + threshold) and value - baseline_value > min_delta:
+            regressions.append("%s: %.2f vs baseline %.2f (%+.0f%%)" % (
+                desc, value, baseline_value, (value - baseline_value) * 100 / baseline_value if baseline_value else 100))
+
+    for (width, current) in report["widths"].items():
+        previous = baseline["widths"].get(width)
+
+        if previous is None:
+            continue
+
+        for (stage, stats) in current["stages_ms"].items():
+            if stage in previous["stages_ms"]:
+                check("%sx%sx%s %s p50 ms" % (width, width, width, stage), stats["p50"], previous["stages_ms"][stage]["p50"], min_delta_ms)
+
+        for pct in PERCENTILES:
+            key = "p%d" % pct
+            check("%sx%sx%s total %s ms" % (width, width, width, key), current["total_ms"][key], previous["total_ms"][key], min_delta_ms)
+
+        check("%sx%sx%s peak memory KB" % (width, width, width), current["peak_memory_kb"], previous["peak_memory_kb"], 0)
+
+        for (key, value) in current["cie2000_per_scan"].items():
+            check("%sx%sx%s CIEDE2000 %s" % (width, width, width, key), value, previous["cie2000_per_scan"].get(key, 0), 0)
+
+        if current["errors"] > previous["errors"]:
+            regressions.append("%sx%sx%s errors: %d vs baseline %d" % (width, width, width, current["errors"], previous["errors"]))
+
+    for (filename, scan) in report["scans"].items():
+        previous = baseline["scans"].get(filename)
+
+        if previous is not None and scan["result"] != previous["result"]:
+            regressions.append("%s: result changed" % filename)
+
+    return regressions
+
+
+def print_summary(report, fh):
+    fh.write("%-5s  %-22s  %10s  %10s  %10s\n" % ("width", "stage", "p50(ms)", "p90(ms)", "p99(ms)"))
+
+    for (width, current) in report["widths"].items():
+        rows = list(current["stages_ms"].items()) + [("total", current["total_ms"])]
+
+        for (stage, stats) in rows:
+            fh.write("%-5s  %-22s  %10.2f  %10.2f  %10.2f\n" % (width, stage, stats["p50"], stats["p90"], stats["p99"]))
+
+        fh.write("%-5s  peak memory %dKB, CIEDE2000 per scan %s\n\n" % (
+            width, current["peak_memory_kb"], ", ".join("%s %d" % item for item in sorted(current["cie2000_per_scan"].items()))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5, help="times to resolve each scan")
+    parser.add_argument("--width", type=int, action="append", help="only run scans of this width, may be repeated")
+    parser.add_argument("--test-data", default=TEST_DATA, help="directory of scans")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown vs the baseline, 0.10 is 10%%")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore slowdowns smaller than this many ms")
+    args = parser.parse_args()
+
+    scans = load_scans(args.test_data)
+
+    if args.width:
+        scans = [scan for scan in scans if scan[1] in args.width]
+
+    report = run(scans, args.iterations)
+    print_summary(report, sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+    if args.baseline:
+        with open(args.baseline, "r") as fh:
+            baseline = json.load(fh)
+
+        for key in ("python", "implementation", "machine", "numpy"):
+            if report["meta"][key] != baseline["meta"].get(key):
+                sys.stderr.write("WARNING %s is %s but was %s for the baseline\n" % (key, report["meta"][key], baseline["meta"].get(key)))
+
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+
+        for regression in regressions:
+            sys.stderr.write("REGRESSION %s\n" % regression)
+
+        if regressions:
+            sys.exit(1)
+
+        sys.stderr.write("no regressions vs %s\n" % args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+"""
+Time solve_tsp_exact against the greedy solve_tsp on random problems of each
+size up to a few nodes past EXACT_MAX_NODES, to check the exact solver stays
+within the latency budget of the sizes solve_tsp gives it.
+
+    $ PYTHONPATH=. ./utils/benchmark-tsp.py
+"""
+
+from array import array
+from rubikscolorresolver.matrix import TriangularMatrix
+from rubikscolorresolver.tsp_solver_exact import EXACT_MAX_NODES, solve_tsp_exact
+from rubikscolorresolver.tsp_solver_greedy import calc_path_cost, solve_tsp
+import random
+import time
+
+RUNS = 20
+
+
+def benchmark(size):
+    exact_ms = 0.0
+    greedy_ms = 0.0
+    excess = 0.0
+
+    for run in range(RUNS):
+        matrix = TriangularMatrix(size, array("f", [random.random() * 100 for x in range((size * (size - 1)) // 2)]))
+
+        start = time.perf_counter()
+        exact_path = solve_tsp_exact(matrix)
+        exact_ms += (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        greedy_path = solve_tsp(matrix, exact_max_nodes=0)
+        greedy_ms += (time.perf_counter() - start) * 1000
+
+        # one row is the length of the whole path
+        excess += calc_path_cost(matrix, greedy_path, 1) / calc_path_cost(matrix, exact_path, 1) - 1
+
+    print("{:>5}  {:>12.2f}  {:>13.2f}  {:>20.1f}".format(size, exact_ms / RUNS, greedy_ms / RUNS, excess * 100 / RUNS))
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    print("EXACT_MAX_NODES is {}\n".format(EXACT_MAX_NODES))
+    print("nodes  exact(ms)     greedy(ms)     greedy longer by(%)")
+
+    for size in range(4, EXACT_MAX_NODES + 4):
+        benchmark(size)